@@ -0,0 +1,225 @@
+import threading
+import time
+import collections
+
+from Instrumentation import probe
+
+"""
+BACKGROUND ACQUISITION
+
+	Capturing a frame (waiting for the trigger, sampling and transferring the payload over USB) can take
+	hundreds of milliseconds at the slowest timebases. Doing it inside the matplotlib animation callback
+	blocks the Tk main loop for that time.
+
+	The AcquisitionWorker owns the board while the oscilloscope is open and keeps capturing frames with
+	the latest parameters set by the UI. Finished frames are published into a FrameRing, a small set of
+	preallocated buffers protected by a lock, and the renderer picks up the newest complete one. While
+	a frame is being drawn the next one is already being captured and transferred.
+
+	In pipelined mode (the default) the worker also keeps one capture request in flight on top of the one
+	being read (see Board.osc_request_samples), so the board does not sit idle while the host reads and
+	decodes a payload. Frames are tagged with the parameters their request was sent with: a frame captured
+	before the settings changed is dropped, as it would be drawn with the wrong scaling.
+
+	While a Recorder is set, every frame received is also appended to it from the worker thread, including
+	those the renderer never picks up.
+"""
+
+""" Parameters a frame was captured with. channel is 1, 2 or 3 (both channels) as in Board.osc_get_samples """
+CaptureParameters = collections.namedtuple("CaptureParameters", ["channel", "num_samples", "time_between_samples", "trigger_channel", "use_ets"])
+
+""" Sampling limits of the board, as returned by its osc get_... queries """
+BoardTiming = collections.namedtuple("BoardTiming", ["micros_needed_for_1sample", "micros_needed_for_2sample", "max_samples", "nanos_per_sample_in_ets_mode"])
+
+def query_board_timing(board):
+	return BoardTiming(board.get_value("osc get_micros_needed_for_1sample", 2),
+					   board.get_value("osc get_micros_needed_for_2sample", 2),
+					   board.get_value("osc get_max_samples", 2),
+					   board.get_value("osc get_nanos_per_sample_in_ets_mode", 2))
+
+def horizontal_unit_values(mode):
+	""" The settings of the time (or frequency) per division of the oscilloscope in mode """
+	if mode == "Oscilloscope":
+		return ["1 us", "2 us",   "5 us",   "10 us",  "20 us", "50 us", "0.1 ms","0.2 ms","0.5 ms","1 ms", "2 ms",  "5 ms",  "10 ms", "20 ms","50 ms"]
+	else:
+		return ["1 MHz","500 KHz","200 KHz","100 KHz","50 KHz","20 KHz","10 KHz","5 KHz", "2 KHz", "1 KHz","500 Hz","200 Hz","100 Hz","50 Hz","20 Hz"]
+		
+def horizontal_unit_in_micros(value):
+	""" A setting of horizontal_unit_values as microseconds per division """
+	if value[-2:] == "ms":
+		return float(value[:-3])*1000
+	elif value[-2:] == "us":
+		return float(value[:-3])
+	elif value[-3] == "MHz":
+		return 1/float(value[:-4])
+	elif value[-3:] == "KHz":
+		return 1000/float(value[:-4])
+	elif value[-2:] == "Hz":
+		return 1000000/float(value[:-3])
+
+def sampling_parameters(time_span_in_micros, channel, use_ets, samples_wanted, timing):
+	"""
+	Returns (num_samples, time_between_samples) to capture time_span_in_micros on channel (1, 2 or 3) 
+	with at most samples_wanted samples per channel, as fast as the board allows. In ETS mode all the 
+	samples the span holds at the ETS rate are taken. timing has the attributes of BoardTiming. 
+	Raises ValueError if the board cannot do it.
+	"""
+	if use_ets:
+		time_between_samples = timing.nanos_per_sample_in_ets_mode # nanoseconds
+		potential_samples    = int((time_span_in_micros*1000) / time_between_samples)
+		samples_to_show      = potential_samples
+	else:
+		min_micros_per_sample = timing.micros_needed_for_1sample if channel == 1 or channel == 2 else timing.micros_needed_for_2sample
+		potential_samples 	  = int(time_span_in_micros/min_micros_per_sample)
+		samples_to_show       = potential_samples if potential_samples < samples_wanted else samples_wanted
+		time_between_samples  = int(time_span_in_micros/samples_to_show) # microseconds
+		if time_between_samples < min_micros_per_sample:
+			raise ValueError("Internal error 1 {} < {}".format(time_between_samples, min_micros_per_sample))
+	if samples_to_show > timing.max_samples:
+		raise ValueError("Internal error 2 {} > {}".format(samples_to_show, timing.max_samples))
+	return (samples_to_show, time_between_samples)
+
+class Frame():
+
+	def __init__(self, buffer):
+		self.buffer 		= buffer	# bytearray owned by the ring, reused between frames
+		self.parameters 	= None
+		self.samples		= None
+		self.period_status	= 0
+		self.period_value	= 0
+		self.timestamp		= 0
+		self.capture_time	= 0
+
+class FrameRing():
+	"""
+	Triple buffering: at any time one slot may be written by the worker, one holds the newest complete
+	frame and one is being read by the renderer. The worker never writes over the other two, so a frame
+	handed to the renderer stays valid until it asks for the next one.
+	"""
+	def __init__(self, buffer_size, num_slots=3):
+		self.lock	 = threading.Lock()
+		self.slots	 = [Frame(bytearray(buffer_size)) for i in range(0,num_slots)]
+		self.ready	 = None
+		self.reading = None
+
+	def acquire_write_slot(self):
+		with self.lock:
+			for frame in self.slots:
+				if frame is not self.ready and frame is not self.reading:
+					return frame
+
+	def publish(self, frame):
+		with self.lock:
+			if self.ready is not None: probe.count("overwritten")
+			self.ready = frame
+
+	def get_latest(self):
+		with self.lock:
+			if self.ready is None: return None
+			self.reading = self.ready
+			self.ready	 = None
+			return self.reading
+
+class AcquisitionWorker(threading.Thread):
+
+	def __init__(self, board, max_samples, pipelined=True):
+		threading.Thread.__init__(self, name="PicoScope acquisition", daemon=True)
+		self.board		= board
+		self.ring		= FrameRing((2*max_samples+2)*2) # dual channel samples plus period status and value
+		self.condition 	= threading.Condition()
+		self.parameters	= None
+		self.running	= True
+		self.pipelined	= pipelined
+		self.frames_received	= 0
+		self.stale_frames		= 0
+		self.last_frame_time	= None
+		self.recorder			= None
+		self.recorder_lock		= threading.Lock()
+
+	def set_parameters(self, parameters):
+		""" None pauses the acquisition """
+		with self.condition:
+			if parameters != self.parameters:
+				self.parameters = parameters
+				self.last_frame_time = None # the time between frames starts over, see capture_pipelined
+				self.condition.notify()
+
+	def get_latest_frame(self, parameters=None):
+		""" if parameters are given, a newest frame captured with different ones is dropped """
+		frame = self.ring.get_latest()
+		if frame != None and parameters != None and frame.parameters != parameters:
+			self.stale_frames += 1
+			probe.count("stale")
+			return None
+		return frame
+
+	def set_recorder(self, recorder):
+		""" Starts (or with None, stops) recording frames. Returns the previous recorder, to be closed by the caller """
+		with self.recorder_lock:
+			previous 	  = self.recorder
+			self.recorder = recorder
+		return previous
+
+	def record(self, frame):
+		with self.recorder_lock:
+			if self.recorder == None: return
+			try:
+				self.recorder.append(frame)
+			except Exception as e:
+				print("Error: recording stopped.", e)
+				self.recorder.close()
+				self.recorder = None
+
+	def stop(self):
+		with self.condition:
+			self.running = False
+			self.condition.notify()
+		self.join()
+
+	def run(self):
+		while True:
+			with self.condition:
+				while self.running and self.parameters is None and self.board.osc_requests_in_flight() == 0:
+					self.condition.wait()
+				if not self.running: break
+				parameters = self.parameters
+			if self.pipelined:
+				self.capture_pipelined(parameters)
+			else:
+				self.capture(parameters)
+		""" leave no payload pending in the link """
+		while self.board.osc_receive_samples() != None: pass
+
+	def capture(self, parameters):
+		frame = self.ring.acquire_write_slot()
+		t0 = time.time()
+		(frame.samples,frame.period_status,frame.period_value) = self.board.osc_get_samples(*parameters, buffer=frame.buffer)
+		frame.timestamp 	= time.time()
+		frame.capture_time	= frame.timestamp - t0
+		frame.parameters	= parameters
+		self.frames_received += 1
+		self.record(frame)
+		self.ring.publish(frame)
+
+	def capture_pipelined(self, parameters):
+		if parameters != None:
+			""" after a pause or a change of settings the first frame is timed from its request, not from the last frame """
+			if self.last_frame_time == None: self.last_frame_time = time.time()
+			while self.board.osc_requests_in_flight() < 2:
+				self.board.osc_request_samples(*parameters)
+		frame = self.ring.acquire_write_slot()
+		t0 = time.time()
+		data = self.board.osc_receive_samples(buffer=frame.buffer)
+		if data == None: return # none in flight, the acquisition was paused
+		(frame.samples,frame.period_status,frame.period_value,sent_with) = data
+		frame.timestamp 	 = time.time()
+		frame.capture_time	 = frame.timestamp - (self.last_frame_time if self.last_frame_time != None else t0) # time between frames
+		frame.parameters	 = CaptureParameters._make(sent_with)
+		self.last_frame_time = frame.timestamp
+		self.frames_received += 1
+		self.record(frame)
+		if frame.parameters != self.parameters:
+			self.stale_frames += 1
+			probe.count("stale")
+			return
+		self.ring.publish(frame)
@@ -0,0 +1,277 @@
+import asyncio
+import collections
+import threading
+import time
+import serial # pip3 install pySerial
+
+import Board
+from Instrumentation import probe
+
+"""
+ASYNCIO BOARD LINK
+
+	Board waits for answers polling a non blocking serial port, one caller at a time. Here the link
+	is an asyncio protocol instead: the event loop is woken up when bytes arrive, and nothing runs
+	while waiting for a capture.
+
+	Commands are written as soon as they are submitted (the firmware queues what it receives while
+	busy) and answers are matched to them in order. Every command expecting an answer has its own
+	timeout, counted from the moment the answer before it is complete, so a request queued behind a
+	slow capture does not time out early. A command cancelled after being written still has its answer
+	read from the link, and dropped.
+
+	From asyncio code:
+		board = await AsyncBoard.AsyncBoard.open("/dev/ttyACM0")
+		(samples, status, value) = await board.osc_get_samples(1, 480, 20, 1, False)
+		frames = await asyncio.gather(*[board.osc_get_samples(1, 480, 20, 1, False) for i in range(4)]) # pipelined
+
+	ThreadedBoard runs the loop in a thread of its own and offers the blocking interface of Board, so
+	the GUI uses it unchanged (set Link = asyncio in the Settings-Board section of PicoScope.ini). Code
+	running in the same process shares the connection by submitting coroutines to its loop:
+		asyncio.run_coroutine_threadsafe(Globals.board.board.get_value(...), Globals.board.loop)
+
+	Serial ports are watched with loop.add_reader, which needs a POSIX system.
+"""
+
+class Command():
+
+	def __init__(self, length, timeout, future):
+		self.length	 = length	# bytes of the answer
+		self.timeout = timeout
+		self.future	 = future
+		self.timer	 = None
+
+class BoardProtocol(asyncio.Protocol):
+
+	def __init__(self):
+		self.transport = None
+		self.buffer	   = bytearray()
+		self.expected  = collections.deque() # commands written whose answer is not complete yet
+
+	def connection_made(self, transport):
+		self.transport = transport
+
+	def connection_lost(self, exc):
+		while self.expected:
+			command = self.expected.popleft()
+			if command.timer != None: command.timer.cancel()
+			if not command.future.done(): command.future.set_exception(ConnectionError("board link closed"))
+
+	def submit(self, line, length, timeout):
+		""" Writes line; if an answer of length bytes is expected returns the future of its payload """
+		loop = asyncio.get_running_loop()
+		future = loop.create_future() if length else None
+		self.transport.write(bytes(line+"\n", "utf-8"))
+		if length:
+			self.expected.append(Command(length, timeout, future))
+			if len(self.expected) == 1: self.start_timer()
+		return future
+
+	def start_timer(self):
+		command = self.expected[0]
+		command.timer = asyncio.get_running_loop().call_later(command.timeout, self.on_timeout, command)
+
+	def on_timeout(self, command):
+		""" The partial answer is dropped. As with Board, an answer arriving later would be taken for the next one """
+		if not self.expected or self.expected[0] is not command: return
+		self.expected.popleft()
+		print("Error: board timeout. Expected {} bytes, received {}".format(command.length, len(self.buffer)))
+		probe.count("timeouts")
+		self.buffer.clear()
+		if not command.future.done(): command.future.set_exception(asyncio.TimeoutError())
+		if self.expected: self.start_timer()
+
+	def data_received(self, data):
+		self.buffer += data
+		while self.expected and len(self.buffer) >= self.expected[0].length:
+			command = self.expected.popleft()
+			command.timer.cancel()
+			if not command.future.done(): command.future.set_result(bytes(self.buffer[:command.length]))
+			del self.buffer[:command.length]
+			if self.expected: self.start_timer()
+		if not self.expected: self.buffer.clear() # nothing was asked for
+
+class SerialTransport(asyncio.Transport):
+	""" A pySerial port watched by the event loop """
+
+	def __init__(self, loop, port, protocol):
+		asyncio.Transport.__init__(self)
+		self.loop	  = loop
+		self.serial	  = port
+		self.protocol = protocol
+		self.closing  = False
+		loop.add_reader(port.fileno(), self.on_readable)
+		protocol.connection_made(self)
+
+	def on_readable(self):
+		data = self.serial.read(self.serial.in_waiting or 1)
+		if data: self.protocol.data_received(data)
+
+	def write(self, data):
+		self.serial.write(data)
+
+	def is_closing(self):
+		return self.closing
+
+	def close(self):
+		if self.closing: return
+		self.closing = True
+		self.loop.remove_reader(self.serial.fileno())
+		self.serial.close()
+		self.protocol.connection_lost(None)
+
+class SimulatedTransport(SerialTransport):
+	""" A Simulator.SimulatedSerial, whose answers are delivered when the simulated board would have sent them """
+
+	def __init__(self, loop, port, protocol):
+		asyncio.Transport.__init__(self)
+		self.loop	  = loop
+		self.serial	  = port
+		self.protocol = protocol
+		self.closing  = False
+		self.timer	  = None
+		protocol.connection_made(self)
+
+	def schedule(self):
+		if self.timer != None or self.closing: return
+		ready = self.serial.next_response_time()
+		if ready == None: return
+		self.timer = self.loop.call_later(max(ready-time.time(), 0.0005), self.on_readable)
+
+	def on_readable(self):
+		self.timer = None
+		SerialTransport.on_readable(self)
+		self.schedule()
+
+	def write(self, data):
+		self.serial.write(data)
+		self.schedule()
+
+	def close(self):
+		if self.closing: return
+		self.closing = True
+		if self.timer != None: self.timer.cancel()
+		self.serial.close()
+		self.protocol.connection_lost(None)
+
+class AsyncBoard():
+
+	def __init__(self, transport, protocol, identity):
+		self.transport = transport
+		self.protocol  = protocol
+		self.identity  = identity
+
+	@classmethod
+	async def open(cls, port):
+		""" port as for Board: a serial device or a sim:// URL """
+		loop	 = asyncio.get_running_loop()
+		protocol = BoardProtocol()
+		if port.startswith("sim:"):
+			import Simulator
+			transport = SimulatedTransport(loop, Simulator.SimulatedSerial.from_url(port), protocol)
+		else:
+			transport = SerialTransport(loop, serial.Serial(port, 1, timeout=0), protocol)
+		return cls(transport, protocol, Board.Board.port_identity(port))
+
+	def close(self):
+		self.transport.close()
+
+	async def send_command(self, command):
+		self.protocol.submit(command, 0, None)
+
+	async def get_value(self, command, ilength, timeout=5.0):
+		payload = await self.protocol.submit(command, ilength, timeout)
+		return int.from_bytes(payload, "little")
+
+	async def osc_get_samples(self, channel, num_samples, time_between_samples, trigger_channel, use_ets, timeout=5.0):
+		""" As Board.osc_get_samples. Raises asyncio.TimeoutError if the payload is not complete in time """
+		payload = await self.osc_get_payload(channel, num_samples, time_between_samples, trigger_channel, use_ets, timeout)
+		return Board.decode_payload(payload, num_samples*(2 if channel == 3 else 1))
+
+	def osc_get_payload(self, channel, num_samples, time_between_samples, trigger_channel, use_ets, timeout=5.0):
+		""" Writes the capture request at once and returns the future of its raw payload """
+		cmd = "osc get_samples" if not use_ets else "osc get_samples_ets"
+		num_bytes = (num_samples*(2 if channel == 3 else 1)+2)*2
+		return self.protocol.submit("{} {} {} {} {}".format(cmd, channel, num_samples, time_between_samples, trigger_channel), num_bytes, timeout)
+
+class ThreadedBoard():
+	"""
+	The interface of Board, served by an AsyncBoard on an event loop running in its own thread. Every
+	request has a future of its own, so payloads cannot be mixed up: osc_get_samples waits for that of
+	its request, and osc_receive_samples for the oldest request of the caller (see Board for owners).
+	A link failing, as a request timing out, gives zero filled payloads and 0 values, as Board does.
+	"""
+	def __init__(self, port):
+		self.identity  = Board.Board.port_identity(port)
+		self.loop	   = asyncio.new_event_loop()
+		self.thread	   = threading.Thread(target=self.loop.run_forever, name="PicoScope board link", daemon=True)
+		self.thread.start()
+		self.in_flight = collections.deque() # (owner, concurrent future of the payload, request parameters)
+		self.lock	   = threading.Lock()	 # in_flight, used from every thread
+		try:
+			self.board = self.run(AsyncBoard.open(port))
+			self.ok	   = True
+		except Exception:
+			self.ok	   = False
+
+	def run(self, coroutine):
+		return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result()
+
+	def close(self):
+		self.loop.call_soon_threadsafe(self.board.close)
+		self.loop.call_soon_threadsafe(self.loop.stop)
+		self.thread.join()
+
+	def send_command(self, command):
+		self.run(self.board.send_command(command))
+
+	def get_value(self, command, ilength):
+		try:
+			return self.run(self.board.get_value(command, ilength))
+		except (asyncio.TimeoutError, ConnectionError, serial.SerialException) as e:
+			print("Error: get_value failed.", command, repr(e))
+			return 0
+
+	def osc_get_samples(self, channel, num_samples, time_between_samples, trigger_channel, use_ets, buffer=None):
+		parameters = (channel, num_samples, time_between_samples, trigger_channel, use_ets)
+		return self._wait_payload(self._request(parameters), parameters, buffer)[:3]
+
+	def osc_request_samples(self, channel, num_samples, time_between_samples, trigger_channel, use_ets, owner=None):
+		parameters = (channel, num_samples, time_between_samples, trigger_channel, use_ets)
+		owner = Board.Board._owner(owner)
+		with self.lock: # appended in the order written
+			self.in_flight.append((owner, self._request(parameters), parameters))
+
+	def osc_receive_samples(self, buffer=None, owner=None):
+		""" As Board.osc_receive_samples """
+		owner = Board.Board._owner(owner)
+		with self.lock:
+			mine = [entry for entry in self.in_flight if entry[0] == owner]
+			if not mine: return None
+			self.in_flight.remove(mine[0])
+		(owner, future, parameters) = mine[0]
+		return self._wait_payload(future, parameters, buffer)
+
+	def osc_requests_in_flight(self, owner=None):
+		owner = Board.Board._owner(owner)
+		with self.lock:
+			return sum(1 for entry in self.in_flight if entry[0] == owner)
+
+	def _request(self, parameters):
+		""" Writes the request, returns the concurrent future of its payload """
+		async def request(): return self.board.osc_get_payload(*parameters)
+		return self.run(request())
+
+	def _wait_payload(self, future, parameters, buffer):
+		""" (samples,period_status,period_value,parameters) once the payload arrives, zero padded if it does not """
+		num_samples = parameters[1]*(2 if parameters[0] == 3 else 1)
+		num_bytes	= (num_samples+2)*2
+		if buffer is None or len(buffer) < num_bytes:
+			buffer = bytearray(num_bytes)
+		try:
+			buffer[:num_bytes] = asyncio.run_coroutine_threadsafe(asyncio.wait_for(future, None), self.loop).result()
+		except (asyncio.TimeoutError, ConnectionError, serial.SerialException) as e:
+			print("Error: osc_get_samples failed. num_samples:", num_samples, repr(e))
+			buffer[:num_bytes] = bytes(num_bytes)
+			probe.count("timeouts")
+		return Board.decode_payload(buffer, num_samples) + (parameters,)
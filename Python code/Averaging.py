@@ -0,0 +1,86 @@
+import numpy as np
+
+"""
+FRAME AVERAGING AND HIGH RESOLUTION
+
+	Noise reduction of the frames of a channel, before they are drawn:
+		Average			Mean of the last N frames. The frames are kept in a ring and their sum in an integer
+						accumulator, so the mean is exact however long it runs.
+		Exponential		Each frame weighs 1/N in the result, older ones fading geometrically.
+		High-res		Boxcar: the oscilloscope samples N times faster than the screen needs (as far as the
+						board allows) and every N consecutive samples are averaged into one, which gains
+						log2(N)/2 effective bits on uncorrelated noise.
+	Averaging needs the frames aligned, so it works on triggered frames: after the software trigger if
+	it is on.
+
+	All buffers are allocated when the averager is reset, which happens when the key given with the
+	frames (capture parameters, trigger settings, mode, N) changes: a frame is processed with in place
+	NumPy operations only. The result is given as float32 raw sample values (0..4095 with fractions).
+"""
+
+mode_names	  = ["Normal", "Average", "Exponential", "High-res"]
+frames_values = [2, 4, 8, 16, 32, 64, 128, 256]
+
+class FrameAverager():
+
+	def __init__(self):
+		self.mode  = "Normal"
+		self.n	   = 16
+		self.key   = None
+		self.count = 0
+
+	def reset(self, length, factor=1):
+		self.count	= 0
+		self.output = np.zeros(length, dtype=np.float32)
+		self.masked = np.zeros(length*factor, dtype=np.uint16) # the 12 bits of the sample
+		if self.mode == "Average":
+			self.ring = np.zeros((self.n, length), dtype=np.uint16)
+			self.sum  = np.zeros(length, dtype=np.int32)
+		elif self.mode == "Exponential":
+			self.delta = np.zeros(length, dtype=np.float32)
+
+	def process(self, samples, key):
+		"""
+		The average of samples with the frames processed before with the same key. In Normal and
+		High-res modes samples are returned as they are (see decimate() for High-res).
+		"""
+		if self.mode == "Normal" or self.mode == "High-res": return samples
+		key = (key, self.mode, self.n, len(samples))
+		if key != self.key:
+			self.reset(len(samples))
+			self.key = key
+		samples = np.bitwise_and(samples, 0x0FFF, out=self.masked)
+		if self.mode == "Average":
+			slot = self.ring[self.count % self.n]
+			np.subtract(self.sum, slot, out=self.sum)
+			np.add(self.sum, samples, out=self.sum)
+			slot[:] = samples
+			self.count += 1
+			np.multiply(self.sum, 1/min(self.count, self.n), out=self.output, casting="same_kind")
+		else:
+			if self.count == 0:
+				self.output[:] = samples
+			else:
+				np.subtract(samples, self.output, out=self.delta, casting="same_kind")
+				self.delta *= np.float32(1/self.n)
+				self.output += self.delta
+			self.count += 1
+		return self.output
+
+	def decimate(self, samples, factor, key):
+		""" High-res: the mean of every factor consecutive samples, a trailing incomplete group left out """
+		length = len(samples)//factor
+		key = (key, self.mode, factor, length)
+		if key != self.key:
+			self.reset(length, factor)
+			self.key = key
+		np.bitwise_and(samples[:length*factor], 0x0FFF, out=self.masked)
+		np.add.reduce(self.masked.reshape(length, factor), axis=1, dtype=np.float32, out=self.output)
+		self.output *= np.float32(1/factor)
+		self.count += 1
+		return self.output
+
+	def frames(self):
+		""" Frames averaged in the last result """
+		if self.mode == "Average": return min(self.count, self.n)
+		return self.count
@@ -0,0 +1,298 @@
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import time
+import numpy as np
+
+import Board
+import Acquisition
+import Raster
+import Pool
+
+"""
+BENCHMARKS
+
+	Measures the acquisition and render pipeline against the simulated board (see Simulator.py), for
+	every timebase of the oscilloscope in single channel, dual channel and ETS mode (ETS only up to
+	50 us/div, as in the oscilloscope):
+		decode_fps, decode_MBps		Board.osc_get_samples throughput, board answers replayed at once
+		acquisition_fps				Frames per second of the acquisition worker with realistic board timing
+		raster_ms					Rasterizing a frame and rendering the image of the raster display (Raster.py)
+		draw_oscilloscope_ms		OscilloscopeChannel.draw_frame latency in Oscilloscope mode
+		draw_spectrometer_ms		OscilloscopeChannel.draw_frame latency in Spectrometer mode
+		blit_ms						Restoring the background, drawing the traces and blitting the canvas
+		e2e_fps						Frames drawn per second by the oscilloscope window, realistic timing
+	The last four need a display; without one they are left out. Under the "startup" key:
+		launcher_import_s			Importing the launcher (PicoScope.py), in a fresh interpreter
+	and under "pool|N boards", with --pool, for pools of simulated boards all capturing at once (see Pool.py):
+		pool_fps_per_board			Mean frames per second of each board
+
+	Results are written as JSON. Compared with a baseline (a results file of a previous run), metrics
+	worse than the baseline by more than the tolerance are reported and the exit status is 1.
+
+		python3 Benchmark.py --output results.json
+		python3 Benchmark.py --baseline baseline.json [--tolerance 0.2] [--pool]
+
+	The results are absolute timings, only comparable with those of the same machine. Every run also times
+	a fixed workload (calibration_s in "meta"): if the baseline's differs from this run's by more than the
+	tolerance it comes from another (or a busier) machine, and its regressions are only warnings.
+
+	Run it from this directory: the oscilloscope window needs the icons here. It is opened with the
+	default settings, those of PicoScope.ini are not used and it is not written. Benchmark-baseline.json holds the results of
+	a run on the simulated board without display, as an example of them. Regenerate it on your machine
+	before making changes, then compare with it:
+
+		python3 Benchmark.py --no-gui --output Benchmark-baseline.json
+		python3 Benchmark.py --no-gui --baseline Benchmark-baseline.json
+"""
+
+""" metric: True if higher is better """
+METRICS = {"decode_fps": 			True,
+		   "decode_MBps": 			True,
+		   "acquisition_fps": 		True,
+		   "raster_ms":				False,
+		   "draw_oscilloscope_ms": 	False,
+		   "draw_spectrometer_ms": 	False,
+		   "blit_ms": 				False,
+		   "e2e_fps": 				True,
+		   "launcher_import_s":		False,
+		   "pool_fps_per_board":	True}
+
+MODES = {"single": (1, False), "dual": (3, False), "ets": (1, True)}
+
+""" ETS takes one sample per trigger: a fast signal keeps its frames short """
+SIM_URL = "sim://?seed=1&ch1=sine,100000,2.0&ch2=sine,100000,1.0"
+
+def repeat(function, seconds, min_runs=3):
+	""" Calls function until seconds elapse (at least min_runs times), returns the durations of each call """
+	durations = []
+	t_end = time.perf_counter()+seconds
+	while len(durations) < min_runs or time.perf_counter() < t_end:
+		t0 = time.perf_counter()
+		function()
+		durations.append(time.perf_counter()-t0)
+	return np.array(durations)
+
+def bench_decode(parameters, seconds):
+	board  = Board.Board(SIM_URL+"&realtime=0&replay=1")
+	buffer = bytearray((2*parameters.num_samples+2)*2)
+	board.osc_get_samples(*parameters, buffer=buffer) # record the answer to replay
+	durations = repeat(lambda: board.osc_get_samples(*parameters, buffer=buffer), seconds)
+	frame_bytes = (parameters.num_samples*(2 if parameters.channel == 3 else 1)+2)*2
+	median = np.median(durations)
+	return {"decode_fps": 1/median, "decode_MBps": frame_bytes/median/1e6}
+
+def bench_raster(parameters, seconds, columns):
+	""" One trace per channel at a 16:9 canvas of the width given, as the oscilloscope draws them """
+	board = Board.Board(SIM_URL+"&realtime=0")
+	(samples, status, value) = board.osc_get_samples(*parameters)
+	traces = [samples[1::2], samples[2::2]] if parameters.channel == 3 else [samples]
+	display = Raster.PhosphorDisplay(columns, columns*9//16)
+	colors	= [Raster.COLORS["Yellow"], Raster.COLORS["Blue"]]
+	def draw():
+		display.decay(0.01)
+		for layer, trace in enumerate(traces):
+			display.add_trace(layer, np.linspace(0, 100, len(trace)), (trace & 0x0FFF)*(100/4095)-50)
+		display.render(colors)
+	return {"raster_ms": 1000*np.median(repeat(draw, seconds))}
+
+def bench_acquisition(parameters, seconds, max_samples):
+	board  = Board.Board(SIM_URL)
+	worker = Acquisition.AcquisitionWorker(board, max_samples)
+	worker.start()
+	worker.set_parameters(parameters)
+	while worker.frames_received == 0: time.sleep(0.001)
+	t0 = time.perf_counter()
+	first = worker.frames_received
+	while time.perf_counter()-t0 < seconds or worker.frames_received-first < 2: time.sleep(0.001)
+	fps = (worker.frames_received-first)/(time.perf_counter()-t0)
+	worker.stop()
+	return {"acquisition_fps": fps}
+
+def bench_pool(boards, seconds):
+	""" Dual channel frames of 1000 samples at 10 us, 1 ms/div """
+	fps = Pool.throughput([SIM_URL.replace("seed=1", "seed={}".format(i)) for i in range(boards)], 1000, 10, seconds)
+	return {"pool_fps_per_board": float(np.mean(fps))}
+	
+def bench_calibration(runs=5):
+	""" A fixed workload of Python and numpy, the best of a few runs: the speed of the machine """
+	data = np.random.default_rng(1).random(1<<16)
+	def work():
+		total = 0
+		for i in range(100000): total += i*i
+		np.sort(data)
+	return float(repeat(work, 0, runs).min())
+
+def bench_startup(runs=5):
+	""" The best of a few runs, the others being slowed down by cold disk caches """
+	code = "import time; t0 = time.perf_counter(); import PicoScope; print(time.perf_counter()-t0)"
+	times = [float(subprocess.check_output([sys.executable, "-c", code])) for i in range(runs)]
+	return {"launcher_import_s": min(times)}
+
+class GUIBench():
+	""" Drives a real oscilloscope window on the simulated board. Needs a display """
+
+	def __init__(self):
+		import tkinter as tk
+		self.root = tk.Tk()
+		self.root.withdraw()
+		import Globals
+		import Calibration
+		import Commands
+		import Oscilloscope
+		""" the default settings and the simulated board, whatever PicoScope.ini says, which is not written """
+		Globals.config.clear()
+		Globals.set_default_config()
+		Globals.board		= Board.Board(SIM_URL)
+		Globals.calibration = Calibration.CalibrationStore("Calibration.json")
+		Globals.commands	= Commands.CommandScheduler(Globals.board)
+		Globals.commands.start()
+		self.osc = Oscilloscope.Oscilloscope(tk.Toplevel(self.root))
+		Globals.toplevel_windows["Oscilloscope"] = self.osc
+		self.osc.ani.event_source.stop() # frames are driven from here
+		self.decode_board = Board.Board(SIM_URL+"&realtime=0")
+
+	def configure(self, time_div, channel, use_ets, operating_mode):
+		osc = self.osc
+		osc.operating_mode.set(operating_mode)
+		osc.on_mode_changed(False)
+		osc.use_ets.set(False)
+		osc.CH1.enabled.set(channel == 1 or channel == 3)
+		osc.CH2.enabled.set(channel == 2 or channel == 3)
+		osc.horiz_div.set(time_div)
+		osc.on_horiz_div_changed(None)
+		osc.use_ets.set(use_ets)
+		self.root.update()
+
+	def bench(self, time_div, parameters, seconds):
+		osc = self.osc
+		results = {}
+		(samples, status, value) = self.decode_board.osc_get_samples(*parameters)
+		seconds_per_sample = parameters.time_between_samples * (1e-9 if parameters.use_ets else 1e-6)
+		for operating_mode in ["Oscilloscope", "Spectrometer"]:
+			self.configure(time_div, parameters.channel, parameters.use_ets, operating_mode)
+			if parameters.channel == 3:
+				draw = lambda: (osc.CH1.draw_frame(samples[1::2], (status,value), operating_mode, seconds_per_sample),
+								osc.CH2.draw_frame(samples[2::2], None, operating_mode, seconds_per_sample))
+			else:
+				draw = lambda: osc.CH1.draw_frame(samples, (status,value), operating_mode, seconds_per_sample)
+			results["draw_{}_ms".format(operating_mode.lower())] = 1000*np.median(repeat(draw, seconds))
+
+		self.configure(time_div, parameters.channel, parameters.use_ets, "Oscilloscope")
+		canvas = osc.canvas
+		canvas.draw()
+		background = canvas.copy_from_bbox(osc.axis.bbox)
+		def blit():
+			canvas.restore_region(background)
+			osc.axis.draw_artist(osc.CH1.plot_data)
+			osc.axis.draw_artist(osc.CH2.plot_data)
+			canvas.blit(osc.axis.bbox)
+			self.root.update_idletasks()
+		results["blit_ms"] = 1000*np.median(repeat(blit, seconds))
+
+		""" end to end: the animation callback as FuncAnimation would call it, as fast as possible """
+		drawn = 0
+		last  = None
+		t0 = time.perf_counter()
+		while time.perf_counter()-t0 < seconds or drawn < 2:
+			osc.animation_get_data(0)
+			blit()
+			self.root.update()
+			frame = osc.acquisition.ring.reading
+			if frame != None and frame.timestamp != last:
+				last   = frame.timestamp
+				drawn += 1
+		results["e2e_fps"] = drawn/(time.perf_counter()-t0)
+		return results
+
+	def close(self):
+		import Globals
+		self.osc.acquisition.stop()
+		Globals.commands.stop()
+		self.root.destroy()
+
+def same_machine(results, baseline, tolerance):
+	""" True if the calibration workload took the same time, within tolerance, for both """
+	reference = baseline["meta"].get("calibration_s")
+	return reference != None and abs(results["meta"]["calibration_s"]/reference-1) <= tolerance
+
+def compare(results, baseline, tolerance):
+	""" Returns the list of regressions, as text """
+	regressions = []
+	for key, metrics in results["results"].items():
+		for metric, value in metrics.items():
+			reference = baseline["results"].get(key, {}).get(metric)
+			if reference == None or value == None: continue
+			if METRICS[metric]:
+				worse = value < reference*(1-tolerance)
+			else:
+				worse = value > reference*(1+tolerance)
+			if worse:
+				regressions.append("{} {}: {:.3f} (baseline {:.3f})".format(key, metric, value, reference))
+	return regressions
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description="PicoScope pipeline benchmarks")
+	parser.add_argument("--output",		default="benchmark.json", help="results file")
+	parser.add_argument("--baseline",	help="compare with the results of a previous run")
+	parser.add_argument("--tolerance",	type=float, default=0.2, help="relative change accepted, default 0.2")
+	parser.add_argument("--seconds",	type=float, default=0.5, help="per measurement, default 0.5")
+	parser.add_argument("--no-gui",		action="store_true", help="skip the measurements needing a display")
+	parser.add_argument("--pool",		action="store_true", help="also measure pools of 1 to 8 boards, about 4 times --seconds more")
+	args = parser.parse_args(argv)
+
+	timebases = Acquisition.horizontal_unit_values("Oscilloscope")
+	gui = None
+	if not args.no_gui:
+		try:
+			gui = GUIBench()
+		except Exception as e:
+			print("No display, skipping draw, blit and end to end measurements:", e, file=sys.stderr)
+	columns = gui.osc.window_width if gui != None else 480
+	timing  = Acquisition.query_board_timing(Board.Board(SIM_URL))
+
+	results = {"meta":	  {"python": platform.python_version(), "numpy": np.__version__, "machine": platform.machine(),
+						   "date": time.strftime("%Y-%m-%d %H:%M:%S"), "columns": columns, "gui": gui != None,
+						   "calibration_s": bench_calibration()},
+			   "results": {}}
+	results["results"]["startup"] = bench_startup()
+	print("startup          launcher_import_s={:.3f}".format(results["results"]["startup"]["launcher_import_s"]))
+	for boards in ([1, 2, 4, 8] if args.pool else []):
+		key = "pool|{} boards".format(boards)
+		results["results"][key] = bench_pool(boards, args.seconds)
+		print("{:<16} pool_fps_per_board={:.2f}".format(key, results["results"][key]["pool_fps_per_board"]))
+	for time_div in timebases:
+		time_span_in_micros = int(10*Acquisition.horizontal_unit_in_micros(time_div))
+		for mode, (channel, use_ets) in MODES.items():
+			if use_ets and time_span_in_micros > 500: continue
+			(num_samples, time_between_samples) = Acquisition.sampling_parameters(time_span_in_micros, channel, use_ets, columns, timing)
+			parameters = Acquisition.CaptureParameters(channel, num_samples, time_between_samples, 1, use_ets)
+			metrics = {}
+			metrics.update(bench_decode(parameters, args.seconds))
+			metrics.update(bench_acquisition(parameters, args.seconds, timing.max_samples))
+			metrics.update(bench_raster(parameters, args.seconds, columns))
+			if gui != None: metrics.update(gui.bench(time_div, parameters, args.seconds))
+			key = "{}|{}".format(time_div, mode)
+			results["results"][key] = metrics
+			print("{:<16} ".format(key) + " ".join("{}={:.2f}".format(m, v) for m, v in metrics.items()))
+	if gui != None: gui.close()
+
+	with open(args.output, "w") as f:
+		json.dump(results, f, indent=1)
+	if args.baseline:
+		with open(args.baseline) as f:
+			baseline = json.load(f)
+		regressions = compare(results, baseline, args.tolerance)
+		if same_machine(results, baseline, args.tolerance):
+			for r in regressions: print("REGRESSION", r)
+			if regressions: return 1
+		else:
+			print("Warning: the baseline comes from another machine (calibration {} s, here {:.4f} s), regenerate it here to compare".format(
+				  baseline["meta"].get("calibration_s"), results["meta"]["calibration_s"]), file=sys.stderr)
+			for r in regressions: print("WARNING", r)
+	return 0
+
+if __name__ == "__main__":
+	sys.exit(main())
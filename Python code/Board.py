@@ -1,24 +1,105 @@
 import serial # pip3 install pySerial
+import os
 import time
 import threading
+import collections
+import numpy as np
 
-import Globals
+from Instrumentation import probe
+
+def decode_payload(buffer, num_samples):
+	""" (samples,period_status,period_value) from the payload of a capture of num_samples (both channels) """
+	num_bytes	  = (num_samples+2)*2
+	samples 	  = np.frombuffer(buffer, dtype=">u2", count=num_samples)
+	period_status = (buffer[num_bytes-4]<<8) + buffer[num_bytes-3]
+	period_value  = (buffer[num_bytes-2]<<8) + buffer[num_bytes-1]
+	return (samples,period_status,period_value)
+
+"""
+In dual channel captures the ADC converts the channels in turn, a conversion every half the time between
+samples: every sample of channel 2 (samples[2::2]) is taken this fraction of the time between samples
+after the sample of channel 1 with the same index (samples[1::2]).
+"""
+DUAL_CHANNEL_SKEW = 0.5
+
+class FairLock():
+	"""
+	Lock granted in the order it was asked for. threading.Semaphore is not fair: a thread releasing it
+	and asking again at once (as the acquisition worker does between payloads) gets it back before one
+	that has been waiting, which may then wait forever.
+	"""
+	def __init__(self):
+		self.condition = threading.Condition()
+		self.next	   = 0 # ticket of the next to ask
+		self.serving   = 0 # ticket of the one holding it
+
+	def acquire(self):
+		with self.condition:
+			ticket = self.next
+			self.next += 1
+			while self.serving != ticket:
+				self.condition.wait()
+
+	def release(self):
+		with self.condition:
+			self.serving += 1
+			self.condition.notify_all()
+
+	""" with board.semaphore: released whatever is raised inside, a serial error or a bad payload """
+	def __enter__(self):
+		self.acquire()
+		return self
+
+	def __exit__(self, *exception):
+		self.release()
 
 class Board():
-	def __init__(self, port):
+	"""
+	timeout is that of the reads of the serial port. With 0 the port is polled, which answers soonest
+	but keeps a core busy while waiting; with a few milliseconds the thread sleeps in the OS until the
+	bytes arrive, so that several boards can be read from threads of the same process (see Pool.py).
+	"""
+	def __init__(self, port, timeout=0):
+		self.identity = self.port_identity(port)
 		try:
-			self.serial = serial.Serial(port, 1, timeout=0) # USB CDC, speed is auto adjusted to max value
+			if port.startswith("sim:"): # software stand-in for the board, see Simulator.py
+				import Simulator
+				self.serial = Simulator.SimulatedSerial.from_url(port)
+				self.serial.timeout = timeout
+			else:
+				self.serial = serial.Serial(port, 1, timeout=timeout) # USB CDC, speed is auto adjusted to max value
 			self.ok = True
-			self.semaphore = threading.Semaphore()
+			self.semaphore = FairLock() # reads from the board and the requests in flight, first come first served
+			self.write_lock = threading.Lock() # the lines written, see send_command
+			self.in_flight = collections.deque() # (owner, parameters) of the capture requests whose payload has not been read yet
+			self.stashed   = {} # owner: deque of (payload, parameters) read for it while another caller waited for its own
+			self.queue_lock = threading.Lock() # in_flight and stashed, counted without waiting for a read
 		except: 
 			self.ok = False
 
 	def close(self):
 		self.serial.close()
 		
+	@staticmethod
+	def port_identity(port):
+		"""
+		Identifies the board for its calibration data: the USB vendor, product and serial number of the
+		device at port, which stay the same whatever port it is plugged in. The port name if not found.
+		"""
+		if port.startswith("sim:"): return "sim"
+		try:
+			from serial.tools import list_ports
+			device = os.path.realpath(port)
+			for p in list_ports.comports():
+				if os.path.realpath(p.device) == device and p.serial_number:
+					return "usb:{:04x}:{:04x}:{}".format(p.vid or 0, p.pid or 0, p.serial_number)
+		except Exception:
+			pass
+		return port
+		
 	""" 
 	Returns num_samples taken every time_between_samples (in micros if use_ets==False, in nanos if use_ets==True)
-	if channel==3, data for both channels is gathered simultaneously. The returned list contains
+	if channel==3, data for both channels is gathered simultaneously. The returned array contains
 	one channel in even positions and the other channel in odd positions.
 	Following the samples taken two additional 2-byte integers are expected:
 		For non-ets mode:
@@ -27,46 +108,148 @@ class Board():
 		For ets mode:
 			The period calculation status: 100:ok 101:timeout
 			The period value: In nanoseconds
+	
+	The payload is read straight into a byte buffer (allocated here, or passed by the caller in 
+	buffer to reuse it between frames) and the samples are returned as a big-endian uint16 numpy 
+	array viewing that buffer, so no per-sample Python objects are created. When a caller supplied
+	buffer is reused, the returned array is overwritten by the next capture into the same buffer.
+	"""
+	def osc_get_samples(self, channel, num_samples, time_between_samples, trigger_channel, use_ets, buffer=None):
+		with self.semaphore:
+			self._drain_in_flight()
+			self._osc_write_request(channel, num_samples, time_between_samples, trigger_channel, use_ets)
+			return self._osc_read_payload(channel, num_samples, buffer)
+		
+	""" 
+	Pipelined capture. The firmware queues the commands it receives while busy, so a request sent before 
+	the payload of the previous one has been read makes the board start capturing again as soon as that 
+	payload is out, instead of waiting for the host to read and draw it.
+	
+	osc_request_samples sends a request and returns immediately. osc_receive_samples reads the payload of 
+	the oldest request in flight of the caller and returns (samples,period_status,period_value,parameters),
+	parameters being the tuple of arguments the request was sent with, or None if the caller has no request
+	in flight.
+	
+	Requests belong to their owner, by default the thread sending them, and only the owner receives their
+	payloads. The board answers in order, so payloads of other owners older than those of the caller are
+	read first and kept for them (stashed). Any other command reading from the board first reads the
+	payloads in flight: those of the caller are discarded, those of other owners are kept for them.
 	"""
-	def osc_get_samples(self, channel, num_samples, time_between_samples, trigger_channel, use_ets):
-		self.semaphore.acquire()
+	def osc_request_samples(self, channel, num_samples, time_between_samples, trigger_channel, use_ets, owner=None):
+		owner = self._owner(owner)
+		with self.semaphore:
+			self._osc_write_request(channel, num_samples, time_between_samples, trigger_channel, use_ets)
+			with self.queue_lock:
+				self.in_flight.append((owner, (channel, num_samples, time_between_samples, trigger_channel, use_ets)))
+		
+	def osc_receive_samples(self, buffer=None, owner=None):
+		owner = self._owner(owner)
+		with self.semaphore:
+			with self.queue_lock:
+				if self.stashed.get(owner):
+					(payload, parameters) = self.stashed[owner].popleft()
+					return self._deliver(payload, parameters, buffer)
+			while True:
+				with self.queue_lock:
+					if not any(o == owner for (o, p) in self.in_flight): return None
+					(o, parameters) = self.in_flight.popleft()
+				if o == owner:
+					return self._osc_read_payload(parameters[0], parameters[1], buffer) + (parameters,)
+				self._stash(o, parameters)
+		
+	def osc_requests_in_flight(self, owner=None):
+		""" Of the caller: sent and not received yet, including payloads read and kept for it """
+		owner = self._owner(owner)
+		with self.queue_lock:
+			return sum(1 for (o, p) in self.in_flight if o == owner) + len(self.stashed.get(owner, ()))
+			
+	@staticmethod
+	def _owner(owner):
+		return owner if owner != None else threading.get_ident()
+		
+	def _stash(self, owner, parameters):
+		""" Reads the payload of another owner's request, to be delivered to it later """
+		num_samples = parameters[1]*(2 if parameters[0] == 3 else 1)
+		payload = bytearray((num_samples+2)*2)
+		self._osc_read_payload(parameters[0], parameters[1], payload)
+		with self.queue_lock:
+			self.stashed.setdefault(owner, collections.deque()).append((payload, parameters))
+			
+	def _deliver(self, payload, parameters, buffer):
+		""" A stashed payload, copied into buffer if given as if it had just been read into it """
+		if buffer is not None and len(buffer) >= len(payload):
+			buffer[:len(payload)] = payload
+			payload = buffer
+		return decode_payload(payload, parameters[1]*(2 if parameters[0] == 3 else 1)) + (parameters,)
+		
+	def _drain_in_flight(self):
+		owner = self._owner(None)
+		while True:
+			with self.queue_lock:
+				if not self.in_flight: break
+				(o, parameters) = self.in_flight.popleft()
+			if o == owner:
+				self._osc_read_payload(parameters[0], parameters[1], None)
+			else:
+				self._stash(o, parameters)
+		with self.queue_lock:
+			self.stashed.pop(owner, None)
+		
+	def _osc_write_request(self, channel, num_samples, time_between_samples, trigger_channel, use_ets):
+		t = probe.start()
 		if not use_ets:
 			cmd = "osc get_samples {} {} {} {}".format(channel, num_samples, time_between_samples, trigger_channel)
 		else:
 			cmd = "osc get_samples_ets {} {} {} {}".format(channel, num_samples, time_between_samples, trigger_channel)
-		self.serial.write(bytes(cmd+"\n", "utf-8"))
+		with self.write_lock:
+			self.serial.write(bytes(cmd+"\n", "utf-8"))
+		probe.lap("write", t)
+		
+	def _osc_read_payload(self, channel, num_samples, buffer):
 		if channel == 3: num_samples = num_samples*2
-		num_samples += 2 # returned data will include samples plus period_status and period_value
+		num_bytes = (num_samples+2)*2 # returned data will include samples plus period_status and period_value
 		
-		data = []
-		two_bytes = []
+		if buffer is None or len(buffer) < num_bytes:
+			buffer = bytearray(num_bytes)
+		view = memoryview(buffer)[:num_bytes]
+		received = self._receive_into(view)
+		if received != num_bytes:
+			print("Error: osc_get_samples timeout. num_samples:", num_samples+2, "len(data):", received//2)
+			view[received:] = bytes(num_bytes-received)
+			probe.count("timeouts")
+		
+		t = probe.start()
+		data = decode_payload(buffer, num_samples)
+		probe.lap("decode", t)
+		return data
+		
+	def _receive_into(self, view):
+		received = 0
 		t0 = time.time()
-		while len(data) != num_samples and time.time()-t0 < 5.0:
-			buff = self.serial.read(self.serial.in_waiting or 1) # in_waiting needed for >115200bps. Learnt from Python's miniterm
-			if buff: 
-				for i in range(0,len(buff)):
-					two_bytes.append(buff[i])
-					if len(two_bytes) == 2:
-						data.append(two_bytes[0]*256+two_bytes[1])
-						two_bytes = []
-		self.semaphore.release()
-		if len(data) != num_samples:
-			print("Error: osc_get_samples timeout. num_samples:", num_samples, "len(data):", len(data))
-			while len(data) != num_samples:
-				data.append(0)
-		return (data[:-2],data[-2],data[-1])
+		t  = probe.start()
+		while received == 0 and time.time()-t0 < 5.0:
+			received = self.serial.readinto(view) or 0
+		t = probe.lap("first_byte", t)
+		while received != len(view) and time.time()-t0 < 5.0:
+			received += self.serial.readinto(view[received:]) or 0
+		probe.lap("transfer", t)
+		return received
 		
+	"""
+	Commands with no answer only need their line not to be mixed with another one written at the same time,
+	so they take the write lock alone and not the semaphore: a capture payload being read (which holds the
+	semaphore for as long as the capture takes) does not make them wait, nor they the capture.
+	"""
 	def send_command(self, command):
-		self.semaphore.acquire()
-		self.serial.write(bytes(command+"\n", "utf-8"))
-		self.semaphore.release()
+		with self.write_lock:
+			self.serial.write(bytes(command+"\n", "utf-8"))
 		
 	def get_value(self, command, ilength):
-		self.semaphore.acquire()
-		self.serial.write(bytes(command+"\n", "utf-8"))
-		value = self._receive_integer(ilength)
-		self.semaphore.release()
-		return value
+		with self.semaphore:
+			self._drain_in_flight()
+			with self.write_lock:
+				self.serial.write(bytes(command+"\n", "utf-8"))
+			return self._receive_integer(ilength)
 		
 	def _receive_integer(self, num_bytes):
 		data = []
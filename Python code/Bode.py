@@ -0,0 +1,159 @@
+import time
+import tkinter as tk
+from tkinter import ttk
+from tkinter import messagebox
+from tkinter import filedialog
+import numpy as np
+import matplotlib.pyplot as plt
+from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+
+import Globals
+import FrequencyResponse
+
+"""
+BODE ANALYZER
+
+	Window of the frequency response sweep (see FrequencyResponse.py): the AD9833 output to the input
+	of the device under test and to channel 1, its output to channel 2. Gain and phase are drawn as
+	the points are measured. The sweep takes over the captures and the AD9833 (see Globals.claim_board),
+	so it is not started while the oscilloscope, the function generator or a calibration use them, and
+	those are not started while it runs.
+"""
+
+class Bode(tk.Frame):
+
+	def __init__(self, parent, *args, **kwargs):
+		tk.Frame.__init__(self, parent, *args, **kwargs)
+		self.parent = parent
+		parent.protocol("WM_DELETE_WINDOW", self.on_close_window)
+		parent.geometry("+{}+{}".format(Globals.config["Bode"]["xpos"], Globals.config["Bode"]["ypos"]))
+		parent.title("Bode Analyzer")
+
+		mdpi = int(Globals.config["Settings-Osc-Display"]["DPI"])
+		self.fig, (self.axis_gain, self.axis_phase) = plt.subplots(2, 1, sharex=True, figsize=(600/mdpi, 450/mdpi), dpi=mdpi)
+		self.gain_line,	 = self.axis_gain .semilogx([], [], color="yellow")
+		self.phase_line, = self.axis_phase.semilogx([], [], color="cyan")
+		self.axis_gain .set_ylabel("Gain (dB)")
+		self.axis_phase.set_ylabel("Phase (deg)")
+		self.axis_phase.set_xlabel("Frequency (Hz)")
+		for axis in [self.axis_gain, self.axis_phase]:
+			axis.set_facecolor((0.5,0.5,0.5))
+			axis.grid(True, which="both")
+		self.fig.patch.set_facecolor((0.6,0.6,0.6))
+		self.fig.tight_layout()
+		self.canvas = FigureCanvasTkAgg(self.fig, master=parent)
+		self.canvas.get_tk_widget().pack(fill="both", expand=True)
+
+		frame_params = tk.Frame(parent)
+		self.start	= tk.Entry(frame_params, width=8)
+		self.stop	= tk.Entry(frame_params, width=8)
+		self.points = tk.Entry(frame_params, width=5)
+		self.settle = tk.Entry(frame_params, width=4)
+		self.cycles = tk.Entry(frame_params, width=4)
+		for (column, text, entry) in [(0, "Start Hz: ", self.start), (2, "Stop Hz: ", self.stop), (4, "Points: ", self.points), (6, "Settle: ", self.settle), (8, "Cycles: ", self.cycles)]:
+			tk.Label(frame_params, text=text).grid(row=0, column=column, sticky="e", padx=2, pady=2)
+			entry.grid(row=0, column=column+1, sticky="w", padx=2, pady=2)
+		frame_params.pack(padx=5, pady=2)
+
+		frame_buttons = tk.Frame(parent)
+		self.button_sweep  = tk.Button(frame_buttons, text="Sweep", command=self.on_sweep)
+		self.button_cancel = tk.Button(frame_buttons, text="Stop", command=self.on_cancel, state="disabled")
+		self.button_save   = tk.Button(frame_buttons, text="Save CSV", command=self.on_save, state="disabled")
+		self.progress_var  = tk.DoubleVar()
+		self.progress_bar  = ttk.Progressbar(frame_buttons, variable=self.progress_var, maximum=100, length=150)
+		self.info		   = tk.Label(frame_buttons, width=24, anchor="w")
+		for widget in [self.button_sweep, self.button_cancel, self.button_save, self.progress_bar, self.info]:
+			widget.pack(side="left", padx=2)
+		frame_buttons.pack(padx=5, pady=5)
+
+		self.analyzer = None
+
+		""" set initial values for widgets """
+		self.start .insert(0, Globals.config["Bode"]["Start"])
+		self.stop  .insert(0, Globals.config["Bode"]["Stop"])
+		self.points.insert(0, Globals.config["Bode"]["Points"])
+		self.settle.insert(0, Globals.config["Bode"]["Settle"])
+		self.cycles.insert(0, Globals.config["Bode"]["Cycles"])
+
+	def on_sweep(self):
+		try:
+			(start, stop, points) = (float(self.start.get()), float(self.stop.get()), int(self.points.get()))
+			(settle, cycles)	  = (float(self.settle.get()), float(self.cycles.get()))
+		except ValueError:
+			messagebox.showinfo(message="Invalid characters", title="Bad sweep values", parent=self.parent)
+			return
+		if not (0 < start < stop < 1000000) or points < 2 or settle < 0 or cycles <= 0:
+			messagebox.showinfo(message="Frequencies in (0,1000000), start below stop,\nat least 2 points and some cycles", title="Bad sweep values", parent=self.parent)
+			return
+		holder = Globals.claim_board("Bode Analyzer", "capture", "generator")
+		if holder != None:
+			messagebox.showinfo(message="The board is in use by the {}.".format(holder), title="Bode Analyzer", parent=self.parent)
+			return
+		Globals.commands.flush() # nothing queued may retune the generator during the sweep
+		transfer_functions = tuple(Globals.calibration.transfer_function(Globals.board.identity, channel) for channel in [1,2])
+		self.analyzer = FrequencyResponse.Analyzer(Globals.board, FrequencyResponse.log_frequencies(start, stop, points), settle, cycles, transfer_functions=transfer_functions)
+		self.analyzer.start()
+		self.button_sweep .config(state="disabled")
+		self.button_save  .config(state="disabled")
+		self.button_cancel.config(state="normal")
+		self.on_progress()
+
+	def on_progress(self):
+		self.progress_var.set(self.analyzer.progress*100)
+		self.draw()
+		if not self.analyzer.done:
+			self.info.configure(text="{} points".format(len(self.analyzer.frequencies)))
+			self.after(100, self.on_progress)
+			return
+		Globals.release_board("Bode Analyzer")
+		self.progress_var.set(0)
+		self.info.configure(text="{} points in {:.1f} s".format(len(self.analyzer.frequencies), self.analyzer.seconds))
+		self.button_sweep .config(state="normal")
+		self.button_cancel.config(state="disabled")
+		self.button_save  .config(state="normal" if self.analyzer.frequencies else "disabled")
+		if self.analyzer.error != None:
+			messagebox.showinfo(message="Sweep failed.\n{}".format(self.analyzer.error), title="Bode Analyzer", parent=self.parent)
+		elif self.analyzer.skipped:
+			messagebox.showinfo(message="Above what the board can sample: {} Hz".format(", ".join(str(f) for f in self.analyzer.skipped[:5]) + (" ..." if len(self.analyzer.skipped) > 5 else "")), title="Bode Analyzer", parent=self.parent)
+
+	def draw(self):
+		""" the points measured so far """
+		n = len(self.analyzer.frequencies)
+		if n == 0: return
+		freqs = np.array(self.analyzer.frequencies[:n])
+		self.gain_line .set_data(freqs, self.analyzer.gain_db()[:n])
+		self.phase_line.set_data(freqs, self.analyzer.phase_degrees()[:n])
+		for axis in [self.axis_gain, self.axis_phase]:
+			axis.relim()
+			axis.autoscale_view()
+		self.canvas.draw_idle()
+
+	def on_cancel(self):
+		if self.analyzer != None: self.analyzer.cancel()
+
+	def on_save(self):
+		name = filedialog.asksaveasfilename(title="Save sweep", initialfile=time.strftime("PicoScope-bode-%Y%m%d-%H%M%S.csv"), filetypes=[("CSV", "*.csv")], parent=self.parent)
+		if not name: return
+		try:
+			self.analyzer.save_csv(name)
+		except Exception as e:
+			messagebox.showinfo(message="Cannot save.\n{}".format(e), title="Error", parent=self.parent)
+
+	def on_close_window(self):
+		if self.analyzer != None and not self.analyzer.done:
+			self.analyzer.cancel()
+			self.analyzer.join() # stops the AD9833 before leaving
+		Globals.release_board("Bode Analyzer")
+		g = self.parent.geometry().split("+")
+		Globals.config["Bode"]["xpos"]	 = str(g[1])
+		Globals.config["Bode"]["ypos"]	 = str(g[2])
+		Globals.config["Bode"]["Start"]	 = self.start.get()
+		Globals.config["Bode"]["Stop"]	 = self.stop.get()
+		Globals.config["Bode"]["Points"] = self.points.get()
+		Globals.config["Bode"]["Settle"] = self.settle.get()
+		Globals.config["Bode"]["Cycles"] = self.cycles.get()
+		Globals.save_config()
+
+		plt.close(self.fig)
+		Globals.toplevel_windows["Bode"].parent.destroy()
+		Globals.toplevel_windows["Bode"] = None
@@ -0,0 +1,277 @@
+import ast
+import json
+import math
+import os
+import threading
+import time
+import numpy as np
+
+"""
+INPUT STAGE CALIBRATION DATA
+
+	The attenuation of the input stage depends on the signal frequency. The calibration process
+	measures it at a set of frequencies (see Settings.on_osc_calibrate), giving a transfer function
+	per board and channel kept by a CalibrationStore in Calibration.json.
+
+	TransferFunction holds it as frequency-sorted arrays for interpolation. It does not depend on
+	the GUI, so scripts and the headless capture (Capture.py) share it with the oscilloscope:
+		store = Calibration.CalibrationStore("Calibration.json")
+		tr	  = store.transfer_function(board.identity, 1)
+
+	The Calibrator measures it: the AD9833 output, of known amplitude, is connected to both channels and
+	captured in dual channel mode at every test frequency. The amplitude of each capture comes from a
+	least squares sine fit (see fit_sine), far less sensitive to noise than max-min. Captures are repeated
+	until the last few agree, which tells the signal has settled after the frequency change, and their
+	amplitudes are averaged.
+"""
+
+STORE_VERSION = 1
+
+""" Output of the AD9833 as measured, see Settings.on_osc_calibrate """
+AD9833_SINE_VPP = 0.630
+
+class TransferFunction():
+
+	def __init__(self, freqs=(), atts=(), phase=None):
+		""" attenuation (and optionally phase shift, in radians) of the input stage at each frequency """
+		order		 = np.argsort(np.asarray(freqs, dtype=float))
+		self.freqs 	 = np.asarray(freqs, dtype=float)[order]
+		self.atts  	 = np.asarray(atts, dtype=float)[order]
+		self.phase	 = np.asarray(phase, dtype=float)[order] if phase is not None else None
+		self.average = self.atts.mean() if len(self.atts) else 1.0
+		self.cache	 = {} # measured frequency -> attenuation
+
+	@classmethod
+	def from_dict(cls, tr_func):
+		""" From a {frequency: attenuation} dict """
+		return cls(list(tr_func.keys()), list(tr_func.values()))
+
+	@property
+	def tr_func(self):
+		return dict(zip(self.freqs.tolist(), self.atts.tolist()))
+
+	def calibrated(self):
+		return len(self.atts) != 0 and bool(np.all(self.atts != 0))
+
+	def attenuation_at(self, freqs):
+		""" Attenuation at each of the given frequencies, clamped to the calibrated range """
+		if len(self.atts) == 0: return np.ones_like(freqs, dtype=float)
+		return np.interp(freqs, self.freqs, self.atts)
+
+	def phase_at(self, freqs):
+		""" Phase shift in radians at each of the given frequencies, 0 if not calibrated """
+		if self.phase is None or len(self.phase) == 0: return np.zeros_like(freqs, dtype=float)
+		return np.interp(freqs, self.freqs, self.phase)
+
+	def attenuation(self, period_info):
+		"""
+		Attenuation for a frame given its (period_status,period_value) as returned by Board.osc_get_samples,
+		or None. Without a valid period the average attenuation is used.
+		"""
+		if period_info == None:
+			return self.average
+		if period_info[1] == 0:
+			return self.average
+		if period_info[0] >= 3:
+			return self.average
+		f = int(1000000/period_info[1])
+		att = self.cache.get(f)
+		if att == None:
+			if len(self.cache) > 10000: self.cache.clear()
+			att = float(self.attenuation_at(f))
+			self.cache[f] = att
+		return att
+
+class CalibrationStore():
+	"""
+	The transfer functions of every board and channel calibrated, in a JSON file of its own so that
+	PicoScope.ini stays small:
+		{"version": 1,
+		 "boards": {board identity: {"1": {"frequencies": [...], "attenuation": [...], "phase": [...] or null,
+										   "created": "2024-01-01 12:00:00"},
+									 "2": {...}}}}
+	Board identity is Board.identity. The file is read once; transfer_function() returns the same
+	ready to use TransferFunction object until the channel is calibrated again.
+	"""
+	def __init__(self, path):
+		self.path	   = path
+		self.boards	   = {}
+		self.functions = {} # (identity, channel) -> TransferFunction
+		if os.path.exists(path):
+			with open(path) as f:
+				data = json.load(f)
+			if data.get("version") != STORE_VERSION:
+				raise ValueError("Unsupported calibration file version {}".format(data.get("version")))
+			self.boards = data["boards"]
+
+	def has(self, identity, channel):
+		return str(channel) in self.boards.get(identity, {})
+
+	def transfer_function(self, identity, channel):
+		""" Uncalibrated (attenuation 1 at every frequency) if there is no data for the board and channel """
+		key = (identity, channel)
+		if key not in self.functions:
+			entry = self.boards.get(identity, {}).get(str(channel))
+			self.functions[key] = TransferFunction(entry["frequencies"], entry["attenuation"], entry.get("phase")) if entry else TransferFunction()
+		return self.functions[key]
+
+	def set(self, identity, channel, freqs, atts, phase=None):
+		self.boards.setdefault(identity, {})[str(channel)] = {"frequencies": [float(f) for f in freqs],
+															   "attenuation": [float(a) for a in atts],
+															   "phase":		  [float(p) for p in phase] if phase is not None else None,
+															   "created":	  time.strftime("%Y-%m-%d %H:%M:%S")}
+		self.functions.pop((identity, channel), None)
+
+	def save(self):
+		""" Written to a temporary file first, so an interrupted save never leaves a truncated store """
+		with open(self.path+".tmp", "w") as f:
+			json.dump({"version": STORE_VERSION, "boards": self.boards}, f)
+		os.replace(self.path+".tmp", self.path)
+
+	def import_ini(self, config, identity):
+		"""
+		Moves the InputStageTrFunc strings of PicoScope.ini (the format before this store) into the store
+		for the given board, unless it has its own data already. Returns True if config was changed.
+		"""
+		changed = False
+		for channel in [1,2]:
+			section = "Osc-Ch{}".format(channel)
+			if not config.has_option(section, "InputStageTrFunc"): continue
+			value = config[section]["InputStageTrFunc"]
+			if value and not self.has(identity, channel):
+				try:
+					tr_func = ast.literal_eval(value)
+				except (ValueError, SyntaxError):
+					print("Error: cannot read InputStageTrFunc of channel", channel)
+					continue
+				if any(tr_func.values()): # all zeros when never calibrated
+					self.set(identity, channel, list(tr_func.keys()), list(tr_func.values()))
+			config.remove_option(section, "InputStageTrFunc")
+			changed = True
+		if changed: self.save()
+		return changed
+
+def fit_sine(samples, seconds_per_sample, frequency, iterations=4):
+	"""
+	Fits b*sin(wt) + c*cos(wt) + d to every row of samples, w starting at 2*pi*frequency and refined
+	for each row by Gauss-Newton iterations (the four parameter fit of IEEE 1057), all rows at once.
+	Returns (amplitude, frequency) arrays, one value per row, amplitude in the units of samples.
+	"""
+	y = np.atleast_2d(np.asarray(samples, dtype=float))
+	t = np.arange(y.shape[1])*seconds_per_sample
+	w0 = 2*np.pi*frequency
+	
+	""" three parameter fit at the nominal frequency, one design matrix for all rows """
+	A = np.column_stack((np.sin(w0*t), np.cos(w0*t), np.ones_like(t)))
+	(b, c, d) = np.linalg.lstsq(A, y.T, rcond=None)[0]
+	w = np.full(len(y), w0)
+	
+	for i in range(iterations):
+		wt = w[:,None]*t
+		sin, cos = np.sin(wt), np.cos(wt)
+		J = np.stack((sin, cos, np.ones_like(wt), t*(b[:,None]*cos - c[:,None]*sin)), axis=2) # rows x samples x 4
+		G = np.einsum("rni,rnj->rij", J, J)
+		h = np.einsum("rni,rn->ri", J, y)
+		try:
+			(b, c, d, dw) = np.linalg.solve(G, h[:,:,None])[:,:,0].T
+		except np.linalg.LinAlgError:
+			break
+		w = np.clip(w+dw, 0.95*w0, 1.05*w0)
+	return np.hypot(b, c), w/(2*np.pi)
+
+def capture_plan(frequency, micros_per_sample, max_samples, min_cycles=2, min_samples=200):
+	"""
+	(num_samples, micros_between_samples) for a capture of at least min_cycles periods of frequency 
+	with between min_samples and max_samples samples, or None if the board cannot sample it fast enough.
+	"""
+	period_in_micros = 1000000/frequency
+	if period_in_micros/micros_per_sample < 2.2: return None # too close to the Nyquist frequency
+	micros_between_samples = max(micros_per_sample, math.ceil(min_cycles*period_in_micros/max_samples))
+	cycles = max(min_cycles, math.ceil(min_samples*micros_between_samples/period_in_micros))
+	num_samples = min(max_samples, int(cycles*period_in_micros/micros_between_samples))
+	return (num_samples, micros_between_samples)
+
+class Calibrator(threading.Thread):
+	"""
+	Runs a calibration in the background. progress goes from 0 to 1, and when done is set results holds
+	{channel: {frequency: attenuation}} for the channels that had the signal connected. A frequency the
+	board cannot sample is left out.
+	"""
+	def __init__(self, board, frequencies, captures=3, tolerance=0.01, max_captures=8, max_samples=1000):
+		threading.Thread.__init__(self, name="PicoScope calibration", daemon=True)
+		self.board		  = board
+		self.frequencies  = frequencies
+		self.captures	  = captures		# averaged, once they agree within tolerance
+		self.tolerance	  = tolerance
+		self.max_captures = max_captures	# per frequency, if the amplitude never settles
+		self.max_samples  = max_samples		# per channel and capture
+		self.progress	  = 0.0
+		self.results	  = {1: {}, 2: {}}
+		self.log		  = []				# text lines with the details of every frequency
+		self.cancelled	  = False
+		self.done		  = False
+		self.error		  = None
+
+	def cancel(self):
+		self.cancelled = True
+
+	def run(self):
+		try:
+			self.calibrate()
+		except Exception as e:
+			self.error = e
+		finally:
+			if self.board.osc_requests_in_flight(): self.board.get_value("osc get_max_samples", 2) # drains them
+			self.board.send_command("funcgen stop AD9833")
+			self.done = True
+
+	def calibrate(self):
+		micros_per_sample = self.board.get_value("osc get_micros_needed_for_2sample", 2)
+		max_samples		  = min(self.max_samples, self.board.get_value("osc get_max_samples", 2)//2)
+		amplitudes = {1: {}, 2: {}}
+		self.log.append("freq   samples us/sample captures vpp1   vpp2")
+		for (i, freq) in enumerate(self.frequencies):
+			if self.cancelled: return
+			self.progress = i/len(self.frequencies)
+			plan = capture_plan(freq, micros_per_sample, max_samples)
+			if plan == None:
+				self.log.append("{: <6} cannot be sampled".format(freq))
+				continue
+			(num_samples, micros_between_samples) = plan
+			self.board.send_command("funcgen AD9833_set {} {}".format(freq, "Sine"))
+			(vpp, captures) = self.measure(freq, num_samples, micros_between_samples)
+			for channel in [1,2]:
+				amplitudes[channel][freq] = vpp[channel-1]
+			self.log.append("{: <6} {: <7} {: <9} {: <8} {:.4f} {:.4f}".format(freq, num_samples, micros_between_samples, captures, vpp[0], vpp[1]))
+		
+		""" a channel without the signal connected shows just noise: leave its calibration as it is """
+		for channel in [1,2]:
+			measured = amplitudes[channel]
+			if measured and min(measured.values()) > 0.01:
+				self.results[channel] = dict((f, AD9833_SINE_VPP/v) for f, v in measured.items())
+		self.progress = 1.0
+
+	def measure(self, freq, num_samples, micros_between_samples):
+		"""
+		Captures both channels until the Vpp of the last captures agree, returns their average Vpp at the
+		ADC input for (ch1, ch2) and the number of captures taken. Requests are pipelined, one ahead, and
+		only the payloads of requests sent here are received (see Board.osc_receive_samples).
+		"""
+		request = (3, num_samples, micros_between_samples, 1, False)
+		vpps	= []
+		self.board.osc_request_samples(*request)
+		while True:
+			if len(vpps)+self.board.osc_requests_in_flight() < self.max_captures:
+				self.board.osc_request_samples(*request)
+			data = self.board.osc_receive_samples()
+			if data == None: raise RuntimeError("capture requests lost")
+			(samples, status, value, sent_with) = data
+			if sent_with != request: continue # not a capture of this frequency
+			both = np.array([samples[1::2][:num_samples-1], samples[2::2]])
+			(amplitude, fitted_freq) = fit_sine(both, micros_between_samples*1e-6, freq)
+			vpps.append(2*amplitude*3.3/4095)
+			last = np.array(vpps[-self.captures:])
+			settled = len(last) == self.captures and np.all(last.max(axis=0) <= last.min(axis=0)*(1+self.tolerance))
+			if settled or len(vpps) == self.max_captures or self.cancelled: break
+		while self.board.osc_requests_in_flight(): self.board.osc_receive_samples() # of the old frequency
+		return (np.mean(vpps[-self.captures:], axis=0), len(vpps))
@@ -0,0 +1,146 @@
+import argparse
+import configparser
+import os.path
+import sys
+import time
+import numpy as np
+
+import Board
+import Acquisition
+import Recorder
+import Calibration
+from Instrumentation import probe
+
+"""
+HEADLESS CAPTURE
+
+	Captures frames without the GUI, for test benches and scripts. Neither tkinter nor matplotlib are
+	imported. PicoScope.ini (for the port) and Calibration.json are only read, never written.
+
+	From the command line, e.g. 100 frames of channel 1 at 1 ms/div:
+		python3 Capture.py --channel 1 --time-div "1 ms" --count 100 --output frames.npy
+	or everything captured in 60 seconds, as a recording (see Recorder.py):
+		python3 Capture.py --channel 3 --time-div "10 us" --duration 60 --output session
+
+	From a script:
+		capture = Capture.HeadlessCapture(Board.Board("/dev/ttyACM0"), channel=1, time_div="1 ms")
+		for frame in capture.frames(count=100):
+			...		# frame.samples is only valid until the next frame is produced
+
+	Requests are pipelined (see Board.osc_request_samples), so frames come as fast as the link allows.
+"""
+
+class HeadlessCapture():
+
+	def __init__(self, board, channel=1, time_div="1 ms", trigger_channel=None, use_ets=False, num_samples=None):
+		"""
+		channel is 1, 2 or 3 (both). num_samples (per channel) is at most the number taken, as many as the
+		timebase and the board buffer allow by default. time_div is one of Acquisition.horizontal_unit_values.
+		"""
+		self.board 	= board
+		self.timing = Acquisition.query_board_timing(board)
+		if trigger_channel == None: trigger_channel = 2 if channel == 2 else 1
+		if use_ets and channel == 3:
+			raise ValueError("ETS mode available only for single channel")
+
+		micros_per_div = Acquisition.horizontal_unit_in_micros(time_div)
+		if micros_per_div == None:
+			raise ValueError("Unknown time/div {}".format(time_div))
+		time_span_in_micros = 10*micros_per_div
+		max_samples_per_channel = self.timing.max_samples if channel != 3 else self.timing.max_samples//2
+		if num_samples == None: num_samples = max_samples_per_channel
+		if num_samples > max_samples_per_channel:
+			raise ValueError("{} samples exceed the board maximum of {}".format(num_samples, max_samples_per_channel))
+		if use_ets: # all the samples of the span are taken, so only as much of it as the buffer holds
+			time_span_in_micros = min(time_span_in_micros, num_samples*self.timing.nanos_per_sample_in_ets_mode/1000)
+		(num_samples, time_between_samples) = Acquisition.sampling_parameters(time_span_in_micros, channel, use_ets, num_samples, self.timing)
+		self.parameters = Acquisition.CaptureParameters(channel, num_samples, time_between_samples, trigger_channel, use_ets)
+		self.samples_per_frame = num_samples * (2 if channel == 3 else 1)
+
+	def frames(self, count=None, duration=None):
+		""" Yields Acquisition.Frame objects until count frames are captured or duration seconds elapse """
+		frame = Acquisition.Frame(bytearray((self.samples_per_frame+2)*2))
+		frame.parameters = self.parameters
+		produced = 0
+		t_end	 = time.time()+duration if duration != None else None
+		wanted	 = lambda: (count == None or produced+self.board.osc_requests_in_flight() < count) and (t_end == None or time.time() < t_end)
+		while True:
+			while self.board.osc_requests_in_flight() < 2 and wanted():
+				self.board.osc_request_samples(*self.parameters)
+			t0 = time.time()
+			data = self.board.osc_receive_samples(buffer=frame.buffer)
+			if data == None: return
+			(frame.samples,frame.period_status,frame.period_value,sent_with) = data
+			frame.timestamp	   = time.time()
+			frame.capture_time = frame.timestamp - t0
+			if t_end != None and frame.timestamp > t_end: continue # read and discard what is left in flight
+			produced += 1
+			yield frame
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description="PicoScope headless capture")
+	parser.add_argument("--config",		 default="PicoScope.ini", help="read the port from this file")
+	parser.add_argument("--calibration", default="Calibration.json", help="input stage calibration, see Calibration.py")
+	parser.add_argument("--port",		 help="serial port, default from the configuration file")
+	parser.add_argument("--channel",	 type=int, choices=[1,2,3], default=1, help="3 for both channels")
+	parser.add_argument("--time-div",	 default="1 ms", help='e.g. "10 us", "0.5 ms"')
+	parser.add_argument("--samples",	 type=int, help="samples per channel and frame, default as many as possible")
+	parser.add_argument("--trigger",	 type=int, choices=[1,2], help="trigger channel")
+	parser.add_argument("--ets",		 action="store_true", help="equivalent time sampling, single channel only")
+	parser.add_argument("--count",		 type=int, help="number of frames")
+	parser.add_argument("--duration",	 type=float, help="seconds to capture")
+	parser.add_argument("--output",		 required=True, help="name.npy for an array of frames (needs --count), else a recording")
+	parser.add_argument("--stats",		 help="write the timing of every stage to this file, .csv or .json (see Instrumentation.py)")
+	args = parser.parse_args(argv)
+	if (args.count == None) == (args.duration == None):
+		parser.error("give either --count or --duration")
+	if args.output.endswith(".npy") and args.count == None:
+		parser.error(".npy output needs --count")
+
+	config = configparser.ConfigParser()
+	if os.path.exists(args.config): config.read(args.config)
+	port = args.port or (config["Settings-Board"]["Port"] if config.has_section("Settings-Board") else "/dev/ttyACM0")
+
+	board = Board.Board(port)
+	if not board.ok:
+		print("Error: board not found at", port, file=sys.stderr)
+		return 1
+	calibration = Calibration.CalibrationStore(args.calibration)
+	for channel in [1,2]:
+		if args.channel in (channel, 3) and not calibration.has(board.identity, channel):
+			print("Warning: channel {} of {} not calibrated".format(channel, board.identity), file=sys.stderr)
+	attenuation = lambda channel, period_info: calibration.transfer_function(board.identity, channel).attenuation(period_info)
+	try:
+		capture = HeadlessCapture(board, args.channel, args.time_div, args.trigger, args.ets, args.samples)
+	except ValueError as e:
+		print("Error:", e, file=sys.stderr)
+		board.close()
+		return 1
+
+	probe.enabled = args.stats != None
+	t0 = time.time()
+	frames = 0
+	if args.output.endswith(".npy"):
+		data  = np.lib.format.open_memmap(args.output, mode="w+", dtype=">u2", shape=(args.count, capture.samples_per_frame))
+		index = np.lib.format.open_memmap(args.output[:-4]+".index.npy", mode="w+", dtype=Recorder.index_dtype, shape=(args.count,))
+		for frame in capture.frames(count=args.count):
+			data[frames] = frame.samples
+			Recorder.fill_index_record(index[frames:frames+1], frame, frames*capture.samples_per_frame, attenuation)
+			frames += 1
+		data.flush()
+		index.flush()
+	else:
+		recorder = Recorder.Recorder(args.output, attenuation)
+		for frame in capture.frames(count=args.count, duration=args.duration):
+			recorder.append(frame)
+			frames += 1
+		recorder.close()
+	elapsed = time.time()-t0
+	board.close()
+	if args.stats: probe.export(args.stats)
+
+	print("{} frames in {:.2f} s: {:.1f} fps, {:.1f} Ksps".format(frames, elapsed, frames/elapsed, frames*capture.samples_per_frame/elapsed/1000), file=sys.stderr)
+	return 0
+
+if __name__ == "__main__":
+	sys.exit(main())
@@ -0,0 +1,99 @@
+import collections
+import threading
+import time
+
+"""
+COMMAND SCHEDULER
+
+	Control commands that expect no answer (funcgen, led) are not written by the GUI but handed to a
+	scheduler thread, which writes them for it:
+		Coalescing		Commands are kept by target, the thing they set: "funcgen pwm_set ..." and
+						"funcgen stop pwm" both set the PWM output, "led fgen on" the fgen LED. A command
+						replaces the one pending for its target, so a mouse wheel spun over a frequency
+						digit or a slider dragged ends in a single command, with the last value.
+		Rate limit		At most one command every interval seconds (MIN_INTERVAL by default). The firmware
+						runs them in turn with the capture requests queued, so the time it spends on
+						them between two frames is bounded whatever the GUI does.
+		Capture first	Board.send_command only takes the write lock of the port, not the semaphore the
+						capture reads hold, so a command never waits for a frame to arrive and a frame
+						never waits for a command more than the time of writing its line.
+	flush() writes what is pending without waiting for the interval and returns when it is written, as
+	when the generator is stopped or its window closed.
+
+		Globals.commands.submit("funcgen AD9833_set 1000 Sine")
+		Globals.commands.flush()
+"""
+
+MIN_INTERVAL = 0.05 # seconds
+
+def target_of(command):
+	""" What command sets: commands with the same target replace each other while pending """
+	words = command.split()
+	if len(words) >= 2 and words[0] == "funcgen":
+		if words[1] == "pwm_set":						return "funcgen pwm"
+		if words[1] == "AD9833_set":					return "funcgen AD9833"
+		if words[1] == "stop" and len(words) >= 3:		return "funcgen " + words[2]
+	if len(words) >= 2 and words[0] == "led":			return "led " + words[1]
+	return command
+
+class CommandScheduler(threading.Thread):
+
+	def __init__(self, board, interval=MIN_INTERVAL):
+		threading.Thread.__init__(self, name="PicoScope commands", daemon=True)
+		self.board		= board
+		self.interval	= interval
+		self.condition	= threading.Condition()
+		self.pending	= collections.OrderedDict() # target: command, oldest first
+		self.running	= True
+		self.urgent		= False
+		self.writing	= False
+		self.last_write	= 0.0
+		self.submitted	= 0
+		self.written	= 0
+
+	def submit(self, command):
+		""" Queues command, replacing the one pending for the same target. Returns at once """
+		target = target_of(command)
+		with self.condition:
+			self.pending.pop(target, None) # the newest goes last, after the commands submitted before it
+			self.pending[target] = command
+			self.submitted += 1
+			self.condition.notify_all()
+
+	def flush(self, timeout=2.0):
+		""" Writes the commands pending now, returns False if they are not written within timeout """
+		with self.condition:
+			self.urgent = True
+			self.condition.notify_all()
+			done = self.condition.wait_for(lambda: not self.pending and not self.writing, timeout)
+			self.urgent = False
+		return done
+
+	def stop(self):
+		self.flush()
+		with self.condition:
+			self.running = False
+			self.condition.notify_all()
+		self.join()
+
+	def run(self):
+		while True:
+			with self.condition:
+				while self.running and not self.pending:
+					self.condition.wait()
+				if not self.running: break
+				delay = self.last_write + self.interval - time.time()
+				if delay > 0 and not self.urgent:
+					self.condition.wait(delay) # commands submitted meanwhile replace those pending
+					continue
+				(target, command) = self.pending.popitem(last=False)
+				self.writing = True
+			try:
+				self.board.send_command(command)
+			except Exception as e:
+				print("Error: command not sent.", command, e)
+			with self.condition:
+				self.last_write = time.time()
+				self.written   += 1
+				self.writing	= False
+				self.condition.notify_all()
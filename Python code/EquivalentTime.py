@@ -0,0 +1,123 @@
+import numpy as np
+
+from Trigger import rising_crossings
+
+"""
+HOST EQUIVALENT TIME SAMPLING
+
+	The ETS of the firmware (get_samples_ets) takes one sample per trigger at an increasing delay: a
+	single channel, up to 50 us/div. Here equivalent time is reconstructed on the host instead, from
+	ordinary captures of a periodic signal taken as fast as the board samples, on one or both channels.
+
+	The capture does not start at the same point of the signal every time, and the period is not a
+	multiple of the time between samples, so the samples of many captures (and of the many periods
+	in each capture) fall at different phases of the signal. For every capture of the trigger channel:
+		1. The period is measured from the crossings of the middle level, interpolated between samples.
+		   It must agree with the period the firmware measured (period_value, when it gives one): a
+		   signal faster than half the sampling rate makes crossings at an alias frequency.
+		2. The phase of the fundamental is fitted by least squares at that period, which places the
+		   capture in time to a fraction of a sample whatever the shape of the signal.
+		3. Every sample is put in the bin of its phase, from 0 to 1 over a period, adding up its value
+		   and a hit (np.bincount over the whole capture, for every channel). The samples of a channel
+		   taken later than those of the trigger channel (Ch 2 in dual channel mode, see
+		   Board.DUAL_CHANNEL_SKEW) fall at a later phase.
+	The screen shows the mean of the bins its columns fall into, time 0 (at the pretrigger fraction of
+	the screen) being a rising zero crossing of the fundamental. Bins without samples yet are
+	interpolated from their neighbours, fill() tells how many of those on screen have samples.
+
+	Bins keep at most MAX_HITS samples each, older ones weighing less beyond that, so the trace
+	follows a signal that changes. Everything starts over when the key given (capture settings),
+	the screen or the period (by more than 1%) change.
+"""
+
+MAX_HITS	 = 64
+MAX_BINS	 = 1 << 18
+MIN_SAMPLES_PER_PERIOD = 2.5
+
+class Reconstructor():
+
+	def __init__(self):
+		self.key	= None
+		self.period = None
+
+	def configure(self, key, window_seconds, columns, pretrigger):
+		""" The screen: window_seconds over columns, pretrigger of it before time 0 """
+		key = (key, window_seconds, columns, pretrigger)
+		if key == self.key: return
+		self.key	 = key
+		self.window	 = window_seconds
+		self.columns = columns
+		self.pre	 = pretrigger
+		self.period	 = None
+
+	def reset(self, period, channels):
+		self.period = period
+		self.bins	= int(min(MAX_BINS, max(16, np.ceil(self.columns*period/self.window))))
+		self.sums	= dict((channel, np.zeros(self.bins)) for channel in channels)
+		self.hits	= dict((channel, np.zeros(self.bins)) for channel in channels)
+		self.captures = 0
+		""" phase bin of every screen column """
+		times = (np.arange(self.columns)+0.5)*self.window/self.columns - self.pre*self.window
+		self.screen_bins = (np.floor((times/period % 1.0)*self.bins)).astype(int) % self.bins
+
+	def add(self, samples, trigger_channel, seconds_per_sample, period_info, offsets=None):
+		"""
+		Folds a capture in, samples being {channel: raw samples}. offsets, {channel: seconds}, tells when
+		the first sample of each channel was taken, 0 if not given. Returns False if the trigger channel
+		is not periodic enough to place it.
+		"""
+		y = (samples[trigger_channel] & 0x0FFF).astype(float)
+		lo, hi = y.min(), y.max()
+		if hi-lo < 16: return False
+		up = rising_crossings(y, (lo+hi)/2, 0.1*(hi-lo))
+		if len(up) < 3: return False
+		period = (up[-1]-up[0])/(len(up)-1) # samples
+		if period < MIN_SAMPLES_PER_PERIOD: return False
+		if period_info != None and period_info[0] < 3 and period_info[1] != 0:
+			firmware = period_info[1]*1e-6 / seconds_per_sample # microseconds to samples
+			if abs(period-firmware) > 0.1*firmware + 1e-6/seconds_per_sample: return False
+
+		""" phase of the fundamental: y ~ b*sin(wt) + c*cos(wt) + d """
+		t	= np.arange(len(y))
+		wt	= t*(2*np.pi/period)
+		sin, cos = np.sin(wt), np.cos(wt)
+		A = np.array([[sin@sin, sin@cos, sin.sum()], [sin@cos, cos@cos, cos.sum()], [sin.sum(), cos.sum(), len(y)]])
+		(b, c, d) = np.linalg.solve(A, [sin@y, cos@y, y.sum()])
+		phase = np.arctan2(c, b)/(2*np.pi) # fundamental at 0 when t/period + phase is an integer
+
+		seconds = period*seconds_per_sample
+		if self.period == None or abs(seconds-self.period) > 0.01*self.period:
+			self.reset(seconds, samples.keys())
+		offsets = offsets or {}
+		for channel, values in samples.items():
+			if channel not in self.sums:
+				self.sums[channel] = np.zeros(self.bins)
+				self.hits[channel] = np.zeros(self.bins)
+			delay = (offsets.get(channel, 0.0)-offsets.get(trigger_channel, 0.0))/seconds_per_sample # samples
+			bins  = (np.floor((((np.arange(len(values))+delay)/period + phase) % 1.0)*self.bins)).astype(int) % self.bins
+			hits  = self.hits[channel]
+			sums  = self.sums[channel]
+			hits += np.bincount(bins, minlength=self.bins)
+			sums += np.bincount(bins, weights=values & 0x0FFF, minlength=self.bins)
+			full = hits > MAX_HITS
+			if full.any():
+				scale = np.where(full, MAX_HITS/np.maximum(hits, 1), 1.0)
+				hits *= scale
+				sums *= scale
+		self.captures += 1
+		return True
+
+	def trace(self, channel):
+		""" float32 raw sample values of the screen columns, or None before the first capture """
+		if self.period == None or channel not in self.sums: return None
+		hits   = self.hits[channel]
+		filled = np.flatnonzero(hits > 0)
+		means  = self.sums[channel][filled]/hits[filled]
+		if len(filled) == self.bins:
+			return means[self.screen_bins].astype(np.float32)
+		return np.interp(self.screen_bins, filled, means, period=self.bins).astype(np.float32)
+
+	def fill(self):
+		""" Fraction of the screen columns with samples of their own, on every channel """
+		if self.period == None: return 0.0
+		return min(np.count_nonzero(hits[self.screen_bins]) for hits in self.hits.values()) / self.columns
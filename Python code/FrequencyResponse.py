@@ -0,0 +1,206 @@
+import argparse
+import configparser
+import csv
+import math
+import os.path
+import sys
+import threading
+import time
+import numpy as np
+
+import Board
+import Calibration
+
+"""
+FREQUENCY RESPONSE
+
+	Gain and phase of a device under test, as a network analyzer: the AD9833 output drives its input,
+	wired to channel 1, and its output is wired to channel 2. The generator is stepped over a grid of
+	frequencies (log_frequencies) and both channels are captured at once at every one of them.
+
+	Gain and phase come from a sine fit at the generator frequency (fit_response), both channels solved
+	in one least squares problem: b*sin(wt) + c*cos(wt) + d gives the phasor b+jc of each. The frequency
+	is that set on the AD9833, so the fit is linear, with no iterations, and a few periods are enough.
+	In dual channel mode the ADC converts the channels in turn, so every sample of channel 2 is taken
+	half the time between samples after that of channel 1 (SKEW), which is corrected from the phase.
+	With the input stage calibrated (see Calibration.py), its attenuation and phase are corrected too.
+
+	Every frequency gets a capture of its own (sweep_plan): samples spaced for settle_cycles plus
+	cycles periods, with at least MIN_SAMPLES of them, and more at high frequencies, where a capture
+	is short and the output of the device often small: as many as MIN_SECONDS take at full speed.
+	The first settle_cycles periods, the device settling after the frequency change, are not fitted.
+	Nothing waits for the settling on the host:
+	the command setting the next frequency and its capture request are sent while the board is still
+	capturing the current one (the firmware runs them in order), so the board never stays idle while
+	the host reads and fits a capture. A sweep of hundreds of points takes seconds.
+
+	From a script, e.g. 200 points from 20 Hz to 100 KHz:
+		analyzer = FrequencyResponse.Analyzer(board, FrequencyResponse.log_frequencies(20, 100000, 200))
+		analyzer.start(); analyzer.join()
+		analyzer.gain_db(), analyzer.phase_degrees()
+	or from the command line (--simulated sweeps the low-pass of the simulator in loopback):
+		python3 FrequencyResponse.py --start 20 --stop 100000 --points 200 --output bode.csv
+"""
+
+SKEW		= Board.DUAL_CHANNEL_SKEW
+MIN_SAMPLES = 200	# per channel and capture
+MIN_SECONDS = 0.005	# of every capture, the faster the sampling the more samples
+
+def log_frequencies(start, stop, points):
+	""" Integer frequencies (the AD9833 is set in Hz) evenly spaced on a log scale, no repetitions """
+	return np.unique(np.rint(np.geomspace(start, stop, points)).astype(int)).tolist()
+
+def sweep_plan(frequency, micros_per_sample, max_samples, settle_cycles=1, cycles=3):
+	"""
+	(num_samples, micros_between_samples, settle_samples) for the capture of frequency, settle_samples
+	being those not fitted, or None if the board cannot sample it fast enough.
+	"""
+	min_samples = max(MIN_SAMPLES, int(MIN_SECONDS*1000000/micros_per_sample))
+	plan = Calibration.capture_plan(frequency, micros_per_sample, max_samples, settle_cycles+cycles, min(min_samples, max_samples))
+	if plan == None: return None
+	(num_samples, micros_between_samples) = plan
+	settle_samples = math.ceil(settle_cycles*1000000/frequency/micros_between_samples)
+	return (num_samples, micros_between_samples, min(settle_samples, num_samples//2))
+
+def fit_response(ch1, ch2, seconds_per_sample, frequency, skew=SKEW):
+	"""
+	(response, amplitude1): the complex ratio of the phasors of ch2 and ch1 at frequency (its absolute
+	value the gain, its angle the phase in radians) and the amplitude of ch1, in the units of the samples.
+	"""
+	n = min(len(ch1), len(ch2))
+	w = 2*np.pi*frequency
+	t = np.arange(n)*seconds_per_sample
+	A = np.column_stack((np.sin(w*t), np.cos(w*t), np.ones(n)))
+	(b, c, d) = np.linalg.lstsq(A, np.column_stack((ch1[:n], ch2[:n])).astype(float), rcond=None)[0]
+	phasors = b + 1j*c
+	if abs(phasors[0]) <= 1e-9*(abs(d[0])+1): return (0j, 0.0) # no sine on ch1, only the rounding of the fit
+	return (phasors[1]/phasors[0] * np.exp(-1j*w*skew*seconds_per_sample), abs(phasors[0]))
+
+class Analyzer(threading.Thread):
+	"""
+	Runs a sweep in the background. progress goes from 0 to 1; frequencies, response (complex, see
+	fit_response) and amplitude (Vpp of channel 1 at the ADC input) grow by one point per frequency
+	measured, so the sweep can be drawn while it runs. A frequency the board cannot sample is left out.
+	"""
+	def __init__(self, board, frequencies, settle_cycles=1, cycles=3, max_samples=5000, transfer_functions=None):
+		threading.Thread.__init__(self, name="PicoScope frequency response", daemon=True)
+		self.board		   = board
+		self.sweep		   = frequencies
+		self.settle_cycles = settle_cycles
+		self.cycles		   = cycles
+		self.max_samples   = max_samples		# per channel and capture
+		self.transfer_functions = transfer_functions # (ch1, ch2) Calibration.TransferFunction of the input stage, or None
+		self.progress	   = 0.0
+		self.frequencies   = []
+		self.response	   = []
+		self.amplitude	   = []
+		self.skipped	   = []
+		self.seconds	   = None
+		self.cancelled	   = False
+		self.done		   = False
+		self.error		   = None
+
+	def cancel(self):
+		self.cancelled = True
+
+	def run(self):
+		t0 = time.time()
+		try:
+			self.measure()
+		except Exception as e:
+			self.error = e
+		finally:
+			if self.board.osc_requests_in_flight(): self.board.get_value("osc get_max_samples", 2) # drains them
+			self.board.send_command("funcgen stop AD9833")
+			self.seconds = time.time()-t0
+			self.done	 = True
+
+	def measure(self):
+		micros_per_sample = self.board.get_value("osc get_micros_needed_for_2sample", 2)
+		max_samples		  = min(self.max_samples, self.board.get_value("osc get_max_samples", 2)//2)
+		plans = []
+		for freq in self.sweep:
+			plan = sweep_plan(freq, micros_per_sample, max_samples, self.settle_cycles, self.cycles)
+			if plan == None: self.skipped.append(freq)
+			else:			 plans.append((freq,) + plan)
+		if not plans: return
+
+		def request(freq, num_samples, micros_between_samples, settle_samples):
+			self.board.send_command("funcgen AD9833_set {} {}".format(freq, "Sine"))
+			self.board.osc_request_samples(3, num_samples, micros_between_samples, 1, False)
+
+		request(*plans[0])
+		for (i, (freq, num_samples, micros_between_samples, settle_samples)) in enumerate(plans):
+			if self.cancelled: return
+			if i+1 < len(plans): request(*plans[i+1]) # the board captures it while this one is read and fitted
+			data = self.board.osc_receive_samples()
+			if data == None: return
+			samples = data[0]
+			ch1 = samples[1::2][settle_samples:] & 0x0FFF
+			ch2 = samples[2::2][settle_samples:] & 0x0FFF
+			(response, amplitude) = fit_response(ch1, ch2, micros_between_samples*1e-6, freq)
+			if self.transfer_functions != None:
+				(tr1, tr2) = self.transfer_functions
+				response *= tr2.attenuation_at(freq)/tr1.attenuation_at(freq) * np.exp(-1j*(tr2.phase_at(freq)-tr1.phase_at(freq)))
+			self.amplitude	.append(2*amplitude*3.3/4095)
+			self.response	.append(complex(response))
+			self.frequencies.append(freq)
+			self.progress = (i+1)/len(plans)
+
+	def gain_db(self):
+		return 20*np.log10(np.maximum(np.abs(self.response), 1e-12))
+
+	def phase_degrees(self):
+		""" Unwrapped along the sweep, so that it does not jump at +-180 """
+		return np.degrees(np.unwrap(np.angle(self.response)))
+
+	def save_csv(self, path):
+		with open(path, "w", newline="") as f:
+			writer = csv.writer(f)
+			writer.writerow(["frequency_hz", "gain_db", "phase_deg", "ch1_vpp"])
+			for row in zip(self.frequencies, self.gain_db(), self.phase_degrees(), self.amplitude):
+				writer.writerow(["{}".format(row[0])] + ["{:.4f}".format(v) for v in row[1:]])
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description="PicoScope frequency response (Bode) sweep")
+	parser.add_argument("--config",		 default="PicoScope.ini", help="read the port from this file")
+	parser.add_argument("--calibration", default="Calibration.json", help="input stage calibration, see Calibration.py")
+	parser.add_argument("--port",		 help="serial port, default from the configuration file")
+	parser.add_argument("--simulated",	 action="store_true", help="simulated board, its low-pass in loopback")
+	parser.add_argument("--start",		 type=float, default=20, help="Hz, default 20")
+	parser.add_argument("--stop",		 type=float, default=100000, help="Hz, default 100000")
+	parser.add_argument("--points",		 type=int, default=200, help="default 200")
+	parser.add_argument("--settle",		 type=float, default=1, help="periods not fitted after every frequency change, default 1")
+	parser.add_argument("--cycles",		 type=float, default=3, help="periods fitted, default 3")
+	parser.add_argument("--output",		 help="write the sweep to this .csv file")
+	args = parser.parse_args(argv)
+
+	config = configparser.ConfigParser()
+	if os.path.exists(args.config): config.read(args.config)
+	port = args.port or (config["Settings-Board"]["Port"] if config.has_section("Settings-Board") else "/dev/ttyACM0")
+	if args.simulated: port = "sim://?loopback=1&seed=1"
+
+	board = Board.Board(port)
+	if not board.ok:
+		print("Error: board not found at", port, file=sys.stderr)
+		return 1
+	calibration = Calibration.CalibrationStore(args.calibration)
+	transfer_functions = tuple(calibration.transfer_function(board.identity, channel) for channel in [1,2])
+	analyzer = Analyzer(board, log_frequencies(args.start, args.stop, args.points), args.settle, args.cycles, transfer_functions=transfer_functions)
+	analyzer.start()
+	analyzer.join()
+	board.close()
+	if analyzer.error != None:
+		print("Error:", analyzer.error, file=sys.stderr)
+		return 1
+
+	for (freq, gain, phase) in zip(analyzer.frequencies, analyzer.gain_db(), analyzer.phase_degrees()):
+		print("{: >8} Hz {:+8.2f} dB {:+8.1f} deg".format(freq, gain, phase))
+	if analyzer.skipped:
+		print("Not sampled:", ", ".join(str(f) for f in analyzer.skipped))
+	print("{} points in {:.2f} s".format(len(analyzer.frequencies), analyzer.seconds))
+	if args.output: analyzer.save_csv(args.output)
+	return 0
+
+if __name__ == "__main__":
+	sys.exit(main())
@@ -63,6 +63,8 @@ class FrequencyDisplay(tk.Frame):
 
 class FuncGen(tk.Frame):
 	
+	board_resources = ("generator",) # claimed while open, see Globals.claim_board
+	
 	def __init__(self, parent, *args, **kwargs):
 		tk.Frame.__init__(self, parent, *args, **kwargs)
 		
@@ -138,9 +140,9 @@ class FuncGen(tk.Frame):
 			self.frequency_display.set_value(int(self.freq.get()))
 			if self.running:
 				if self.mode.get() == "PWM":
-					Globals.board.send_command("funcgen pwm_set {} {}".format(self.freq.get(), self.dutycycle_slide.get()))
+					Globals.commands.submit("funcgen pwm_set {} {}".format(self.freq.get(), self.dutycycle_slide.get()))
 				else:
-					Globals.board.send_command("funcgen AD9833_set {} {}".format(self.freq.get(), self.shape.get()))
+					Globals.commands.submit("funcgen AD9833_set {} {}".format(self.freq.get(), self.shape.get()))
 			return True
 		return False
 		
@@ -151,42 +153,42 @@ class FuncGen(tk.Frame):
 			self.dutycycle_slide.configure(state="normal")
 			self.lbl_dutycycle	.configure(state="normal")
 			if self.running:
-				Globals.board.send_command("funcgen AD9833_set {} {}".format(self.freq.get(), self.shape.get()))
+				Globals.commands.submit("funcgen AD9833_set {} {}".format(self.freq.get(), self.shape.get()))
 		else:
 			self.shape			.configure(state="readonly")
 			self.lbl_shape		.configure(state="normal")
 			self.dutycycle_slide.configure(state="disabled")
 			self.lbl_dutycycle	.configure(state="disabled")
 			if self.running:
-				Globals.board.send_command("funcgen pwm_set {} {}".format(self.freq.get(), self.dutycycle_slide.get()))
+				Globals.commands.submit("funcgen pwm_set {} {}".format(self.freq.get(), self.dutycycle_slide.get()))
 		
 	def on_dutycycle_changed(self,event):
 		if self.running:
 			self.dutycycle_value.config(text="{}%".format(self.dutycycle_slide.get()))
-			Globals.board.send_command("funcgen pwm_set {} {}".format(self.freq.get(), self.dutycycle_slide.get()))
+			Globals.commands.submit("funcgen pwm_set {} {}".format(self.freq.get(), self.dutycycle_slide.get()))
 		
 	def on_shape_changed(self,event):
 		if self.running:
-			Globals.board.send_command("funcgen AD9833_set {} {}".format(self.freq.get(), self.shape.get()))
+			Globals.commands.submit("funcgen AD9833_set {} {}".format(self.freq.get(), self.shape.get()))
 		
 	def on_button_start(self):
 		if not self.on_freq_updated(None): return
 		
 		if self.mode.get() == "PWM":
-			Globals.board.send_command("funcgen pwm_set {} {}".format(self.freq.get(), self.dutycycle_slide.get()))
+			Globals.commands.submit("funcgen pwm_set {} {}".format(self.freq.get(), self.dutycycle_slide.get()))
 		else:
-			Globals.board.send_command("funcgen AD9833_set {} {}".format(self.freq.get(), self.shape.get()))
-		Globals.board.send_command("led fgen on")
+			Globals.commands.submit("funcgen AD9833_set {} {}".format(self.freq.get(), self.shape.get()))
+		Globals.commands.submit("led fgen on")
 		self.running = True
 		self.button_stop .configure(state="normal")
 		self.button_start.configure(state="disabled")
 
 	def on_button_stop(self):
 		if self.mode.get() == "PWM":
-			Globals.board.send_command("funcgen stop pwm")
+			Globals.commands.submit("funcgen stop pwm")
 		else:
-			Globals.board.send_command("funcgen stop AD9833")
-		Globals.board.send_command("led fgen off")
+			Globals.commands.submit("funcgen stop AD9833")
+		Globals.commands.submit("led fgen off")
 		self.running = False
 		self.button_stop .configure(state="disabled")
 		self.button_start.configure(state="normal")
@@ -203,10 +205,12 @@ class FuncGen(tk.Frame):
 			Globals.config["FuncGen"]["Shape"] 		= self.shape.get()
 		Globals.save_config()
 		
-		Globals.board.send_command("funcgen stop pwm")
-		Globals.board.send_command("funcgen stop AD9833")
-		Globals.board.send_command("led fgen off")
+		Globals.commands.submit("funcgen stop pwm")
+		Globals.commands.submit("funcgen stop AD9833")
+		Globals.commands.submit("led fgen off")
+		Globals.commands.flush()
 
+		Globals.release_board("Function Generator")
 		Globals.toplevel_windows["FuncGen"].parent.destroy()
 		Globals.toplevel_windows["FuncGen"] = None
 		
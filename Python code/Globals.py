@@ -10,37 +10,115 @@ Given the minimum of 2 microseconds to take one sample, and considering that the
 shape of a sine requires at least 5 samples for a minimum valid approximation (triangle),
 then the minimum period is 2us/sample * 5samples = 10us => 100KHz
 """
-input_stage_testing_frequencies = [10,20,50,100,200,500,1000,2000,5000,10000,20000,50000,100000]
+input_stage_testing_frequencies = [int(m*10**e) for e in range(0,4) for m in [10,12,15,20,25,30,40,50,60,80]] + [100000]
 	
-import os.path
-if not os.path.exists("PicoScope.ini"):
+def set_default_config():
+	""" The settings of a first run, without PicoScope.ini """
 	config["PicoScope-Window"]		 = {"xpos":10, "ypos":10}
 	config["Settings-Window"]		 = {"xpos":20, "ypos":20}
 	config["Settings-Board"]		 = {"Port":"/dev/ttyACM0", "WakeUpColor":"Red" }
 	config["Settings-Osc-Display"]	 = {"DPI":96, "CanvasWidth":"25%%", "CanvasHeight":"25%%"}
-	config["Osc-HorizontalAxis"]  	 = {"Mode":"Oscilloscope", "TimeDiv":"10 ms", "FreqDiv":"100 Hz", "Trigger":"Ch 1"}
-	config["Osc-Ch1"] 				 = {"VerticalDivision":"1 V", "Offset":"0", "Color":"Yellow","Enabled":"True",  "InputStageTrFunc":"" }
-	config["Osc-Ch2"] 				 = {"VerticalDivision":"1 V", "Offset":"0", "Color":"Blue",  "Enabled":"False", "InputStageTrFunc":"" }
-	config["Osc-Window"]			 = {"xpos":100, "ypos":100}
+	config["Osc-HorizontalAxis"]  	 = {"Mode":"Oscilloscope", "TimeDiv":"10 ms", "FreqDiv":"100 Hz", "Trigger":"Ch 1", "PeakDetect":"False", "HostETS":"False", "Acquire":"Normal", "AcquireN":"16"}
+	config["Osc-Ch1"] 				 = {"VerticalDivision":"1 V", "Offset":"0", "Color":"Yellow","Enabled":"True" }
+	config["Osc-Ch2"] 				 = {"VerticalDivision":"1 V", "Offset":"0", "Color":"Blue",  "Enabled":"False"}
+	config["Osc-Window"]			 = {"xpos":100, "ypos":100, "Renderer":"Plot", "Persistence":"0.5 s"}
+	config["Osc-Spectrum"]			 = {"Window":"Hann", "Averaging":"None", "PeakHold":"False", "dBV":"False"}
+	config["Osc-Trigger"]			 = {"Mode":"Off", "Slope":"Rising", "Level":"0", "RuntLevel":"1", "Hysteresis":"0.05 V", "Width":"10", "Pretrigger":"50"}
 	config["FuncGen"]				 = {"xpos":110, "ypos":110, "Mode":"PWM", "Frequency":100, "DutyCycle":50, "Shape":"Sine"}
 	config["FuncGen-AD9833"]		 = {"xpos":110, "ypos":110, "Frequency":100, "Shape":"Sine"}
+	config["Bode"]					 = {"xpos":120, "ypos":120, "Start":"20", "Stop":"100000", "Points":"200", "Settle":"1", "Cycles":"3"}
+
+import os.path
+if not os.path.exists("PicoScope.ini"):
+	set_default_config() # written by save_config(), when the launcher or a tool closes: importing Globals writes nothing
+else:
+	config.read("PicoScope.ini")
+
+""" sections added after the first release, missing in older PicoScope.ini files """
+if not config.has_section("Osc-Spectrum"):
+	config["Osc-Spectrum"]			 = {"Window":"Hann", "Averaging":"None", "PeakHold":"False", "dBV":"False"}
+if not config.has_section("Osc-Trigger"):
+	config["Osc-Trigger"]			 = {"Mode":"Off", "Slope":"Rising", "Level":"0", "RuntLevel":"1", "Hysteresis":"0.05 V", "Width":"10", "Pretrigger":"50"}
+if not config.has_section("Bode"):
+	config["Bode"]					 = {"xpos":120, "ypos":120, "Start":"20", "Stop":"100000", "Points":"200", "Settle":"1", "Cycles":"3"}
+
+"""
+The board and its calibration data (see Calibration.py) are not opened at import, as opening the 
+serial port and importing NumPy for Board take longer than showing the launcher. PicoScope.py calls 
+connect_board() to open it in the background; board, calibration and commands are then plain module attributes, 
+and a module reaching them before the connection is done waits for it (see __getattr__). If the connection 
+failed, board_error keeps the exception and reaching them raises a RuntimeError with it, rather than trying 
+again on the calling (GUI) thread. Scripts importing Globals get the board opened on first use.
+"""
+import threading
+board_lock	 = threading.Lock()
+board_thread = None
+board_error	 = None
+
+def open_board():
+	global board, calibration, commands
+	with board_lock:
+		if "board" in globals(): return
+		import Board
+		import Calibration
+		import Commands
+		if config["Settings-Board"].get("Link", "serial") == "asyncio": # see AsyncBoard.py
+			import AsyncBoard
+			new_board = AsyncBoard.ThreadedBoard(config["Settings-Board"]["Port"])
+		else:
+			new_board = Board.Board(config["Settings-Board"]["Port"])
+		calibration = Calibration.CalibrationStore("Calibration.json")
+		if calibration.import_ini(config, new_board.identity): save_config()
+		commands = Commands.CommandScheduler(new_board) # control commands of the GUI, see Commands.py
+		commands.start()
+		board = new_board
+
+def connect_in_background():
+	global board_error
+	try:
+		open_board()
+	except Exception as e:
+		board_error = e
+		print("Error: board connection failed.", e)
+
+def connect_board():
+	""" Opens the board in the background, see board_connected() and board_error """
+	global board_thread
+	board_thread = threading.Thread(target=connect_in_background, name="PicoScope board connection", daemon=True)
+	board_thread.start()
 	
-	tf_dict = {}
-	for f in input_stage_testing_frequencies:
-		tf_dict[f] = 0
-		
-	config["Osc-Ch1"]["InputStageTrFunc"] = str(tf_dict)
-	config["Osc-Ch2"]["InputStageTrFunc"] = str(tf_dict)
-			
-	save_config()
+def board_connected():
+	return "board" in globals()
+
+def __getattr__(name):
+	if name in ["board", "calibration", "commands"]:
+		if board_thread != None:
+			board_thread.join()
+			if board_error != None: raise RuntimeError("Board connection failed: {}".format(board_error))
+		open_board()
+		return globals()[name]
+	raise AttributeError("module 'Globals' has no attribute '{}'".format(name))
+
+"""
+Tools that must have parts of the board to themselves claim them: "capture" (the captures: oscilloscope,
+calibration, Bode sweep) and "generator" (the AD9833 and PWM outputs: function generator, calibration,
+Bode sweep). claim_board() returns None if granted, else the name of the tool holding one of them, which 
+releases them when done. Only the GUI thread claims, so no lock is needed.
+"""
+board_claims = {} # tool: set of resources
 
-config.read("PicoScope.ini")
+def claim_board(tool, *resources):
+	for other, held in board_claims.items():
+		if other != tool and held & set(resources): return other
+	board_claims[tool] = board_claims.get(tool, set()) | set(resources)
+	return None
 
-import Board
-board = Board.Board(config["Settings-Board"]["Port"])
+def release_board(tool):
+	board_claims.pop(tool, None)
 
 toplevel_windows = {"Settings":			None,
 					"Oscilloscope":		None, 
 					"FuncGen":			None,
+					"Bode":				None,
 					"FrequencyMeter":	None }
 
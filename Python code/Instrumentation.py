@@ -0,0 +1,102 @@
+import csv
+import json
+import time
+import numpy as np
+
+"""
+PIPELINE INSTRUMENTATION
+
+	Timing of every stage a frame goes through, from the capture request to the canvas:
+		write			Sending the capture command
+		first_byte		Waiting for the first byte of the payload (trigger plus sampling time)
+		transfer		Reading the rest of the payload
+		decode			Samples and period info out of the payload
+		volts			Samples to screen positions (lookup table, peak detection envelope)
+		fft				Spectrum of the frame, Spectrometer mode
+		measurements	Automatic measurements (Measurements.py) shown in the channel info and window
+		draw			Drawing the traces and blitting them to the canvas
+	plus counters of frames lost on the way:
+		timeouts		Payloads not fully received in time, zero padded by Board
+		stale			Frames captured with parameters no longer current, not drawn
+		overwritten		Frames replaced by a newer one before the renderer picked them up
+
+	Each stage keeps its last WINDOW durations, from which percentiles are computed when asked for.
+	A stage is timed like this:
+		t = Instrumentation.probe.start()
+		...
+		t = Instrumentation.probe.lap("volts", t)
+	While the probe is disabled start() returns None and lap() returns at once, so the cost is that of
+	two method calls. Counters are always kept.
+"""
+
+STAGES	 = ["write", "first_byte", "transfer", "decode", "volts", "fft", "measurements", "draw"]
+COUNTERS = ["timeouts", "stale", "overwritten"]
+WINDOW	 = 1024
+
+class Stage():
+
+	def __init__(self):
+		self.durations = np.zeros(WINDOW)
+		self.count	   = 0
+
+	def add(self, seconds):
+		self.durations[self.count % WINDOW] = seconds
+		self.count += 1
+
+	def summary(self):
+		""" {count, mean, p50, p95, p99, max} of the last WINDOW durations, in milliseconds """
+		n = min(self.count, WINDOW)
+		if n == 0: return {"count": 0, "mean_ms": None, "p50_ms": None, "p95_ms": None, "p99_ms": None, "max_ms": None}
+		d = self.durations[:n]*1000
+		p50, p95, p99 = np.percentile(d, [50, 95, 99])
+		return {"count": self.count, "mean_ms": float(d.mean()), "p50_ms": float(p50), "p95_ms": float(p95), "p99_ms": float(p99), "max_ms": float(d.max())}
+
+class Probe():
+
+	def __init__(self):
+		self.enabled = False
+		self.reset()
+
+	def reset(self):
+		""" stages and counters are never added or removed, so other threads can keep updating them """
+		self.stages	  = dict((name, Stage()) for name in STAGES)
+		self.counters = dict((name, 0) for name in COUNTERS)
+		self.since	  = time.time()
+
+	def start(self):
+		return time.perf_counter() if self.enabled else None
+
+	def lap(self, stage, t):
+		""" Adds the time since t to stage, returns the current time to time the next stage from """
+		if t is None: return None
+		now = time.perf_counter()
+		self.stages[stage].add(now-t)
+		return now
+
+	def count(self, counter, n=1):
+		self.counters[counter] += n
+
+	def summary(self):
+		return {"since":	time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(self.since)),
+				"seconds":	time.time()-self.since,
+				"stages":	dict((name, stage.summary()) for name, stage in self.stages.items()),
+				"counters":	dict(self.counters)}
+
+	def export(self, path):
+		""" Writes the summary to path, as CSV if it ends in .csv and else as JSON """
+		summary = self.summary()
+		if path.lower().endswith(".csv"):
+			columns = ["count", "mean_ms", "p50_ms", "p95_ms", "p99_ms", "max_ms"]
+			with open(path, "w", newline="") as f:
+				writer = csv.writer(f)
+				writer.writerow(["name"] + columns)
+				for name, values in summary["stages"].items():
+					writer.writerow([name] + [values[c] if values[c] != None else "" for c in columns])
+				for name, value in summary["counters"].items():
+					writer.writerow([name, value])
+		else:
+			with open(path, "w") as f:
+				json.dump(summary, f, indent=1)
+
+""" The one probe of the process, shared by Board, the acquisition worker and the oscilloscope """
+probe = Probe()
@@ -0,0 +1,41 @@
+import numpy as np
+
+"""
+MEMORY MAPPED ARRAYS
+
+	Files written by appending to them while capturing, the recordings (Recorder.py) and their
+	pyramids (Pyramid.py). The file is memory mapped and grows by doubling its size when full, so
+	appending is a copy into the page cache. On close it is truncated to its actual size.
+"""
+
+class GrowableArray():
+	""" Memory mapped 1-D array backed by a file, doubling its capacity when full """
+
+	def __init__(self, path, dtype, capacity=65536):
+		self.file	  = open(path, "w+b")
+		self.dtype	  = np.dtype(dtype)
+		self.length	  = 0
+		self.capacity = 0
+		self.map	  = None
+		self.grow(capacity)
+
+	def grow(self, capacity):
+		if self.map is not None:
+			self.map.flush()
+			self.map = None
+		self.file.truncate(capacity*self.dtype.itemsize)
+		self.map	  = np.memmap(self.file, dtype=self.dtype, mode="r+", shape=(capacity,))
+		self.capacity = capacity
+
+	def append(self, values):
+		n = len(values)
+		if self.length+n > self.capacity:
+			self.grow(max(2*self.capacity, self.length+n))
+		self.map[self.length:self.length+n] = values
+		self.length += n
+
+	def close(self):
+		self.map.flush()
+		self.map = None
+		self.file.truncate(self.length*self.dtype.itemsize)
+		self.file.close()
@@ -0,0 +1,156 @@
+import numpy as np
+
+from Trigger import rising_crossings
+
+"""
+AUTOMATIC MEASUREMENTS
+
+	Measurements of the frames of each channel, computed with NumPy over the whole frame:
+		Mean, RMS, AC RMS, Vpp, Min, Max	Volts
+		Frequency, Period					From the crossings of the middle level (halfway between min and
+											max, with 10% hysteresis), interpolated between samples
+		Duty								Time above the middle level over the period, %
+		Rise, Fall							Time from 10% to 90% of the way between the base and top levels
+											(medians of the samples below and above the middle level)
+		Overshoot							Max above the top level, % of top - base
+		Phase								From a rising crossing of Ch 1 to the next one of Ch 2, degrees from
+											-180 to 180, median over the frame, dual channel skew corrected
+	Timing measurements need at least two rising crossings in the frame, else they are None.
+
+	Only the selected measurements are computed, once per frame for every channel: labels showing them
+	read the results of the last frame (value()). For each selected measurement the last FRAMES
+	values are kept and summarized as min, max, mean and standard deviation.
+"""
+
+NAMES = ["Mean", "RMS", "AC RMS", "Vpp", "Min", "Max", "Frequency", "Period", "Duty", "Rise", "Fall", "Overshoot", "Phase"]
+UNITS = {"Mean": "V", "RMS": "V", "AC RMS": "V", "Vpp": "V", "Min": "V", "Max": "V", "Frequency": "Hz",
+		 "Period": "s", "Duty": "%", "Rise": "s", "Fall": "s", "Overshoot": "%", "Phase": "deg"}
+FRAMES = 100
+
+def format_value(name, value):
+	""" value with the unit of the measurement, scaled to a prefix for volts, seconds and hertz """
+	if value == None: return "-"
+	unit = UNITS[name]
+	if unit in ["%", "deg"]: return "{:.1f} {}".format(value, unit)
+	for factor, prefix in [(1e6, "M"), (1e3, "K"), (1, ""), (1e-3, "m"), (1e-6, "u"), (1e-9, "n")]:
+		if abs(value) >= factor or factor == 1e-9:
+			if unit == "V" and factor > 1: continue
+			return "{:.3g} {}{}".format(value/factor, prefix, unit)
+
+class Statistics():
+
+	def __init__(self):
+		self.values = np.zeros(FRAMES)
+		self.count	= 0
+
+	def add(self, value):
+		self.values[self.count % FRAMES] = value
+		self.count += 1
+
+	def summary(self):
+		""" (min, max, mean, std) of the last FRAMES values, None if there are none """
+		n = min(self.count, FRAMES)
+		if n == 0: return None
+		v = self.values[:n]
+		return (v.min(), v.max(), v.mean(), v.std())
+
+def measure(samples, volts_per_sample, seconds_per_sample, names):
+	"""
+	The measurements of names ({name: value}) for a frame of raw samples. Intermediate results are
+	shared: every quantity is computed once however many measurements use it.
+	"""
+	y = samples.astype(float) if samples.dtype.kind == "f" else (samples & 0x0FFF).astype(float) # averaged samples have fractions
+	results = {}
+	lo, hi = y.min(), y.max()
+	if "Min" in names:	  results["Min"]	= lo*volts_per_sample
+	if "Max" in names:	  results["Max"]	= hi*volts_per_sample
+	if "Vpp" in names:	  results["Vpp"]	= (hi-lo)*volts_per_sample
+	if "Mean" in names:	  results["Mean"]	= y.mean()*volts_per_sample
+	if "RMS" in names:	  results["RMS"]	= np.sqrt(np.dot(y, y)/len(y))*volts_per_sample
+	if "AC RMS" in names: results["AC RMS"] = y.std()*volts_per_sample
+
+	timing = [name for name in ["Frequency", "Period", "Duty", "Rise", "Fall", "Overshoot", "Phase"] if name in names]
+	if not timing: return results
+	for name in timing: results[name] = None
+	mid = (lo+hi)/2
+	if hi-lo < 8: return results # flat within the noise
+	up = rising_crossings(y, mid, 0.1*(hi-lo))
+	if len(up) < 2: return results
+	period = (up[-1]-up[0])/(len(up)-1)
+	results["Frequency"] = 1/(period*seconds_per_sample)
+	results["Period"]	 = period*seconds_per_sample
+	if "Duty" in names:
+		down = rising_crossings(-y, -mid, 0.1*(hi-lo))
+		j = np.searchsorted(down, up[:-1])
+		ends = np.append(down, np.inf)[j]
+		complete = ends < up[1:]
+		if complete.any(): results["Duty"] = 100*np.mean(ends[complete]-up[:-1][complete])/period
+	if "Rise" in names or "Fall" in names or "Overshoot" in names:
+		base = np.median(y[y < mid])
+		top	 = np.median(y[y >= mid])
+		if top > base:
+			if "Overshoot" in names: results["Overshoot"] = 100*(hi-top)/(top-base)
+			hysteresis = 0.05*(top-base)
+			for name, signal, start, end in [("Rise", y, base+0.1*(top-base), base+0.9*(top-base)), ("Fall", -y, -(base+0.9*(top-base)), -(base+0.1*(top-base)))]:
+				if name not in names: continue
+				starts = rising_crossings(signal, start, hysteresis)
+				ends   = rising_crossings(signal, end, hysteresis)
+				j = np.searchsorted(ends, starts)
+				valid = j < len(ends)
+				(starts, j) = (starts[valid], j[valid])
+				last = np.append(j[1:] != j[:-1], True) # the last start before each end
+				if last.any(): results[name] = np.median(ends[j[last]]-starts[last])*seconds_per_sample
+	results["up"] = up # for the phase between channels
+	return results
+
+class MeasurementEngine():
+
+	def __init__(self):
+		self.selected = set()
+		self.results  = {}	# channel: {name: value} of the last frame
+		self.history  = {}	# (channel, name): Statistics
+		self.frame	  = {}	# channel: (samples, volts_per_sample, seconds_per_sample) of the frame being drawn
+
+	def reset(self):
+		self.history = {}
+
+	def add_channel(self, channel, samples, volts_per_sample, seconds_per_sample):
+		self.frame[channel] = (samples, volts_per_sample, seconds_per_sample)
+
+	def end_frame(self, skew=0.0):
+		"""
+		Computes the selected measurements of the channels added since the last call. skew is the time in
+		seconds every sample of Ch 2 is taken after that of Ch 1 with the same index (see Board.DUAL_CHANNEL_SKEW).
+		"""
+		if not self.selected:
+			self.frame = {}
+			return
+		results = {}
+		for channel, (samples, volts_per_sample, seconds_per_sample) in self.frame.items():
+			results[channel] = measure(samples, volts_per_sample, seconds_per_sample, self.selected)
+		if "Phase" in self.selected:
+			for channel in results: results[channel]["Phase"] = None
+			if 1 in results and 2 in results and results[1].get("Period") != None and results[2].get("Period") != None:
+				(up1, up2) = (results[1]["up"], results[2]["up"])
+				seconds_per_sample = self.frame[1][2]
+				period = results[1]["Period"]/seconds_per_sample
+				j = np.searchsorted(up2, up1)
+				valid = j < len(up2)
+				if valid.any():
+					delays = up2[j[valid]] - up1[valid] + skew/seconds_per_sample
+					phases = (360*delays/period + 180) % 360 - 180 # each wrapped first, so jitter around 0 stays there
+					results[2]["Phase"] = float(np.median(phases))
+		for channel, values in results.items():
+			values.pop("up", None)
+			for name, value in values.items():
+				if value == None: continue
+				self.history.setdefault((channel, name), Statistics()).add(value)
+		self.results = results
+		self.frame	 = {}
+
+	def value(self, channel, name):
+		return self.results.get(channel, {}).get(name)
+
+	def statistics(self, channel, name):
+		statistics = self.history.get((channel, name))
+		return statistics.summary() if statistics != None else None
@@ -1,6 +1,7 @@
 import tkinter as tk
 from tkinter import ttk
 from tkinter import messagebox
+from tkinter import filedialog
 import time
 import math
 
@@ -11,6 +12,18 @@ from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 import numpy as np
 
 import Globals
+import Board
+import Acquisition
+import Spectrum
+import Recorder
+import Pyramid
+import Raster
+import Trigger
+import Measurements
+import Averaging
+import EquivalentTime
+import Instrumentation
+from Instrumentation import probe
 
 """ 
 SIGNAL DISPLAY ACROSS THE HORIZONTAL AXIS
@@ -52,6 +65,9 @@ SIGNAL DISPLAY ACROSS THE VERTICAL AXIS
 	voltages from a known source at different frequencies.
 """
 
+""" Milliseconds between runs of the raster display loop, see Oscilloscope.raster_step """
+RASTER_INTERVAL = 5
+
 class OscilloscopeChannel():
 
 	def __init__(self, parent, channel_number, osc_instance, *args, **kwargs):
@@ -72,7 +88,8 @@ class OscilloscopeChannel():
 		self.color		= ttk.Combobox(self.frame, state="readonly", values=["Yellow","Blue","Red","Black"], width=10) 
 		self.volts_div 	= ttk.Combobox(self.frame, state="readonly", values=["0.1 V","0.2 V","0.5 V","1 V","2 V"], width=10)
 		self.info		= tk.Label(self.frame, text="")
-		self.info_cb	= ttk.Combobox(self.frame, state="readonly", width=6, values=["Freq:","Volts:","Vpp:"]); 
+		self.info_cb	= ttk.Combobox(self.frame, state="readonly", width=10, values=["Freq:","Volts:"]+[name+":" for name in Measurements.NAMES if name not in ["Min","Max"]])
+		self.info_cb	.bind('<<ComboboxSelected>>', lambda event: osc_instance.on_measurements_changed())
 		self.enabled_cb								.grid(row=0, column=0, sticky="e")
 		tk.Label(self.frame, text="Volts/Div: ")	.grid(row=1, column=0, sticky="e")
 		tk.Label(self.frame, text="Offset: ")		.grid(row=2, column=0, sticky="e")
@@ -91,22 +108,29 @@ class OscilloscopeChannel():
 		self.info_cb.set("Freq:")
 		
 		""" input stage transfer function """
-		self.tr_func = eval(Globals.config["Osc-Ch{}".format(channel_number)]["InputStageTrFunc"])
-		self.tr_func_avg = 0
-		for freq,attenuation in self.tr_func.items():
-			self.tr_func_avg += attenuation
-			if attenuation == 0:
-				messagebox.showinfo(message="Channel {} requires calibration.".format(channel_number), title="Warning", parent=parent)
-				break
-		self.tr_func_avg = self.tr_func_avg / len(self.tr_func)
+		if not self.load_tr_func():
+			messagebox.showinfo(message="Channel {} requires calibration.".format(channel_number), title="Warning", parent=parent)
 		
 		""" matplotlib variables """
 		self.plot_data = None
 		
+		""" info shown for the last frame, see show_info() """
+		self.period_info = None
+		self.info_text	 = None
+		
+		""" sample to screen lookup table, see screen_lut() """
+		self.lut 	 = None
+		self.lut_key = None
+		
+		""" spectrum engine and per bin attenuation correction for Spectrometer mode """
+		self.spectrum 		= Spectrum.SpectrumAnalyzer()
+		self.correction 	= None
+		self.correction_key = None
+		
 	def on_checkbox(self):
 		self.osc_instance.on_channel_enabled(self.channel_number)
 		if self.enabled.get() == False:
-			self.info.configure(text="")
+			self.set_info("")
 			Globals.board.send_command("led ch{} off".format(self.channel_number))
 		else:
 			Globals.board.send_command("led ch{} on".format(self.channel_number))
@@ -117,80 +141,136 @@ class OscilloscopeChannel():
 	def sample_to_volts(self, sample_value, attenuation):
 		return sample_value * 0.000805861 * attenuation # 0.000805861 = 3.3/4095
 		
+	def screen_lut(self, volts_div, offset, attenuation):
+		"""
+		Screen position for every possible 12-bit sample value. Rebuilt only when the volts/div, 
+		offset or attenuation change, so a frame is transformed with a single table lookup.
+		"""
+		key = (volts_div, offset, attenuation)
+		if key != self.lut_key:
+			self.lut 	 = self.sample_to_volts(np.arange(4096), attenuation)*10/volts_div + offset
+			self.lut_key = key
+		return self.lut
+		
+	def to_screen(self, samples, volts_div, offset, attenuation):
+		""" Screen positions of samples, through the lookup table unless averaged (see Averaging.py), as they have fractions """
+		if samples.dtype.kind == "f":
+			return samples*np.float32(self.sample_to_volts(1, attenuation)*10/volts_div) + np.float32(offset)
+		return self.screen_lut(volts_div, offset, attenuation)[samples & 0x0FFF]
+		
+	def load_tr_func(self):
+		"""
+		Loads the calibrated transfer function, see Calibration.py. Called at init and after a 
+		calibration. Returns False if the channel is not calibrated.
+		"""
+		self.tr 		 	= Globals.calibration.transfer_function(Globals.board.identity, self.channel_number)
+		self.tr_func 	 	= self.tr.tr_func
+		self.tr_func_avg 	= self.tr.average
+		self.correction_key	= None
+		return self.tr.calibrated()
+		
+	def attenuation_at(self, freqs):
+		""" Attenuation at each of the given frequencies, clamped to the calibrated range """
+		return self.tr.attenuation_at(freqs)
+		
 	def current_attenuation(self, period_info):
-		if period_info == None:
-			return self.tr_func_avg
-		if period_info[1] == 0:
-			return self.tr_func_avg
-		if period_info[0] >= 3:
-			return self.tr_func_avg
-		f = int(1000000/period_info[1])
-		min_freq = min(self.tr_func.keys())
-		max_freq = max(self.tr_func.keys())
-		if f <= min_freq: return self.tr_func[min_freq]
-		if f >= max_freq: return self.tr_func[max_freq]
-		f1 = None
-		for freq,attenuation in self.tr_func.items():
-			if freq == f: return self.tr_func[freq]
-			if f1 != None:
-				if f <= freq:
-					f2   = freq
-					att2 = self.tr_func[freq]
-					break
-			f1   = freq
-			att1 = self.tr_func[freq]
-		att = att1 + ((att2-att1)/(f2-f1))*(f-f1)
-		return att
+		return self.tr.attenuation(period_info)
 			
-	def draw_frame(self, samples, period_info, operating_mode):
+	def envelope(self, samples, columns):
+		"""
+		Peak detection: splits the samples in columns consecutive groups and returns (first, envelope),
+		first being the index of the first sample of each group and envelope the min and max of each 
+		group alternated, so that no spike is lost however many samples fall in a screen column.
+		"""
+		first = (np.arange(columns)*len(samples))//columns
+		envelope = np.empty(2*columns, dtype=samples.dtype)
+		envelope[0::2] = np.minimum.reduceat(samples, first)
+		envelope[1::2] = np.maximum.reduceat(samples, first)
+		return (first, envelope)
+		
+	"""
+	seconds_per_sample is the time between samples of this channel. In Spectrometer mode it gives the
+	frequency of every bin, so that each is corrected with the input stage attenuation at its own
+	frequency instead of the one at the measured signal frequency.
+	"""
+	def draw_frame(self, samples, period_info, operating_mode, seconds_per_sample=None):
 		volts_div = float(self.volts_div.get()[:-2])
 		offset 	  = (self.offset_slide.get())*10
 		
 		att = self.current_attenuation(period_info)
 		
-		volts = [self.sample_to_volts(s,att) for s in samples]
-		data  = [10*v/volts_div + offset for v in volts]
-	
+		t = probe.start()
 		if operating_mode == "Oscilloscope":
-			x = np.linspace(0, 100, len(data))
-			y = np.asarray(data)
+			columns = self.osc_instance.window_width
+			if self.osc_instance.peak_detect.get() and len(samples) > 2*columns:
+				(first, envelope) = self.envelope(samples, columns)
+				x = np.repeat(first*100/len(samples), 2)
+				y = self.to_screen(envelope, volts_div, offset, att)
+			else:
+				data = self.to_screen(samples, volts_div, offset, att)
+				x = np.linspace(0, 100, len(data))
+				y = data
+			t = probe.lap("volts", t)
 		else:
-			if len(data)%2 != 0: data = data[1:] # Need an even number of points for FFT 
-			nsamples = len(data)
-			ft = np.fft.fft(data) / nsamples
-			ft = ft[range(int(nsamples/2))]
-			x = np.arange(nsamples/2)
-			y = abs(ft) + self.offset_slide.get()*10
+			volts = self.to_screen(samples, 10, 0, att if seconds_per_sample == None else 1)
+			t = probe.lap("volts", t)
+			self.spectrum.prepare(len(volts))
+			if seconds_per_sample != None:
+				key = (self.spectrum.fft_size, seconds_per_sample)
+				if key != self.correction_key:
+					self.correction 	= self.attenuation_at(self.spectrum.bin_frequencies(seconds_per_sample))
+					self.correction_key = key
+			x, amplitude = self.spectrum.compute(volts, self.correction if seconds_per_sample != None else None)
+			if self.osc_instance.spectrum_dbv.get():
+				y = self.spectrum.to_dbv(amplitude) + offset # 10 dB/div
+			else:
+				y = amplitude*10/volts_div + offset
+			t = probe.lap("fft", t)
 		
 		self.plot_data.set_data(x,y)
 		self.plot_data.set_color(self.color.get())
 
-		if self.info_cb.get() == "Freq:":
+		self.period_info = period_info
+		if seconds_per_sample != None:
+			self.osc_instance.measurements.add_channel(self.channel_number, samples, self.sample_to_volts(1, att), seconds_per_sample)
+		
+	def set_info(self, text, fg="black"):
+		""" The label is only configured when its text changes """
+		if (text, fg) == self.info_text: return
+		self.info.configure(text=text, fg=fg)
+		self.info_text = (text, fg)
+		
+	def show_info(self):
+		""" Shows the measurement selected of the last frame, once the measurements are computed """
+		measurements = self.osc_instance.measurements
+		selected = self.info_cb.get()[:-1]
+		if selected == "Freq":
+			period_info = self.period_info
 			if period_info == None:
-				self.info.configure(text="No trigger", fg="black")
+				self.set_info("No trigger")
 			else:
 				status = period_info[0]
 				value  = period_info[1]
 				if status < 3 and value != 0:
-					self.info.configure(text="{} Hz".format(int(1000000/value)))
-					if   status == 0:	self.info.configure(fg="green")
-					elif status == 1:	self.info.configure(fg="green3")
-					else:				self.info.configure(fg="green3")
+					self.set_info("{} Hz".format(int(1000000/value)), "green" if status == 0 else "green3")
 				elif status == 3:
-					self.info.configure(text=">100 KHz", fg="red")
+					self.set_info(">100 KHz", "red")
 				elif status == 4:
-					self.info.configure(text="Non-periodic", fg="black")
+					self.set_info("Non-periodic")
 				elif status == 100 and value != 0:
-					self.info.configure(text="{} KHz (ETS)".format(int(1000000/value)), fg="black")
+					self.set_info("{} KHz (ETS)".format(int(1000000/value)))
 				elif status == 101:
-					self.info.configure(text="ETS timeout", fg="red")
-		elif self.info_cb.get() == "Volts:":
-			self.info.configure(fg="black",text="{:.2f}...{:.2f} Volts".format(self.sample_to_volts(min(samples),att), self.sample_to_volts(max(samples),att)))
-		elif self.info_cb.get() == "Vpp:":
-			self.info.configure(fg="black",text="{:.2f} Volts".format(self.sample_to_volts(max(samples)-min(samples),att)))
+					self.set_info("ETS timeout", "red")
+		elif selected == "Volts":
+			low, high = measurements.value(self.channel_number, "Min"), measurements.value(self.channel_number, "Max")
+			if low != None: self.set_info("{:.2f}...{:.2f} Volts".format(low, high))
+		else:
+			self.set_info(Measurements.format_value(selected, measurements.value(self.channel_number, selected)))
 
 class Oscilloscope(tk.Frame):
 	
+	board_resources = ("capture",) # claimed while open, see Globals.claim_board
+	
 	def __init__(self, parent, *args, **kwargs):
 		tk.Frame.__init__(self, parent, *args, **kwargs)
 		self.parent = parent
@@ -226,6 +306,13 @@ class Oscilloscope(tk.Frame):
 		self.canvas = FigureCanvasTkAgg(self.fig, master=parent)
 		self.canvas.get_tk_widget().grid(column=0, row=0, sticky="nswe")
 		
+		""" alternative display, rasterized with persistence, see Raster.py and raster_step() """
+		self.raster		  = None
+		self.raster_job	  = None
+		self.raster_photo = tk.PhotoImage(width=fw, height=fh)
+		self.raster_label = tk.Label(parent, image=self.raster_photo, borderwidth=0)
+		self.raster_size  = (fw, fh)
+		
 		tools_frame = tk.Frame(parent)
 		
 		mode_frame = tk.LabelFrame(tools_frame, text=" Mode: ", padx=5, pady=5)
@@ -241,14 +328,81 @@ class Oscilloscope(tk.Frame):
 		self.perf_fps = tk.Label(performance_frame)
 		self.perf_sps.pack(side="left")
 		self.perf_fps.pack(side="left")
-		performance_frame.pack(anchor="w")
+		tk.Button(performance_frame, text="Stats...", command=self.on_perf_stats).pack(side="right")
+		performance_frame.pack(anchor="w", fill="x")
+		
+		display_frame = tk.Frame(mode_frame)
+		self.renderer	 = ttk.Combobox(display_frame, state="readonly", values=["Plot","Raster"], width=6)
+		self.persistence = ttk.Combobox(display_frame, state="readonly", values=Raster.persistence_names, width=8)
+		self.renderer	.bind('<<ComboboxSelected>>', self.on_renderer_changed)
+		self.persistence.bind('<<ComboboxSelected>>', self.on_renderer_changed)
+		tk.Label(display_frame, text="Display: ").pack(side="left")
+		self.renderer	.pack(side="left")
+		self.persistence.pack(side="left")
+		display_frame.pack(anchor="w")
+		self.stats_window = None
+		
+		record_frame = tk.Frame(mode_frame)
+		self.recording = tk.BooleanVar()
+		tk.Checkbutton(record_frame, text="Record", variable=self.recording, command=self.on_record).pack(anchor="w", side="left")
+		self.record_info = tk.Label(record_frame)
+		self.record_info.pack(side="left")
+		tk.Button(record_frame, text="View...", command=self.on_view_recording).pack(side="right")
+		record_frame.pack(anchor="w", fill="x")
+		
+		""" automatic measurements, see Measurements.py and on_measurements() """
+		self.measurements		 = Measurements.MeasurementEngine()
+		self.measurements_window = None
+		tk.Button(mode_frame, text="Measurements...", command=self.on_measurements).pack(anchor="w")
+		
+		""" browsing of a recording, see draw_recording() """
+		self.viewer 	  = None
+		self.view_frame   = tk.LabelFrame(tools_frame, text=" Recording: ", padx=5, pady=5)
+		self.view_position = tk.Scale(self.view_frame, from_=0, to=1000, orient="horizontal", showvalue=False, length=150)
+		self.view_info	  = tk.Label(self.view_frame)
+		self.view_position.grid(row=0, column=0, columnspan=3, sticky="we")
+		tk.Button(self.view_frame, text="Zoom +", command=lambda: self.on_view_zoom(1/Pyramid.FACTOR)).grid(row=1, column=0)
+		tk.Button(self.view_frame, text="Zoom -", command=lambda: self.on_view_zoom(Pyramid.FACTOR))	.grid(row=1, column=1)
+		tk.Button(self.view_frame, text="Close",  command=self.on_view_close)							.grid(row=1, column=2)
+		self.view_info.grid(row=2, column=0, columnspan=3, sticky="w")
+		
+		spectrum_frame = tk.LabelFrame(tools_frame, text=" Spectrum: ", padx=5, pady=5)
+		self.spectrum_window	= ttk.Combobox(spectrum_frame, state="readonly", values=Spectrum.window_names, width=10)
+		self.spectrum_averaging	= ttk.Combobox(spectrum_frame, state="readonly", values=Spectrum.averaging_names, width=10)
+		self.spectrum_peak_hold = tk.BooleanVar()
+		self.spectrum_dbv		= tk.BooleanVar()
+		self.spectrum_window	.bind('<<ComboboxSelected>>', self.on_spectrum_changed)
+		self.spectrum_averaging	.bind('<<ComboboxSelected>>', self.on_spectrum_changed)
+		tk.Label(spectrum_frame, text="Window: ")	.grid(row=0, column=0, sticky="e")
+		tk.Label(spectrum_frame, text="Average: ")	.grid(row=1, column=0, sticky="e")
+		self.spectrum_window	.grid(row=0, column=1, sticky="w")
+		self.spectrum_averaging	.grid(row=1, column=1, sticky="w")
+		tk.Checkbutton(spectrum_frame, text="Peak hold", variable=self.spectrum_peak_hold, command=self.on_spectrum_changed).grid(row=2, column=0, sticky="w")
+		tk.Checkbutton(spectrum_frame, text="dBV", 		 variable=self.spectrum_dbv).grid(row=2, column=1, sticky="w")
 		
 		time_frame = tk.LabelFrame(tools_frame, text=" Horizontal axis: ", padx=5, pady=5)
 		self.horizontal_units_label = tk.Label(time_frame, text="Time/Div: ")	
 		self.horizontal_units_label.grid(row=0, column=0, sticky="e")
 		tk.Label(time_frame, text="Trigger: ")	.grid(row=1, column=0, sticky="e")
 		tk.Label(time_frame, text="Extent: ")	.grid(row=2, column=0, sticky="e")
-		self.horiz_div    	 = ttk.Combobox(time_frame, state="readonly", values=self.horizontal_unit_values(self.operating_mode.get()), width=10)
+		self.peak_detect	 = tk.BooleanVar()
+		tk.Checkbutton(time_frame, text="Peak detect", variable=self.peak_detect).grid(row=3, column=1, sticky="w")
+		
+		""" equivalent time reconstructed on the host, see EquivalentTime.py """
+		self.reconstructor	 = EquivalentTime.Reconstructor()
+		self.host_ets		 = tk.BooleanVar()
+		tk.Checkbutton(time_frame, text="Host ETS", variable=self.host_ets, command=self.on_host_ets).grid(row=3, column=2, sticky="w")
+		
+		""" noise reduction, see Averaging.py """
+		self.averagers		 = {1: Averaging.FrameAverager(), 2: Averaging.FrameAverager()}
+		tk.Label(time_frame, text="Acquire: ")	.grid(row=4, column=0, sticky="e")
+		self.acquire_mode	 = ttk.Combobox(time_frame, state="readonly", values=Averaging.mode_names, width=10)
+		self.acquire_n		 = ttk.Combobox(time_frame, state="readonly", values=Averaging.frames_values, width=4)
+		self.acquire_info	 = tk.Label(time_frame, text="")
+		self.acquire_mode	.grid(row=4, column=1, sticky="w")
+		self.acquire_n		.grid(row=4, column=2, sticky="w")
+		self.acquire_info	.grid(row=5, column=1, sticky="w", columnspan=2)
+		self.horiz_div    	 = ttk.Combobox(time_frame, state="readonly", values=Acquisition.horizontal_unit_values(self.operating_mode.get()), width=10)
 		self.use_ets 		 = tk.BooleanVar()
 		self.use_ets_cb  	 = tk.Checkbutton(time_frame, text="ETS", variable=self.use_ets, command=self.on_use_ets) 
 		self.trigger_channel = ttk.Combobox(time_frame, state="readonly", values=["Ch 1","Ch 2"], width=10)
@@ -259,6 +413,30 @@ class Oscilloscope(tk.Frame):
 		self.trigger_channel.grid(row=1, column=1, sticky="w", columnspan=2)
 		self.horiz_div_info	.grid(row=2, column=1, sticky="w", columnspan=2)
 		
+		""" host side trigger on oversized captures, see Trigger.py and software_trigger() """
+		self.soft_trigger = Trigger.SoftwareTrigger()
+		trigger_frame = tk.LabelFrame(tools_frame, text=" Software trigger: ", padx=5, pady=5)
+		self.soft_trigger_mode	= ttk.Combobox(trigger_frame, state="readonly", values=Trigger.mode_names, width=8)
+		self.soft_trigger_slope	= ttk.Combobox(trigger_frame, state="readonly", values=Trigger.slope_names, width=8)
+		self.soft_trigger_level	= tk.Scale(trigger_frame, from_=-5, to=5, resolution=0.05, orient="horizontal", length=150)
+		self.soft_trigger_level2 = tk.Scale(trigger_frame, from_=-5, to=5, resolution=0.05, orient="horizontal", length=150)
+		self.soft_trigger_hyst	= ttk.Combobox(trigger_frame, state="readonly", values=["0 V","0.02 V","0.05 V","0.1 V","0.2 V","0.5 V"], width=8)
+		self.soft_trigger_width	= tk.StringVar()
+		self.soft_trigger_pre	= tk.Scale(trigger_frame, from_=0, to=100, resolution=5, orient="horizontal", length=150)
+		tk.Label(trigger_frame, text="Mode: ")		.grid(row=0, column=0, sticky="e")
+		tk.Label(trigger_frame, text="Level V: ")	.grid(row=1, column=0, sticky="e")
+		tk.Label(trigger_frame, text="Runt V: ")	.grid(row=2, column=0, sticky="e")
+		tk.Label(trigger_frame, text="Hysteresis: ").grid(row=3, column=0, sticky="e")
+		tk.Label(trigger_frame, text="Width us: ")	.grid(row=4, column=0, sticky="e")
+		tk.Label(trigger_frame, text="Pre-trig %: ").grid(row=5, column=0, sticky="e")
+		self.soft_trigger_mode	.grid(row=0, column=1, sticky="w")
+		self.soft_trigger_slope	.grid(row=0, column=2, sticky="w")
+		self.soft_trigger_level	.grid(row=1, column=1, sticky="w", columnspan=2)
+		self.soft_trigger_level2.grid(row=2, column=1, sticky="w", columnspan=2)
+		self.soft_trigger_hyst	.grid(row=3, column=1, sticky="w")
+		tk.Entry(trigger_frame, textvariable=self.soft_trigger_width, width=10).grid(row=4, column=1, sticky="w")
+		self.soft_trigger_pre	.grid(row=5, column=1, sticky="w", columnspan=2)
+		
 		self.CH1 			 = OscilloscopeChannel(tools_frame, 1, self)
 		self.CH2 			 = OscilloscopeChannel(tools_frame, 2, self)
 		self.CH1.plot_data,  = self.axis.plot([], [], lw=1, marker='') #  marker='o' marker='|', ls="" 
@@ -266,26 +444,52 @@ class Oscilloscope(tk.Frame):
 
 		mode_frame			.grid(row=0, column=0, sticky="we")
 		time_frame			.grid(row=1, column=0, sticky="we")
-		self.CH1.frame		.grid(row=2, column=0, sticky="we")
-		self.CH2.frame		.grid(row=3, column=0, sticky="we")
+		trigger_frame		.grid(row=2, column=0, sticky="we")
+		spectrum_frame		.grid(row=3, column=0, sticky="we")
+		self.CH1.frame		.grid(row=4, column=0, sticky="we")
+		self.CH2.frame		.grid(row=5, column=0, sticky="we")
+		self.view_frame		.grid(row=6, column=0, sticky="we")
+		self.view_frame		.grid_remove()
 		
 		tools_frame.grid(row=0, column=1, sticky="nw", padx=5, pady=5)
 		
 		""" timing parameters for sampling """
-		self.micros_needed_for_1sample  	= Globals.board.get_value("osc get_micros_needed_for_1sample", 2)
-		self.micros_needed_for_2sample  	= Globals.board.get_value("osc get_micros_needed_for_2sample", 2)
-		self.max_samples 					= Globals.board.get_value("osc get_max_samples", 2)
-		self.nanos_per_sample_in_ets_mode 	= Globals.board.get_value("osc get_nanos_per_sample_in_ets_mode", 2)
+		self.timing = Acquisition.query_board_timing(Globals.board)
 		
 		""" set initial values for widgets """
 		self.trigger_channel.set(Globals.config["Osc-HorizontalAxis"]["Trigger"])
+		self.peak_detect.set(Globals.config["Osc-HorizontalAxis"].get("PeakDetect", "False") == "True")
+		self.host_ets.set(Globals.config["Osc-HorizontalAxis"].get("HostETS", "False") == "True")
+		self.acquire_mode		.set(Globals.config["Osc-HorizontalAxis"].get("Acquire", "Normal"))
+		self.acquire_n			.set(Globals.config["Osc-HorizontalAxis"].get("AcquireN", "16"))
+		self.spectrum_window	.set(Globals.config["Osc-Spectrum"]["Window"])
+		self.spectrum_averaging	.set(Globals.config["Osc-Spectrum"]["Averaging"])
+		self.spectrum_peak_hold	.set(Globals.config["Osc-Spectrum"]["PeakHold"] == "True")
+		self.spectrum_dbv		.set(Globals.config["Osc-Spectrum"]["dBV"] == "True")
+		self.renderer			.set(Globals.config["Osc-Window"].get("Renderer", "Plot"))
+		self.persistence		.set(Globals.config["Osc-Window"].get("Persistence", "0.5 s"))
+		self.soft_trigger_mode	.set(Globals.config["Osc-Trigger"]["Mode"])
+		self.soft_trigger_slope	.set(Globals.config["Osc-Trigger"]["Slope"])
+		self.soft_trigger_level	.set(Globals.config["Osc-Trigger"]["Level"])
+		self.soft_trigger_level2.set(Globals.config["Osc-Trigger"]["RuntLevel"])
+		self.soft_trigger_hyst	.set(Globals.config["Osc-Trigger"]["Hysteresis"])
+		self.soft_trigger_width	.set(Globals.config["Osc-Trigger"]["Width"])
+		self.soft_trigger_pre	.set(Globals.config["Osc-Trigger"]["Pretrigger"])
+		self.on_spectrum_changed(None)
+		self.on_measurements_changed()
 		self.on_mode_changed(False)
 		self.on_channel_enabled(None)
 		self.on_horiz_div_changed(None)
 		self.time_at_last_frame = None
 
+		""" frames are captured in the background, see Acquisition.py """
+		self.acquisition = Acquisition.AcquisitionWorker(Globals.board, self.timing.max_samples)
+		self.acquisition.start()
+
 		""" don't start animation until this point in which the board is ok """
 		self.ani = animation.FuncAnimation(self.fig, self.animation_get_data, init_func=self.animation_init, frames=1, interval=100, blit=True)		
+		self.frame_drawn = False
+		self.on_renderer_changed(None)
 		
 		parent.resizable(False,False)
 		
@@ -295,37 +499,47 @@ class Oscilloscope(tk.Frame):
 		return self.CH1.plot_data, self.CH2.plot_data,
     
 	def animation_get_data(self,i):
-		if self.time_at_last_frame != None:
-			if self.perf_show.get():
-				self.perf_fps.configure(text=" {} fps".format(int(1/(time.time()-self.time_at_last_frame))))
-		self.time_at_last_frame = time.time()
+		if i != None and self.raster_job != None: # FuncAnimation started while the raster renderer runs the display
+			self.ani.event_source.stop()
+			return self.CH1.plot_data, self.CH2.plot_data,
+		
+		if self.viewer != None:
+			self.pause_acquisition()
+			self.frame_drawn = True
+			return self.draw_recording()
 		
 		""" channels on show -- only one channel possible in ETS mode """
-		if   not self.CH1.enabled.get() and not self.CH2.enabled.get(): return self.CH1.plot_data, self.CH2.plot_data,
+		if   not self.CH1.enabled.get() and not self.CH2.enabled.get(): return self.pause_acquisition()
 		elif 	 self.CH1.enabled.get() and not self.CH2.enabled.get(): showing = 1
 		elif not self.CH1.enabled.get() and     self.CH2.enabled.get(): showing = 2
 		else:                                                           
-			if self.use_ets.get(): return self.CH1.plot_data, self.CH2.plot_data,
+			if self.use_ets.get(): return self.pause_acquisition()
 			showing = 3		
 		
 		""" sampling parameters """
-		time_span_in_micros = int(10*self.horizontal_unit_in_micros(self.horiz_div.get()))
-		if self.use_ets.get():
-			time_between_samples = self.nanos_per_sample_in_ets_mode # nanoseconds
-			potential_samples    = int((time_span_in_micros*1000) / time_between_samples)
-			samples_to_show      = potential_samples
+		time_span_in_micros = int(10*Acquisition.horizontal_unit_in_micros(self.horiz_div.get()))
+		if self.peak_detect.get() and self.operating_mode.get() == "Oscilloscope":
+			samples_wanted = self.timing.max_samples if showing == 1 or showing == 2 else self.timing.max_samples//2
 		else:
-			min_micros_per_sample = self.micros_needed_for_1sample if showing == 1 or showing == 2 else self.micros_needed_for_2sample
-			potential_samples 	  = int(time_span_in_micros/min_micros_per_sample)
-			samples_to_show       = potential_samples if potential_samples < self.window_width else self.window_width
-			time_between_samples  = int(time_span_in_micros/samples_to_show) # microseconds
-			if time_between_samples < min_micros_per_sample:
-				print("Internal error 1", time_between_samples, "<", min_micros_per_sample)
-				return self.CH1.plot_data, self.CH2.plot_data,
-
-		if samples_to_show > self.max_samples:
-			print("Internal error 2", samples_to_show, ">", self.max_samples)
-			return self.CH1.plot_data, self.CH2.plot_data,
+			samples_wanted = self.window_width
+		host_ets	 = self.host_ets.get() and self.operating_mode.get() == "Oscilloscope" and not self.use_ets.get()
+		soft_trigger = self.soft_trigger_mode.get() != "Off" and self.operating_mode.get() == "Oscilloscope" and not self.use_ets.get() and not host_ets
+		high_res	 = self.acquire_mode.get() == "High-res" and self.operating_mode.get() == "Oscilloscope" and not self.use_ets.get() and not host_ets
+		samples_per_point = int(self.acquire_n.get()) if high_res else 1
+		samples_max  = (self.timing.max_samples if showing != 3 else self.timing.max_samples//2)//(Trigger.OVERSIZE if soft_trigger else 1)
+		samples_shown = min(samples_wanted, samples_max)
+		if high_res: # as many samples per screen point as the board can take, up to N
+			samples_wanted = samples_shown*samples_per_point
+		samples_wanted = min(samples_wanted, samples_max) # room for OVERSIZE screens at the same sampling rate
+		if host_ets: # long captures as fast as the board samples, folded into the screen
+			samples_to_show 	 = self.window_width
+			time_between_samples = self.timing.micros_needed_for_1sample if showing != 3 else self.timing.micros_needed_for_2sample
+		else:
+			try:
+				(samples_to_show, time_between_samples) = Acquisition.sampling_parameters(time_span_in_micros, showing, self.use_ets.get(), samples_wanted, self.timing)
+			except ValueError as e:
+				print(e)
+				return self.pause_acquisition()
 
 		""" update info on the time axis """
 		if self.operating_mode.get() == "Oscilloscope":
@@ -344,55 +558,373 @@ class Oscilloscope(tk.Frame):
 			freq_extent_value = int(100000/time_span_in_micros) if time_span_in_micros < 1000 else int(100000000/time_span_in_micros)
 			self.horiz_div_info.configure(text="{} samples {} {}".format(samples_to_show, freq_extent_value, freq_extent_units))
 
-		""" get samples and draw frame """
-		t0 = time.time()
+		""" request samples with the current settings and draw the newest frame captured """
 		trigger_channel = 1 if self.trigger_channel.get() == "Ch 1" else 2
-		(samples,period_status,period_value) = Globals.board.osc_get_samples(showing, samples_to_show, time_between_samples, trigger_channel, self.use_ets.get())
+		samples_to_capture = samples_to_show*Trigger.OVERSIZE if soft_trigger else samples_to_show
+		if host_ets: samples_to_capture = samples_max
+		parameters = Acquisition.CaptureParameters(showing, samples_to_capture, time_between_samples, trigger_channel, self.use_ets.get())
+		self.acquisition.set_parameters(parameters)
+		frame = self.acquisition.get_latest_frame(parameters)
+		if frame == None: return self.CH1.plot_data, self.CH2.plot_data,
+		if self.time_at_last_frame != None and self.perf_show.get():
+			self.perf_fps.configure(text=" {} fps".format(int(1/max(time.time()-self.time_at_last_frame, 0.001))))
+		self.time_at_last_frame = time.time()
+		self.frame_drawn = True
+		if self.recording.get():
+			self.record_info.configure(text="{} frames".format(self.acquisition.recorder.index.length if self.acquisition.recorder != None else 0))
 		if self.perf_show.get():
-			self.perf_sps.configure(text=" {} Ksps ".format(int((samples_to_show/1000)/(time.time()-t0))))
-		period_info = (period_status,period_value)
+			self.perf_sps.configure(text=" {} Ksps ".format(int((frame.parameters.num_samples/1000)/frame.capture_time)))
+		samples 	= frame.samples
+		showing 	= frame.parameters.channel
+		period_info = (frame.period_status,frame.period_value)
+		seconds_per_sample = frame.parameters.time_between_samples * (1e-9 if frame.parameters.use_ets else 1e-6)
+		trigger_channel = frame.parameters.trigger_channel
+		if soft_trigger:
+			samples = self.software_trigger(samples, frame.parameters, samples_to_show)
+		if host_ets:
+			traces = self.equivalent_time(samples, frame.parameters, period_info, time_span_in_micros)
+			if traces == None: return self.CH1.plot_data, self.CH2.plot_data,
+			(samples, samples1, samples2) = (traces.get(showing), traces.get(1), traces.get(2))
+			seconds_per_sample = time_span_in_micros*1e-6/self.window_width
+		elif showing == 1 or showing == 2:
+			(samples, seconds_per_sample) = self.noise_reduction(showing, samples, frame.parameters, samples_shown, seconds_per_sample)
+		else:
+			(samples1, spp) = self.noise_reduction(1, samples[1::2], frame.parameters, samples_shown, seconds_per_sample)
+			(samples2, spp) = self.noise_reduction(2, samples[2::2], frame.parameters, samples_shown, seconds_per_sample)
+			seconds_per_sample = spp
 		if showing == 1:
-			self.CH1.draw_frame(samples, period_info, self.operating_mode.get())
+			self.CH1.draw_frame(samples, period_info, self.operating_mode.get(), seconds_per_sample)
 		elif showing == 2:
-			self.CH2.draw_frame(samples, period_info, self.operating_mode.get())
+			self.CH2.draw_frame(samples, period_info, self.operating_mode.get(), seconds_per_sample)
 		else:
-			samples1 = samples[1::2]
-			samples2 = samples[2::2]
-			self.CH1.draw_frame(samples1, period_info if trigger_channel==1 else None, self.operating_mode.get())
-			self.CH2.draw_frame(samples2, period_info if trigger_channel==2 else None, self.operating_mode.get())
+			self.CH1.draw_frame(samples1, period_info if trigger_channel==1 else None, self.operating_mode.get(), seconds_per_sample)
+			self.CH2.draw_frame(samples2, period_info if trigger_channel==2 else None, self.operating_mode.get(), seconds_per_sample)
+		t = probe.start()
+		self.measurements.end_frame(Board.DUAL_CHANNEL_SKEW*frame.parameters.time_between_samples*1e-6 if showing == 3 else 0.0)
+		for channel in [self.CH1, self.CH2]:
+			if channel.enabled.get(): channel.show_info()
+		probe.lap("measurements", t)
 		
+		""" the artists returned are drawn and blitted right after this returns, before Tk gets idle """
+		t = probe.start()
+		if t != None and self.raster_job == None: self.parent.after_idle(lambda: probe.lap("draw", t))
 		return self.CH1.plot_data, self.CH2.plot_data,
-    
-	def horizontal_unit_values(self, mode):
-		if mode == "Oscilloscope":
-			return ["1 us", "2 us",   "5 us",   "10 us",  "20 us", "50 us", "0.1 ms","0.2 ms","0.5 ms","1 ms", "2 ms",  "5 ms",  "10 ms", "20 ms","50 ms"]
+		
+	def equivalent_time(self, samples, parameters, period_info, time_span_in_micros):
+		"""
+		Folds a capture into the host equivalent time reconstruction and returns the traces on screen,
+		{channel: samples}, or None if nothing can be shown yet. Time 0 of the reconstruction is put at 
+		the pre-trigger fraction of the software trigger.
+		"""
+		reconstructor = self.reconstructor
+		reconstructor.configure(parameters, time_span_in_micros*1e-6, self.window_width, self.soft_trigger_pre.get()/100)
+		channels = {parameters.channel: samples} if parameters.channel != 3 else {1: samples[1::2], 2: samples[2::2]}
+		trigger_channel = parameters.channel if parameters.channel != 3 else parameters.trigger_channel
+		offsets = {2: Board.DUAL_CHANNEL_SKEW*parameters.time_between_samples*1e-6} if parameters.channel == 3 else None
+		if not reconstructor.add(channels, trigger_channel, parameters.time_between_samples*1e-6, period_info, offsets):
+			self.horiz_div_info.configure(text="Host ETS: no period")
+		if reconstructor.period == None: return None
+		self.horiz_div_info.configure(text="Host ETS {:.0f}% filled".format(100*reconstructor.fill()))
+		return dict((channel, reconstructor.trace(channel)) for channel in channels)
+		
+	def on_host_ets(self):
+		if self.host_ets.get(): self.use_ets.set(False)
+		
+	def noise_reduction(self, channel, samples, parameters, samples_shown, seconds_per_sample):
+		"""
+		Samples of a channel averaged with the previous frames, or decimated in High-res mode, and the time
+		between the samples returned. Averaging starts over when the captures or the trigger change.
+		"""
+		averager = self.averagers[channel]
+		averager.mode = self.acquire_mode.get()
+		averager.n	  = int(self.acquire_n.get())
+		key = (parameters, self.soft_trigger_mode.get(), self.soft_trigger_slope.get(), self.soft_trigger_level.get(), self.soft_trigger_level2.get(), 
+			   self.soft_trigger_hyst.get(), self.soft_trigger_width.get(), self.soft_trigger_pre.get())
+		if averager.mode == "High-res" and self.operating_mode.get() == "Oscilloscope" and not parameters.use_ets:
+			factor = max(1, len(samples)//samples_shown)
+			if factor > 1:
+				samples = averager.decimate(samples, factor, key)
+				seconds_per_sample *= factor
+			info = "{} samples per point".format(factor)
+		elif averager.mode == "Average" or averager.mode == "Exponential":
+			samples = averager.process(samples, key)
+			info = "{} frames".format(averager.frames())
 		else:
-			return ["1 MHz","500 KHz","200 KHz","100 KHz","50 KHz","20 KHz","10 KHz","5 KHz", "2 KHz", "1 KHz","500 Hz","200 Hz","100 Hz","50 Hz","20 Hz"]
-			
-	def horizontal_unit_in_micros(self, value):
-		if value[-2:] == "ms":
-			return float(value[:-3])*1000
-		elif value[-2:] == "us":
-			return float(value[:-3])
-		elif value[-3] == "MHz":
-			return 1/float(value[:-4])
-		elif value[-3:] == "KHz":
-			return 1000/float(value[:-4])
-		elif value[-2:] == "Hz":
-			return 1000000/float(value[:-3])
-			
+			info = ""
+		if self.acquire_info.cget("text") != info: self.acquire_info.configure(text=info)
+		return (samples, seconds_per_sample)
+		
+	def software_trigger(self, samples, parameters, window):
+		"""
+		The window of samples around the software trigger point of an oversized capture, in the layout of
+		the capture (channels alternated in dual mode). Without a trigger point the start of the capture
+		is shown, as the board trigger left it.
+		"""
+		trigger = self.soft_trigger
+		channel = self.CH1 if parameters.trigger_channel == 1 else self.CH2
+		volts_to_sample = 1/(0.000805861*channel.tr_func_avg)
+		micros_per_sample = parameters.time_between_samples
+		try:
+			width = float(self.soft_trigger_width.get())/micros_per_sample
+		except ValueError:
+			width = 0
+		trigger.mode		= self.soft_trigger_mode.get()
+		trigger.slope		= self.soft_trigger_slope.get()
+		trigger.level		= self.soft_trigger_level.get()*volts_to_sample
+		trigger.level2		= self.soft_trigger_level2.get()*volts_to_sample
+		trigger.hysteresis	= float(self.soft_trigger_hyst.get()[:-2])*volts_to_sample
+		trigger.width		= width
+		trigger.pretrigger	= self.soft_trigger_pre.get()/100
+		
+		if parameters.channel != 3:
+			position = trigger.find(samples, window)
+			if position == None: return samples[:window]
+			return trigger.align(samples, position, window)
+		channels = [samples[1::2], samples[2::2]]
+		position = trigger.find(channels[parameters.trigger_channel-1], window)
+		aligned = np.empty(2*window+1, dtype=np.uint16)
+		aligned[0] = samples[0]
+		for n in range(2):
+			aligned[1+n::2] = channels[n][:window] if position == None else trigger.align(channels[n], position, window)
+		return aligned
+		
+	def raster_step(self):
+		"""
+		Display loop of the raster renderer, in place of the FuncAnimation: runs every RASTER_INTERVAL ms,
+		often enough not to delay a new frame, without keeping the Tk thread busy polling for one. The
+		traces computed by animation_get_data are rasterized into the phosphor buffer, which is shown at 
+		every new frame and at least 30 times per second as it fades.
+		"""
+		now = time.time()
+		self.frame_drawn = False
+		self.animation_get_data(None)
+		t = probe.start()
+		self.raster.decay(now-self.raster_time)
+		self.raster_time = now
+		if self.frame_drawn:
+			self.raster.begin_frame()
+			for layer, channel in enumerate([self.CH1, self.CH2]):
+				if channel.enabled.get(): self.raster.add_trace(layer, *channel.plot_data.get_data())
+		if self.frame_drawn or now-self.raster_shown > 0.03:
+			colors = [Raster.COLORS[channel.color.get()] if channel.enabled.get() else None for channel in [self.CH1, self.CH2]]
+			self.raster_photo.configure(data=self.raster.render(colors), format="PPM")
+			self.raster_shown = now
+			probe.lap("draw", t)
+		self.raster_job = self.parent.after(RASTER_INTERVAL, self.raster_step)
+		
+	def draw_recording(self):
+		"""
+		Draws the part of the recording selected by the position slider and zoom. Only the pyramid level 
+		matching the zoom is read, see Pyramid.py
+		"""
+		length = max(len(self.viewer.pyramids[1]), len(self.viewer.pyramids[2]))
+		span   = min(self.view_span, length) if length else 1
+		start  = int((length-span) * self.view_position.get()/1000)
+		self.view_info.configure(text="{} of {} samples".format(int(span), length))
+		for channel in [self.CH1, self.CH2]:
+			pyramid = self.viewer.pyramids[channel.channel_number]
+			if not channel.enabled.get() or len(pyramid) == 0:
+				channel.plot_data.set_data([], [])
+				continue
+			positions, mins, maxs = pyramid.view(start, start+span, self.window_width)
+			lut = channel.screen_lut(float(channel.volts_div.get()[:-2]), channel.offset_slide.get()*10, channel.tr_func_avg)
+			x = np.repeat((positions-start)*100/span, 2)
+			y = np.empty(2*len(mins))
+			y[0::2] = lut[mins & 0x0FFF]
+			y[1::2] = lut[maxs & 0x0FFF]
+			channel.plot_data.set_data(x,y)
+			channel.plot_data.set_color(channel.color.get())
+		return self.CH1.plot_data, self.CH2.plot_data,
+		
+	def on_view_recording(self):
+		name = filedialog.askopenfilename(title="View recording", filetypes=[("PicoScope recording", "*.json")], parent=self.parent)
+		if not name: return
+		try:
+			self.viewer = Recorder.Recording(name[:-5])
+		except Exception as e:
+			messagebox.showinfo(message="Cannot open recording.\n{}".format(e), title="Error", parent=self.parent)
+			return
+		self.view_span = max(len(self.viewer.pyramids[1]), len(self.viewer.pyramids[2]))
+		self.view_position.set(0)
+		self.view_frame.grid()
+		
+	def on_view_zoom(self, factor):
+		self.view_span = max(self.window_width, self.view_span*factor)
+		
+	def on_view_close(self):
+		self.viewer = None
+		self.view_frame.grid_remove()
+		
+	def pause_acquisition(self):
+		self.acquisition.set_parameters(None)
+		return self.CH1.plot_data, self.CH2.plot_data,
+    
 	def on_use_ets(self):
 		try: # On first call, the CHx objects are not yet created
 			if self.use_ets.get() and self.CH1.enabled.get() and self.CH2.enabled.get():
 				messagebox.showinfo(message="ETS mode available only for single channel.", title="Warning", parent=self.parent)
 				self.use_ets.set(False)
+			if self.use_ets.get(): self.host_ets.set(False)
 		except:
 			pass
 			
+	def on_record(self):
+		if self.recording.get():
+			name = filedialog.asksaveasfilename(title="Record to", initialfile=time.strftime("PicoScope-%Y%m%d-%H%M%S"), parent=self.parent)
+			if not name:
+				self.recording.set(False)
+				return
+			attenuation = lambda channel, period_info: (self.CH1 if channel == 1 else self.CH2).current_attenuation(period_info)
+			self.acquisition.set_recorder(Recorder.Recorder(name, attenuation))
+		else:
+			recorder = self.acquisition.set_recorder(None)
+			if recorder != None: recorder.close()
+			self.record_info.configure(text="")
+			
+	def on_renderer_changed(self, event):
+		if self.renderer.get() == "Raster":
+			if self.raster == None: self.raster = Raster.PhosphorDisplay(*self.raster_size)
+			self.raster.persistence = Raster.persistence_seconds(self.persistence.get())
+			self.persistence.configure(state="readonly")
+			if self.raster_job != None: return
+			self.ani.event_source.stop()
+			self.canvas.get_tk_widget().grid_remove()
+			self.raster_label.grid(column=0, row=0, sticky="nswe")
+			self.raster.clear()
+			self.raster_time  = time.time()
+			self.raster_shown = 0
+			self.raster_step()
+		else:
+			self.persistence.configure(state="disabled")
+			if self.raster_job == None: return
+			self.parent.after_cancel(self.raster_job)
+			self.raster_job = None
+			self.raster_label.grid_remove()
+			self.canvas.get_tk_widget().grid()
+			self.canvas.draw()
+			self.ani.event_source.start()
+		
 	def on_perf_show(self):
+		probe.enabled = self.perf_show.get() or self.stats_window != None
 		if not self.perf_show.get():
 			self.perf_sps.configure(text="")
 			self.perf_fps.configure(text="")
+			
+	def on_perf_stats(self):
+		"""
+		Window with the percentiles of every stage of the frame path and the frames lost, see 
+		Instrumentation.py. Stages are timed while it is open or Perf is checked.
+		"""
+		if self.stats_window != None:
+			self.stats_window.lift()
+			return
+		self.stats_window = tk.Toplevel(self.parent)
+		self.stats_window.title("Oscilloscope stats")
+		self.stats_window.protocol("WM_DELETE_WINDOW", self.on_perf_stats_close)
+		table = tk.Frame(self.stats_window, padx=5, pady=5)
+		columns = ["count", "p50_ms", "p95_ms", "p99_ms", "max_ms"]
+		for c, text in enumerate(["Stage", "Frames", "p50 ms", "p95 ms", "p99 ms", "max ms"]):
+			tk.Label(table, text=text, font="TkDefaultFont 9 bold").grid(row=0, column=c, sticky="e" if c else "w", padx=3)
+		self.stats_labels = {}
+		for r, name in enumerate(Instrumentation.STAGES + Instrumentation.COUNTERS):
+			tk.Label(table, text=name).grid(row=r+1, column=0, sticky="w", padx=3)
+			self.stats_labels[name] = [tk.Label(table, width=8, anchor="e") for c in columns]
+			for c, label in enumerate(self.stats_labels[name]):
+				if name in Instrumentation.COUNTERS and c > 0: break
+				label.grid(row=r+1, column=c+1, sticky="e", padx=3)
+		table.pack()
+		buttons = tk.Frame(self.stats_window, padx=5, pady=5)
+		tk.Button(buttons, text="Reset",	 command=probe.reset)			.pack(side="left")
+		tk.Button(buttons, text="Export...", command=self.on_perf_export)	.pack(side="right")
+		buttons.pack(fill="x")
+		probe.enabled = True
+		self.update_perf_stats()
+		
+	def update_perf_stats(self):
+		if self.stats_window == None: return
+		summary = probe.summary()
+		for name, labels in self.stats_labels.items():
+			if name in summary["counters"]:
+				labels[0].configure(text=str(summary["counters"][name]))
+				continue
+			values = summary["stages"][name]
+			labels[0].configure(text=str(values["count"]))
+			for label, column in zip(labels[1:], ["p50_ms", "p95_ms", "p99_ms", "max_ms"]):
+				label.configure(text="{:.3f}".format(values[column]) if values[column] != None else "-")
+		self.stats_window.after(500, self.update_perf_stats)
+		
+	def on_perf_export(self):
+		name = filedialog.asksaveasfilename(title="Export stats", initialfile=time.strftime("PicoScope-stats-%Y%m%d-%H%M%S.csv"), 
+											filetypes=[("CSV", "*.csv"), ("JSON", "*.json")], parent=self.stats_window)
+		if not name: return
+		try:
+			probe.export(name)
+		except Exception as e:
+			messagebox.showinfo(message="Cannot export.\n{}".format(e), title="Error", parent=self.stats_window)
+		
+	def on_perf_stats_close(self):
+		self.stats_window.destroy()
+		self.stats_window = None
+		self.on_perf_show()
+		
+	def on_measurements_changed(self):
+		""" Only the measurements shown in a channel info or checked in the measurements window are computed """
+		selected = set()
+		for channel in [self.CH1, self.CH2]:
+			name = channel.info_cb.get()[:-1]
+			if name == "Volts":				 selected |= {"Min", "Max"}
+			elif name in Measurements.NAMES: selected.add(name)
+		if self.measurements_window != None:
+			selected |= set(name for name, checked in self.measurements_checked.items() if checked.get())
+		self.measurements.selected = selected
+		
+	def on_measurements(self):
+		"""
+		Window with the measurements checked for both channels: the value of the last frame and the
+		statistics of the last Measurements.FRAMES frames.
+		"""
+		if self.measurements_window != None:
+			self.measurements_window.lift()
+			return
+		self.measurements_window = tk.Toplevel(self.parent)
+		self.measurements_window.title("Measurements")
+		self.measurements_window.protocol("WM_DELETE_WINDOW", self.on_measurements_close)
+		table = tk.Frame(self.measurements_window, padx=5, pady=5)
+		statistics = ["Last", "Mean", "Std", "Min", "Max"]
+		tk.Label(table, text="Ch 1", font="TkDefaultFont 9 bold").grid(row=0, column=1, columnspan=5)
+		tk.Label(table, text="Ch 2", font="TkDefaultFont 9 bold").grid(row=0, column=6, columnspan=5)
+		for c, text in enumerate(statistics+statistics):
+			tk.Label(table, text=text, font="TkDefaultFont 9 bold").grid(row=1, column=c+1, sticky="e", padx=3)
+		self.measurements_checked = {}
+		self.measurements_labels  = {}
+		for r, name in enumerate(Measurements.NAMES):
+			self.measurements_checked[name] = tk.BooleanVar(value=name in self.measurements.selected)
+			tk.Checkbutton(table, text=name, variable=self.measurements_checked[name], command=self.on_measurements_changed).grid(row=r+2, column=0, sticky="w")
+			self.measurements_labels[name] = [tk.Label(table, width=9, anchor="e") for c in range(10)]
+			for c, label in enumerate(self.measurements_labels[name]):
+				label.grid(row=r+2, column=c+1, sticky="e", padx=3)
+		table.pack()
+		buttons = tk.Frame(self.measurements_window, padx=5, pady=5)
+		tk.Button(buttons, text="Reset", command=self.measurements.reset).pack(side="left")
+		buttons.pack(fill="x")
+		self.on_measurements_changed()
+		self.update_measurements()
+		
+	def update_measurements(self):
+		if self.measurements_window == None: return
+		for name, labels in self.measurements_labels.items():
+			for n, channel in enumerate([1, 2]):
+				last = self.measurements.value(channel, name)
+				statistics = self.measurements.statistics(channel, name)
+				values = [last] + ([statistics[2], statistics[3], statistics[0], statistics[1]] if statistics != None else [None]*4)
+				for label, value in zip(labels[5*n:5*n+5], values):
+					label.configure(text=Measurements.format_value(name, value) if name in self.measurements.selected else "")
+		self.measurements_window.after(500, self.update_measurements)
+		
+	def on_measurements_close(self):
+		self.measurements_window.destroy()
+		self.measurements_window = None
+		self.on_measurements_changed()
 		
 	def on_channel_enabled(self,ch_num):
 		try: # On first call, the CHx objects are not yet created
@@ -423,18 +955,24 @@ class Oscilloscope(tk.Frame):
 		if self.operating_mode.get() == "Oscilloscope":
 			self.horizontal_units_label.configure(text="Time/Div: ")
 			if save_current: Globals.config["Osc-HorizontalAxis"]["FreqDiv"] = self.horiz_div.get()
-			self.horiz_div.configure(values=self.horizontal_unit_values("Oscilloscope"))
+			self.horiz_div.configure(values=Acquisition.horizontal_unit_values("Oscilloscope"))
 			self.horiz_div.set(Globals.config["Osc-HorizontalAxis"]["TimeDiv"])
 			self.trigger_channel.configure(state="readonly")
 		else:
 			self.horizontal_units_label.configure(text="Freq./Div: ")
 			if save_current: Globals.config["Osc-HorizontalAxis"]["TimeDiv"] = self.horiz_div.get()
-			self.horiz_div.configure(values=self.horizontal_unit_values("Spectrometer"))
+			self.horiz_div.configure(values=Acquisition.horizontal_unit_values("Spectrometer"))
 			self.horiz_div.set(Globals.config["Osc-HorizontalAxis"]["FreqDiv"])
 			self.trigger_channel.configure(state="disabled")
 
+	def on_spectrum_changed(self, event=None):
+		for channel in [self.CH1, self.CH2]:
+			channel.spectrum.configure(self.spectrum_window.get(), self.spectrum_averaging.get(), self.spectrum_peak_hold.get())
+		
 	def on_horiz_div_changed(self, event):
-		if self.horizontal_unit_in_micros(self.horiz_div.get()) <= 50:
+		self.CH1.spectrum.reset()
+		self.CH2.spectrum.reset()
+		if Acquisition.horizontal_unit_in_micros(self.horiz_div.get()) <= 50:
 			self.use_ets_cb.configure(state="normal")
 		else:
 			self.use_ets.set(False)
@@ -450,6 +988,23 @@ class Oscilloscope(tk.Frame):
 		else:
 			Globals.config["Osc-HorizontalAxis"]["FreqDiv"]	= self.horiz_div.get()
 		Globals.config["Osc-HorizontalAxis"]["Trigger"]		= self.trigger_channel.get()
+		Globals.config["Osc-HorizontalAxis"]["PeakDetect"]	= "True" if self.peak_detect.get() == True else "False"
+		Globals.config["Osc-HorizontalAxis"]["HostETS"]		= "True" if self.host_ets.get() == True else "False"
+		Globals.config["Osc-HorizontalAxis"]["Acquire"]		= self.acquire_mode.get()
+		Globals.config["Osc-HorizontalAxis"]["AcquireN"]	= self.acquire_n.get()
+		Globals.config["Osc-Spectrum"]["Window"]			= self.spectrum_window.get()
+		Globals.config["Osc-Spectrum"]["Averaging"]			= self.spectrum_averaging.get()
+		Globals.config["Osc-Spectrum"]["PeakHold"]			= "True" if self.spectrum_peak_hold.get() == True else "False"
+		Globals.config["Osc-Spectrum"]["dBV"]				= "True" if self.spectrum_dbv.get() == True else "False"
+		Globals.config["Osc-Window"]["Renderer"]			= self.renderer.get()
+		Globals.config["Osc-Window"]["Persistence"]			= self.persistence.get()
+		Globals.config["Osc-Trigger"]["Mode"]				= self.soft_trigger_mode.get()
+		Globals.config["Osc-Trigger"]["Slope"]				= self.soft_trigger_slope.get()
+		Globals.config["Osc-Trigger"]["Level"]				= str(self.soft_trigger_level.get())
+		Globals.config["Osc-Trigger"]["RuntLevel"]			= str(self.soft_trigger_level2.get())
+		Globals.config["Osc-Trigger"]["Hysteresis"]			= self.soft_trigger_hyst.get()
+		Globals.config["Osc-Trigger"]["Width"]				= self.soft_trigger_width.get()
+		Globals.config["Osc-Trigger"]["Pretrigger"]			= str(self.soft_trigger_pre.get())
 		Globals.config["Osc-Ch1"]["VerticalDivision"] 		= self.CH1.volts_div.get()
 		Globals.config["Osc-Ch1"]["Color"] 					= self.CH1.color.get()
 		Globals.config["Osc-Ch1"]["Offset"] 				= str(self.CH1.offset_slide.get())
@@ -460,9 +1015,17 @@ class Oscilloscope(tk.Frame):
 		Globals.config["Osc-Ch2"]["Enabled"]				= "True" if self.CH2.enabled.get() == True else "False"
 		Globals.save_config()
 		
+		self.acquisition.stop()
+		if self.recording.get():
+			self.recording.set(False)
+			self.on_record()
+		self.stats_window = None
+		probe.enabled = False
+		if self.raster_job != None: self.parent.after_cancel(self.raster_job)
 		Globals.board.send_command("led ch1 off")
 		Globals.board.send_command("led ch2 off")
 		
+		Globals.release_board("Oscilloscope")
 		Globals.toplevel_windows["Oscilloscope"].parent.destroy()
 		Globals.toplevel_windows["Oscilloscope"] = None
 
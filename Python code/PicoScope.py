@@ -1,15 +1,27 @@
+import time
+t_start = time.perf_counter()
+
+import sys
 import tkinter as tk
 from tkinter import messagebox
 
 import Globals
-import Oscilloscope
-import Settings
+
+"""
+Only what the launcher needs is imported here: each tool is imported when its window is first opened
+(see LaunchItem.on_click), so matplotlib and NumPy load with the Oscilloscope and not at startup. The
+board is opened in the background meanwhile, see Globals.connect_board(). 
+
+Seconds from start until the launcher is shown; exceeding it is reported on the console
+"""
+STARTUP_BUDGET = 0.5
 
 class LaunchItem():
 
 	def __init__(self, parent, name, row, internal_name, *args, **kwargs):
 		
 		self.internal_name = internal_name
+		self.name		   = name
 		try:
 			self.image = tk.PhotoImage(file=self.internal_name+".png")
 		except:
@@ -22,6 +34,10 @@ class LaunchItem():
 	def on_click(self):
 		if Globals.toplevel_windows[self.internal_name] == None:
 			class_ = getattr(__import__(self.internal_name),self.internal_name)
+			holder = Globals.claim_board(self.name, *getattr(class_, "board_resources", ())) # see Globals.claim_board
+			if holder != None:
+				messagebox.showinfo(message="The board is in use by the {}.".format(holder), title=self.name)
+				return
 			Globals.toplevel_windows[self.internal_name] = class_(tk.Toplevel())
 		else:
 			Globals.toplevel_windows[self.internal_name].parent.attributes("-topmost", True)
@@ -39,17 +55,23 @@ class Main(tk.Frame):
 		self.settings   = LaunchItem(parent, "Settings",						1, "Settings")
 		self.osc  		= LaunchItem(parent, "Oscilloscope", 					2, "Oscilloscope")
 		self.funcgen	= LaunchItem(parent, "Function Generator",				3, "FuncGen")
+		self.bode		= LaunchItem(parent, "Bode Analyzer",					4, "Bode")
 
+		Globals.connect_board()
+		self.after(20, self.on_board_connection)
+		parent.resizable(False,False)
+		
+	def on_board_connection(self):
+		if not Globals.board_connected() and Globals.board_thread.is_alive():
+			self.after(20, self.on_board_connection)
+			return
+		if Globals.board_error != None:
+			messagebox.showinfo(message="Board connection failed.\n{}".format(Globals.board_error), title="Error")
+			exit(0)
 		if not Globals.board.ok:
 			messagebox.showinfo(message="Board not found.\nReconnect USB.", title="Error")
 			exit(0)
 		Globals.board.send_command("led breathe {}".format(Globals.config["Settings-Board"]["WakeUpColor"].lower()))
-		
-		parent.resizable(False,False)
-		
-	def on_settings(self):
-		dialog = Settings.Settings(self.parent)
-		self.parent.wait_window(dialog.top)
 
 	def on_close_window(self):
 		for w in Globals.toplevel_windows:
@@ -69,5 +91,10 @@ if __name__ == "__main__":
 	root.title("PicoScope")
 	Main(root)
 
+	root.update()
+	startup_time = time.perf_counter()-t_start
+	if startup_time > STARTUP_BUDGET or "--startup-time" in sys.argv:
+		print("Startup took {:.3f} s, budget {} s".format(startup_time, STARTUP_BUDGET))
+
 	root.mainloop()
 
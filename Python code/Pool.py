@@ -0,0 +1,166 @@
+import argparse
+import collections
+import sys
+import time
+import numpy as np
+
+import Board
+import Acquisition
+
+"""
+BOARD POOL
+
+	Several PicoScopes on different serial ports seen as one instrument: board b (0, 1, ...) gives
+	channels 2b+1 and 2b+2. Every board has its own acquisition worker (see Acquisition.py), a thread
+	doing the I/O of that board only, and all capture with the same settings in dual channel mode.
+	The ports are opened with a read timeout, so a worker waiting for its board sleeps in the OS
+	instead of polling: the workers do not compete for the interpreter and each board keeps the frame
+	rate it has alone (python3 Pool.py --simulated 8 shows it, with simulated boards).
+
+	The boards are not synchronized, so the merged frame is built from the newest frame of each board,
+	which is only meaningful for repetitive signals. The newest frame of every board is kept until the
+	board has a newer one, so a new merged frame comes whenever any board has a new frame. Their channels are aligned in time:
+		trigger			All boards trigger on the same signal (wired to the trigger channel of each),
+						so their frames start at the same point of it. No correction.
+		correlation		The reference channel of every board (1 or 2, the same on all, wired to the same
+						signal) is cross-correlated with that of board 0, and the channels of the board
+						are shifted by the lag found, to a fraction of a sample.
+	Samples shifted in from outside a capture repeat its first or last sample.
+
+		pool = Pool.BoardPool(["/dev/ttyACM0", "/dev/ttyACM1"])
+		pool.set_parameters(samples_per_channel, time_between_samples)
+		merged = pool.get_merged_frame(alignment="correlation")
+		merged.channels[2]		# channel 1 of the second board, as channel 3 of the instrument
+"""
+
+MergedFrame = collections.namedtuple("MergedFrame", ["channels", "lags", "seconds_per_sample", "frames"])
+
+def correlation_lag(reference, samples, max_lag=None):
+	"""
+	Delay of samples relative to reference, in samples (positive if samples comes later), from the peak
+	of their cross-correlation refined by a parabola through it and its neighbours.
+	"""
+	n = min(len(reference), len(samples))
+	a = reference[:n] - np.mean(reference[:n])
+	b = samples[:n] - np.mean(samples[:n])
+	size = 1 << int(np.ceil(np.log2(2*n)))
+	xcorr = np.fft.irfft(np.conj(np.fft.rfft(a, size)) * np.fft.rfft(b, size), size)
+	if max_lag == None: max_lag = n//2
+	lags = np.concatenate((xcorr[-max_lag:], xcorr[:max_lag+1])) # lags -max_lag..max_lag
+	k = int(np.argmax(lags)) # of a periodic signal, the period nearest to lag 0 weighs most
+	lag = k - max_lag
+	if 0 < k < len(lags)-1:
+		""" refined per overlapping sample, else the longer overlap on one side pulls the peak """
+		(y0, y1, y2) = lags[k-1:k+2] / (n - np.abs(np.arange(lag-1, lag+2)))
+		if y0-2*y1+y2 != 0: lag += 0.5*(y0-y2)/(y0-2*y1+y2)
+	return lag
+
+def shift(samples, lag):
+	""" samples delayed by -lag, as float32, the ends repeated """
+	if lag == 0: return (samples & 0x0FFF).astype(np.float32)
+	index = np.arange(len(samples))
+	return np.interp(index+lag, index, samples & 0x0FFF).astype(np.float32)
+
+class BoardPool():
+
+	def __init__(self, ports, timeout=0.05):
+		self.boards	 = [Board.Board(port, timeout) for port in ports]
+		self.ok		 = all(board.ok for board in self.boards)
+		self.workers = []
+		self.parameters = None
+		self.latest	 = [None]*len(self.boards) # newest frame of every board with the current settings
+		self.fresh	 = False					# some board has a frame not merged yet
+		if not self.ok:
+			print("Error: cannot open", ", ".join(port for port, board in zip(ports, self.boards) if not board.ok))
+			for board in self.boards:
+				if board.ok: board.close() # those opened are not left open
+			return
+		self.timing	 = [Acquisition.query_board_timing(board) for board in self.boards]
+		self.workers = [Acquisition.AcquisitionWorker(board, timing.max_samples) for board, timing in zip(self.boards, self.timing)]
+		for worker in self.workers: worker.start()
+
+	def channels(self):
+		return 2*len(self.boards)
+
+	def max_samples_per_channel(self):
+		return min(timing.max_samples for timing in self.timing)//2
+
+	def set_parameters(self, num_samples, time_between_samples, trigger_channel=1):
+		""" Same dual channel captures on every board, None pauses them """
+		if num_samples == None:
+			self.parameters = None
+		else:
+			self.parameters = Acquisition.CaptureParameters(3, num_samples, time_between_samples, trigger_channel, False)
+		self.latest = [None]*len(self.boards)
+		self.fresh  = False
+		for worker in self.workers: worker.set_parameters(self.parameters)
+
+	def get_merged_frame(self, alignment="trigger", reference=1):
+		"""
+		MergedFrame of the newest frame of every board, None until all have one with the current settings
+		or if no board has a new frame since the last merged frame. A frame taken from a board stays valid
+		until the board has a newer one (see Acquisition.FrameRing).
+		"""
+		for b, worker in enumerate(self.workers):
+			frame = worker.get_latest_frame(self.parameters)
+			if frame != None:
+				self.latest[b] = frame
+				self.fresh	   = True
+		if self.parameters == None or None in self.latest or not self.fresh: return None
+		self.fresh = False
+		frames = list(self.latest)
+		channels = []
+		for frame in frames:
+			channels += [frame.samples[1::2], frame.samples[2::2]]
+		lags = [0]*len(frames)
+		if alignment == "correlation":
+			ref = [(channels[2*b+reference-1] & 0x0FFF).astype(float) for b in range(len(frames))]
+			for b in range(len(frames)): # board 0 too, at lag 0, so that all channels come as float32
+				if b > 0: lags[b] = correlation_lag(ref[0], ref[b])
+				channels[2*b]	= shift(channels[2*b], lags[b])
+				channels[2*b+1] = shift(channels[2*b+1], lags[b])
+		return MergedFrame(channels, lags, self.parameters.time_between_samples*1e-6, frames)
+
+	def frames_received(self):
+		return [worker.frames_received for worker in self.workers]
+
+	def close(self):
+		for worker in self.workers: worker.stop()
+		for board in self.boards:
+			if board.ok: board.close()
+
+def throughput(ports, num_samples, time_between_samples, seconds):
+	""" Frames per second of every board of a pool, all capturing at once """
+	pool = BoardPool(ports)
+	if not pool.ok: return None
+	pool.set_parameters(num_samples, time_between_samples)
+	while min(pool.frames_received()) == 0: time.sleep(0.001)
+	t0 = time.perf_counter()
+	first = pool.frames_received()
+	time.sleep(seconds)
+	fps = [(n-f)/(time.perf_counter()-t0) for n, f in zip(pool.frames_received(), first)]
+	pool.close()
+	return fps
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description="Frame rate of every board of a pool")
+	parser.add_argument("ports",		 nargs="*", help="serial ports or sim:// URLs")
+	parser.add_argument("--simulated",	 type=int, help="pools of 1 up to this many simulated boards instead")
+	parser.add_argument("--samples",	 type=int, default=1000, help="per channel and frame, default 1000")
+	parser.add_argument("--micros",		 type=int, default=10, help="between samples, default 10")
+	parser.add_argument("--seconds",	 type=float, default=2.0, help="per measurement, default 2")
+	args = parser.parse_args(argv)
+
+	if args.simulated:
+		counts = [n for n in [1, 2, 4, 8, 16, 32] if n < args.simulated] + [args.simulated]
+		pools  = [["sim://?seed={}&ch1=sine,1000,2.0&ch2=square,1000,1.0".format(i) for i in range(n)] for n in counts]
+	else:
+		pools  = [args.ports]
+	for ports in pools:
+		fps = throughput(ports, args.samples, args.micros, args.seconds)
+		if fps == None: return 1
+		print("{:>3} boards: {:.1f} frames/s per board (min {:.1f}, max {:.1f})".format(len(ports), np.mean(fps), min(fps), max(fps)))
+	return 0
+
+if __name__ == "__main__":
+	sys.exit(main())
@@ -0,0 +1,126 @@
+import os
+import numpy as np
+
+import MappedArray
+
+"""
+MIN/MAX PYRAMID
+
+	To browse a recording of hundreds of millions of samples the screen only needs, for every pixel column,
+	the minimum and maximum of the samples falling in it. These are precomputed at several resolutions
+	(mipmap levels) while recording:
+		level 0		The samples of the channel, read from the sample file of the recording (Recorder.py),
+					not stored again
+		name.L1		min/max of every FACTOR samples
+		name.Lk		min/max of every FACTOR**k samples, computed from level k-1
+	Samples that do not fill a complete bin yet are carried over to the next append, so the levels are
+	exactly those that would be computed over the whole recording at once. On close what is carried
+	over is written as a last, partial bin of each level.
+
+	PyramidReader.view() reads only the coarsest level still finer than a pixel for the range shown, so
+	the cost of a redraw depends on the screen width and not on the recording length.
+"""
+
+FACTOR = 4
+
+level_dtype = np.dtype([("min", "<u2"), ("max", "<u2")])
+
+class PyramidBuilder():
+	""" capacity: samples of the channel expected, the files of the levels start at that size and grow """
+
+	def __init__(self, name, capacity=1<<22):
+		self.name	  = name
+		self.capacity = capacity
+		self.levels	  = [None]	# per level, its file; level 0 is not stored
+		self.carry	  = [None]	# per level, (mins,maxs) of level-1 waiting for a full bin
+
+	def append(self, samples):
+		mins  = maxs = np.asarray(samples, dtype="<u2")
+		level = 1
+		while True:
+			if level == len(self.levels):
+				self.levels.append(MappedArray.GrowableArray(self.name+".L{}".format(level), level_dtype, max(1024, self.capacity//FACTOR**level)))
+				self.carry.append(None)
+			if self.carry[level] != None:
+				mins = np.concatenate((self.carry[level][0], mins))
+				maxs = np.concatenate((self.carry[level][1], maxs))
+			n = (len(mins)//FACTOR)*FACTOR
+			self.carry[level] = (mins[n:].copy(), maxs[n:].copy()) if n != len(mins) else None
+			if n == 0: break
+			bins = np.empty(n//FACTOR, dtype=level_dtype)
+			bins["min"] = mins[:n].reshape(-1,FACTOR).min(axis=1)
+			bins["max"] = maxs[:n].reshape(-1,FACTOR).max(axis=1)
+			self.levels[level].append(bins)
+			mins  = bins["min"]
+			maxs  = bins["max"]
+			level += 1
+
+	def flush(self):
+		""" Writes what is carried over as partial bins, from level 1 up, each one counted in the next level """
+		partial = None
+		for level in range(1, len(self.levels)):
+			carry = self.carry[level]
+			if partial is not None:
+				carry = (partial["min"], partial["max"]) if carry == None else (np.append(carry[0], partial["min"]), np.append(carry[1], partial["max"]))
+			self.carry[level] = None
+			if carry == None:
+				partial = None
+				continue
+			partial = np.empty(1, dtype=level_dtype)
+			partial["min"] = carry[0].min()
+			partial["max"] = carry[1].max()
+			self.levels[level].append(partial)
+
+	def close(self):
+		self.flush()
+		for level in self.levels[1:]:
+			level.close()
+
+class PyramidReader():
+	"""
+	samples: level 0, the samples of the channel, anything with len() and slices giving arrays of them
+	(Recorder.ChannelSamples)
+	"""
+	def __init__(self, name, samples):
+		self.levels = [samples]
+		while os.path.exists(name+".L{}".format(len(self.levels))):
+			path = name+".L{}".format(len(self.levels))
+			self.levels.append(np.memmap(path, dtype=level_dtype, mode="r") if os.path.getsize(path) else np.zeros(0, dtype=level_dtype))
+
+	def __len__(self):
+		""" number of samples """
+		return len(self.levels[0])
+
+	def view(self, start, stop, width):
+		"""
+		Envelope of samples [start,stop) in at most width columns. Returns (positions, mins, maxs),
+		positions being the index of the first sample of each column.
+		"""
+		start = max(0, int(start))
+		stop  = min(len(self), int(stop))
+		if stop <= start: return np.zeros(0), np.zeros(0, dtype="<u2"), np.zeros(0, dtype="<u2")
+		samples_per_column = (stop-start)/width
+		level = 0
+		while level+1 < len(self.levels) and FACTOR**(level+1) <= samples_per_column and len(self.levels[level+1]) > 0:
+			level += 1
+		bin_size = FACTOR**level
+		first 	 = start//bin_size
+		data  	 = self.levels[level][first:-(-stop//bin_size)]
+		if level == 0:
+			mins = maxs = np.asarray(data)
+		else:
+			mins = data["min"]
+			maxs = data["max"]
+		""" reduce what is left to the screen width """
+		group = -(-len(mins)//width)
+		if group > 1:
+			n	 = len(mins)//group*group
+			tail = len(mins) != n
+			rmins = mins[:n].reshape(-1,group).min(axis=1)
+			rmaxs = maxs[:n].reshape(-1,group).max(axis=1)
+			if tail:
+				rmins = np.append(rmins, mins[n:].min())
+				rmaxs = np.append(rmaxs, maxs[n:].max())
+			mins, maxs = rmins, rmaxs
+		positions = (first + np.arange(len(mins))*group)*bin_size
+		return positions, mins, maxs
@@ -0,0 +1,115 @@
+import numpy as np
+
+"""
+RASTER DISPLAY WITH PERSISTENCE
+
+	An alternative to drawing the traces with matplotlib: every frame is rasterized with NumPy into an
+	intensity buffer per channel, which fades over time like the phosphor of an analog oscilloscope.
+	Pixels hit by many frames glow at full brightness, one hit by a single frame shows dimmer and then
+	fades, so a rare glitch stays visible for the persistence time at any frame rate.
+
+	Traces are given in the coordinates of the matplotlib axes (x 0..100, y -50..+50, see Oscilloscope),
+	so whatever OscilloscopeChannel.draw_frame computes is drawn here unchanged. render() returns the
+	image as PPM data for a Tk PhotoImage.
+
+	Rasterizing: consecutive points of a trace are joined by a vertical span in the column nearest to the
+	first one. Traces with fewer points than columns are first interpolated at every column, so the spans
+	are also joined horizontally. All spans of a frame are drawn at once by counting, for every pixel,
+	the spans starting and ending above it (np.bincount plus a cumulative sum down each column).
+"""
+
+""" channel color names as in OscilloscopeChannel.color """
+COLORS = {"Yellow": (1.0, 1.0, 0.0),
+		  "Blue":	(0.1, 0.3, 1.0),
+		  "Red":	(1.0, 0.0, 0.0),
+		  "Black":	(0.0, 0.0, 0.0)}
+
+""" persistence values offered, seconds. None never fades """
+persistence_names = ["Off", "0.1 s", "0.2 s", "0.5 s", "1 s", "2 s", "5 s", "Infinite"]
+
+def persistence_seconds(name):
+	if name == "Off": 		return 0
+	if name == "Infinite":	return None
+	return float(name.split()[0])
+
+class PhosphorDisplay():
+
+	def __init__(self, width, height, layers=2, xlim=(0,100), ylim=(-50,50)):
+		self.width		 = width
+		self.height		 = height
+		self.xlim		 = xlim
+		self.ylim		 = ylim
+		self.intensity	 = np.zeros((layers, height, width), dtype=np.float32)
+		self.persistence = 0.5
+		self.header		 = bytes("P6 {} {} 255 ".format(width, height), "ascii")
+		self.background	 = self.draw_background()
+
+	def draw_background(self):
+		""" Grey area with a 10 x 10 grid and the 0 volts line in white, as the matplotlib axes """
+		rgb = np.full((self.height, self.width, 3), 0.5, dtype=np.float32)
+		for x in range(self.xlim[0], self.xlim[1]+1, 10):
+			rgb[:, self.column(x)] = 0.69
+		for y in range(self.ylim[0], self.ylim[1]+1, 10):
+			rgb[self.row(y), :] = 1.0 if y == 0 else 0.69
+		return rgb
+
+	def column(self, x):
+		return np.clip(np.rint((np.asarray(x)-self.xlim[0])*(self.width-1)/(self.xlim[1]-self.xlim[0])), 0, self.width-1).astype(int)
+
+	def row(self, y):
+		return np.clip(np.rint((self.ylim[1]-np.asarray(y))*(self.height-1)/(self.ylim[1]-self.ylim[0])), 0, self.height-1).astype(int)
+
+	def clear(self):
+		self.intensity[:] = 0
+
+	def decay(self, seconds):
+		""" Fades the traces by the time elapsed """
+		if self.persistence == None or self.persistence == 0: return
+		self.intensity *= np.float32(np.exp(-seconds/self.persistence))
+
+	def begin_frame(self):
+		""" Called before adding the traces of a new frame. Without persistence only the new frame is shown """
+		if self.persistence == 0: self.clear()
+
+	def add_trace(self, layer, x, y):
+		""" Adds a frame to the intensity of layer. x must not decrease """
+		x = np.asarray(x, dtype=float)
+		y = np.asarray(y, dtype=float)
+		if len(x) < 2: return
+		px = (x-self.xlim[0])*(self.width-1)/(self.xlim[1]-self.xlim[0])
+		py = (self.ylim[1]-y)*(self.height-1)/(self.ylim[1]-self.ylim[0])
+		if len(px) < self.width:
+			columns = np.arange(max(0, int(np.ceil(px[0]))), min(self.width-1, int(px[-1]))+1)
+			if len(columns) == 0: return # outside the canvas or between two columns
+			py = np.interp(columns, px, py)
+			px = columns
+		following = np.append(py[1:], py[-1]) # the last point is a span of its own
+		column = np.rint(px).astype(int)
+		top	   = np.floor(np.minimum(py, following))
+		bottom = np.ceil(np.maximum(py, following))
+		visible = (column >= 0) & (column < self.width) & (bottom >= 0) & (top <= self.height-1)
+		column = column[visible]
+		top	   = np.clip(top[visible], 0, self.height-1).astype(int)
+		bottom = np.clip(bottom[visible], 0, self.height-1).astype(int)
+		size   = (self.height+1)*self.width
+		starts = np.bincount(top*self.width+column, minlength=size)
+		ends   = np.bincount((bottom+1)*self.width+column, minlength=size)
+		hits   = np.cumsum((starts-ends).reshape(self.height+1, self.width)[:self.height], axis=0) > 0
+		self.intensity[layer] += hits
+
+	def render(self, colors):
+		"""
+		PPM image of the traces over the grid, colors being the (r,g,b) of each layer or None to hide it.
+		Brightness grows with the logarithm of the intensity, relative to the brightest pixel.
+		"""
+		rgb = self.background.copy()
+		for layer, color in enumerate(colors):
+			if color == None: continue
+			intensity = self.intensity[layer]
+			peak = intensity.max()
+			if peak <= 0: continue
+			glow = np.log1p(intensity*(255/peak)) / np.float32(np.log1p(255))
+			glow = glow[:,:,None]
+			rgb *= 1-glow
+			rgb += glow*np.array(color, dtype=np.float32)
+		return self.header + (rgb*255).astype(np.uint8).tobytes()
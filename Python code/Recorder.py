@@ -0,0 +1,174 @@
+import json
+import os
+import time
+import numpy as np
+
+import MappedArray
+import Pyramid
+
+"""
+RECORDING TO DISK
+
+	A recording is made of three files sharing a base name:
+		name.samples	The samples of every frame one after the other, as received from the board
+						(big-endian uint16, both channels interleaved for dual channel frames)
+		name.index		One record per frame with its metadata, see index_dtype
+		name.json		Format version and the layout of the other two files
+		name.chN.Lk		Min/max pyramid of the samples of channel N, see Pyramid.py, whose level 0 is
+						name.samples itself (ChannelSamples)
+
+	Both data files are memory mapped and grow by doubling their size when full (see MappedArray.py),
+	so appending a frame is a copy into the page cache and never needs the whole session in memory.
+	On close the files are truncated to their actual size. A recording never closed can still be read,
+	up to the last frame whose index record was written (written_frames).
+"""
+
+VERSION = 1
+
+def channel_samples(samples, channel_mask, channel):
+	""" Samples of one channel in a frame, None if the frame does not include it """
+	if channel_mask == 3:
+		return samples[1::2] if channel == 1 else samples[2::2]
+	return samples if channel_mask == channel else None
+
+index_dtype = np.dtype([("timestamp",				"<f8"),	# seconds since the epoch, frame received
+						("first_sample",			"<u8"),	# position in name.samples
+						("num_samples",				"<u4"),	# total, both channels for dual channel frames
+						("channel_mask",			"u1"),	# 1: Ch1, 2: Ch2, 3: both
+						("use_ets",					"u1"),
+						("trigger_channel",			"u1"),
+						("time_between_samples",	"<u4"),	# micros, or nanos in ETS mode
+						("period_status",			"<u2"),	# as returned by Board.osc_get_samples
+						("period_value",			"<u2"),
+						("attenuation",				"<f4", (2,))]) # input stage attenuation for Ch1, Ch2
+
+def fill_index_record(record, frame, first_sample, attenuation=None):
+	""" Fills record (an index_dtype array of length 1) with the metadata of frame """
+	p = frame.parameters
+	r = record[0]
+	r["timestamp"]				= frame.timestamp
+	r["first_sample"]			= first_sample
+	r["num_samples"]			= len(frame.samples)
+	r["channel_mask"]			= p.channel
+	r["use_ets"]				= p.use_ets
+	r["trigger_channel"]		= p.trigger_channel
+	r["time_between_samples"]	= p.time_between_samples
+	r["period_status"]			= frame.period_status
+	r["period_value"]			= frame.period_value
+	if attenuation != None:
+		period_info = (frame.period_status,frame.period_value)
+		r["attenuation"] = (attenuation(1, period_info if p.channel == 1 or p.trigger_channel == 1 else None),
+							attenuation(2, period_info if p.channel == 2 or p.trigger_channel == 2 else None))
+
+class Recorder():
+	"""
+	attenuation is a function (channel, period_info) returning the input stage attenuation of the channel
+	for a frame, as OscilloscopeChannel.current_attenuation.
+	"""
+	def __init__(self, name, attenuation=None):
+		self.name		 = name
+		self.attenuation = attenuation
+		self.samples	 = MappedArray.GrowableArray(name+".samples", ">u2", 1<<22)
+		self.index		 = MappedArray.GrowableArray(name+".index", index_dtype, 1<<12)
+		self.record		 = np.zeros(1, dtype=index_dtype)
+		self.pyramids	 = {1: Pyramid.PyramidBuilder(name+".ch1", self.samples.capacity), 2: Pyramid.PyramidBuilder(name+".ch2", self.samples.capacity)}
+		self.write_header()
+
+	def write_header(self):
+		with open(self.name+".json", "w") as f:
+			json.dump({"version":		VERSION,
+					   "samples_dtype": ">u2",
+					   "index_dtype":	[list(d) for d in index_dtype.descr],
+					   "frames":		self.index.length,
+					   "samples":		self.samples.length,
+					   "created":		time.strftime("%Y-%m-%d %H:%M:%S")}, f, indent=1)
+
+	def append(self, frame):
+		""" frame as published by Acquisition.AcquisitionWorker """
+		fill_index_record(self.record, frame, self.samples.length, self.attenuation)
+		self.samples.append(frame.samples)
+		self.index.append(self.record)
+		for channel in self.pyramids:
+			samples = channel_samples(frame.samples, frame.parameters.channel, channel)
+			if samples is not None: self.pyramids[channel].append(samples)
+
+	def close(self):
+		self.samples.close()
+		self.index.close()
+		for pyramid in self.pyramids.values():
+			pyramid.close()
+		self.write_header()
+
+class Recording():
+	""" Read access to a recording, memory mapped: nothing is loaded until used """
+
+	def __init__(self, name):
+		with open(name+".json") as f:
+			self.header = json.load(f)
+		if self.header["version"] != VERSION:
+			raise ValueError("Unsupported recording version {}".format(self.header["version"]))
+		self.name	 = name
+		self.samples = np.memmap(name+".samples", dtype=">u2", mode="r") if os.path.getsize(name+".samples") else np.zeros(0, dtype=">u2")
+		self.index	 = np.memmap(name+".index", dtype=index_dtype, mode="r") if os.path.getsize(name+".index") else np.zeros(0, dtype=index_dtype)
+		""" the files of a recording not closed keep their grown size, and its header the counts of its creation """
+		(frames, samples) = written_frames(self.index, self.header["frames"], len(self.samples))
+		self.samples = self.samples[:samples]
+		self.index	 = self.index[:frames]
+		self.pyramids = {channel: Pyramid.PyramidReader(name+".ch{}".format(channel), ChannelSamples(self.samples, self.index, channel)) for channel in [1,2]}
+
+	def __len__(self):
+		return len(self.index)
+
+	def frame(self, i):
+		""" Returns (samples, index record) of frame i """
+		r = self.index[i]
+		return self.samples[r["first_sample"]:r["first_sample"]+r["num_samples"]], r
+
+def written_frames(index, frames, samples_size):
+	"""
+	Returns (frames, samples) written to a recording, going on from the first frames (those counted by
+	its header) while the index records follow one another in the sample file. The grown part of the
+	index never written is zeros, and a frame has samples, so the first zero record ends the recording.
+	"""
+	last  = index[frames-1] if frames else None
+	end	  = int(last["first_sample"])+int(last["num_samples"]) if frames else 0
+	n	  = index["num_samples"][frames:].astype(np.int64)
+	first = end + np.concatenate(([0], np.cumsum(n[:-1]))) if len(n) else n
+	ok	  = (n > 0) & (index["first_sample"][frames:] == first) & (first+n <= samples_size)
+	count = len(ok) if ok.all() else int(np.argmin(ok))
+	if count: end = int(first[count-1]+n[count-1])
+	return frames+count, end
+
+class ChannelSamples():
+	"""
+	The samples of one channel along a recording, frame after frame, as a sequence: len() and slices
+	(step 1) read from the sample file, so the pyramid of the channel does not need a copy of them.
+	"""
+	def __init__(self, samples, index, channel):
+		self.samples = samples
+		""" where channel_samples takes them in every frame """
+		dual   = index["channel_mask"] == 3
+		n	   = index["num_samples"].astype(np.int64)
+		offset = np.where(dual, channel, 0)
+		step   = np.where(dual, 2, 1)
+		count  = np.where(dual, np.maximum(0, (n-channel+1)//2), np.where(index["channel_mask"] == channel, n, 0))
+		self.frames = np.flatnonzero(count)					# frames including the channel
+		self.start	= index["first_sample"][self.frames].astype(np.int64) + offset[self.frames]
+		self.step	= step[self.frames]
+		self.first	= np.concatenate(([0], np.cumsum(count[self.frames])))	# of every frame in the channel
+
+	def __len__(self):
+		return int(self.first[-1])
+
+	def __getitem__(self, key):
+		(start, stop, step) = key.indices(len(self))
+		out = np.empty(max(0, stop-start), dtype=np.uint16)
+		f = np.searchsorted(self.first, start, side="right")-1
+		i = start
+		while i < stop:
+			n = min(stop, self.first[f+1]) - i
+			a = self.start[f] + (i-self.first[f])*self.step[f]
+			out[i-start:i-start+n] = self.samples[a:a+n*self.step[f]:self.step[f]]
+			i += n
+			f += 1
+		return out
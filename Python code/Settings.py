@@ -1,9 +1,9 @@
 import tkinter as tk
 from tkinter import ttk
 from tkinter import messagebox
-import time
 
 import Globals
+import Calibration
 
 class Settings(tk.Frame):
 	
@@ -50,6 +50,9 @@ class Settings(tk.Frame):
 		self.progress_bar = ttk.Progressbar(tab_osc_calibrate, variable=self.progress_var, maximum=100)
 		self.progress_bar.pack(fill="both", pady=5, padx=30)
 		
+		self.calibrator = None
+		self.close_when_done = False
+		
 		frame_buttons = tk.Frame(parent)
 		self.button_cancel = tk.Button(frame_buttons, text="Close", command=self.on_cancel)
 		self.button_ok  = tk.Button(frame_buttons, text="Ok", command=self.on_ok)
@@ -74,50 +77,55 @@ class Settings(tk.Frame):
 		AD9833 measured specs:
 			Sine 630mV Vpp
 			Square 3.64V Vpp
+			
+		Both channels are calibrated at once, in the background, see Calibration.Calibrator.
 		"""
+		holder = Globals.claim_board("Calibration", "capture", "generator")
+		if holder != None:
+			messagebox.showinfo(message="The board is in use by the {}.".format(holder), title="Calibrate input stage", parent=self.parent)
+			return
+		rc = messagebox.askokcancel(message="Connect 3.3v AD9833 output to channels 1 and 2, then click Ok.\nA channel left unconnected keeps its calibration.", title="Calibrate input stage", parent=self.parent)
+		if not rc:
+			Globals.release_board("Calibration")
+			return
+		Globals.commands.flush() # nothing queued may change the generator during the calibration
 		self.button_calibrate	.config(state="disabled")
 		self.button_ok			.config(state="disabled")
 		self.button_cancel		.config(state="disabled")
-		min_micros_per_sample = Globals.board.get_value("osc get_micros_needed_for_1sample", 2)
-		print("ch freq   samples us/sample cycles att")
-		print("-- ------ ------- --------- ------ ----")
-		for channel in range(1,3):
-			rc = messagebox.askokcancel(message="Connect 3.3v AD9833 output to channel {}, then click Ok.".format(channel), title="Calibrate input stage", parent=self.parent)
-			if not rc: continue
-			tr_func = eval(Globals.config["Osc-Ch{}".format(channel)]["InputStageTrFunc"])
-			i = 1
-			freqs = Globals.input_stage_testing_frequencies
-			for freq in freqs:
-				self.progress_var.set(i*100/len(freqs)); self.update()
-				i += 1
-				Globals.board.send_command("funcgen AD9833_set {} {}".format(freq, "Sine"))
-				t0 = time.time()
-				while time.time()-t0 < 0.2: pass # stabilize signal
-				micros_between_samples = min_micros_per_sample
-				num_cycles = 5
-				num_samples = (num_cycles * 1000000 / freq) / micros_between_samples
-				while num_samples >= 5000:
-					micros_between_samples += min_micros_per_sample
-					num_samples = (num_cycles * 1000000 / freq) / micros_between_samples
-				if micros_between_samples == min_micros_per_sample:
-					while num_samples < 5000:
-						num_cycles += 5
-						num_samples = (num_cycles * 1000000 / freq) / micros_between_samples
-				num_samples = int(num_samples)
-				samples = Globals.board.osc_get_samples(channel, num_samples, micros_between_samples, channel, False)
-				vpp = (max(samples[0])-min(samples[0]))*3.3/4095
-				attenuation = 0.630/vpp
-				tr_func[freq] = attenuation
-				print("{0: <2} {1: <6} {2: <7} {3: <9} {4: <6} {5:.2f}".format(channel,freq, num_samples,micros_between_samples,num_cycles,attenuation))
-			Globals.config["Osc-Ch{}".format(channel)]["InputStageTrFunc"] = str(tr_func)
-		Globals.save_config()
+		self.calibrator = Calibration.Calibrator(Globals.board, Globals.input_stage_testing_frequencies)
+		self.calibrator.start()
+		self.on_osc_calibrate_progress()
+		
+	def on_osc_calibrate_progress(self):
+		self.progress_var.set(self.calibrator.progress*100)
+		if not self.calibrator.done:
+			self.after(100, self.on_osc_calibrate_progress)
+			return
+		
+		print("\n".join(self.calibrator.log))
+		Globals.release_board("Calibration")
+		if self.close_when_done:
+			self.on_close_window()
+			return
+		calibrated = []
+		for channel in [1,2]:
+			tr_func = self.calibrator.results[channel]
+			if not tr_func: continue
+			calibrated.append(str(channel))
+			Globals.calibration.set(Globals.board.identity, channel, list(tr_func.keys()), list(tr_func.values()))
+		""" the Oscilloscope cannot be open while calibrating (claim_board), it loads them when opened """
+		if calibrated: Globals.calibration.save()
 
-		Globals.board.send_command("funcgen stop AD9833")
 		self.progress_var.set(0)		
 		self.button_calibrate	.config(state="normal")
 		self.button_ok			.config(state="normal")
 		self.button_cancel		.config(state="normal")
-		messagebox.showinfo(message="Calibration done.\nRestart oscilloscope.", title="Calibrate input stage", parent=self.parent)
+		if self.calibrator.error != None:
+			messagebox.showinfo(message="Calibration failed.\n{}".format(self.calibrator.error), title="Calibrate input stage", parent=self.parent)
+		elif not calibrated:
+			messagebox.showinfo(message="No signal found on either channel.", title="Calibrate input stage", parent=self.parent)
+		else:
+			messagebox.showinfo(message="Calibration done for channel {}.".format(" and ".join(calibrated)), title="Calibrate input stage", parent=self.parent)
 			
 	def on_ok(self):
 		if self.osc_display_dpi.get() != Globals.config["Settings-Osc-Display"]["DPI"] or self.osc_canvas_width.get()  != Globals.config["Settings-Osc-Display"]["CanvasWidth"] or self.osc_canvas_height.get() != Globals.config["Settings-Osc-Display"]["CanvasHeight"]:
@@ -134,6 +142,10 @@ class Settings(tk.Frame):
 		self.on_close_window()
 
 	def on_close_window(self):
+		if self.calibrator != None and not self.calibrator.done:
+			self.calibrator.cancel() # the window closes when it ends, see on_osc_calibrate_progress
+			self.close_when_done = True
+			return
 		g = self.parent.geometry().split("+")
 		Globals.config["Settings-Window"]["xpos"] = str(g[1])
 		Globals.config["Settings-Window"]["ypos"] = str(g[2])
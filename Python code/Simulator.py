@@ -0,0 +1,314 @@
+import collections
+import os
+import random
+import sys
+import threading
+import time
+import urllib.parse
+import numpy as np
+
+"""
+SIMULATED BOARD
+
+	A software stand-in for the RP2040 board speaking the same serial protocol (see main.cpp in the
+	Arduino code), to run the application, benchmarks and regression checks without hardware:
+		osc get_samples / get_samples_ets	big-endian 12-bit samples plus period status and value
+		osc get_micros_needed_for_*, get_max_samples, get_nanos_per_sample_in_ets_mode
+		funcgen pwm_set / AD9833_set / stop, led ...
+
+	Signals are synthetic: each channel has a Waveform (sine, square, triangle or noise only, with
+	added gaussian noise). With loopback, the AD9833 output drives both channels through a model of
+	the input stage attenuation, and channel 2 through a first order low-pass filter (a device under
+	test), so calibration and frequency response sweeps can run against the simulator.
+
+	In dual channel frames samples are interleaved as the host expects them: channel 1 at odd positions
+	and channel 2 at even positions (see Oscilloscope.animation_get_data), each sample half the time
+	between samples after the one before it, as the round robin of the ADC takes them.
+
+	Timing follows the real board: a request is answered after waiting for the trigger and capturing
+	the samples, and the payload flows at the USB CDC transfer rate. Requests are processed in order.
+	Faults can be injected: short payloads and requests never answered.
+
+	Two ways to use it:
+		As a drop-in serial object: Board.Board("sim://") or with options, e.g.
+			sim://?ch1=sine,1000,2.0&ch2=square,500,1.0&noise=0.01&loopback=1&realtime=0
+		Over a pseudo terminal, whose name is then set as port in Settings:
+			python3 Simulator.py [options as above]
+"""
+
+ADC_VOLTS = 3.3
+ADC_MAX	  = 4095
+
+class Waveform():
+
+	def __init__(self, shape="sine", frequency=1000, vpp=2.0, offset=1.65, noise=0.005):
+		""" vpp, offset and noise (standard deviation) are volts at the ADC input """
+		self.shape	   = shape
+		self.frequency = frequency
+		self.vpp	   = vpp
+		self.offset	   = offset
+		self.noise	   = noise
+
+	@classmethod
+	def parse(cls, spec):
+		""" "shape,frequency,vpp[,offset[,noise]]" """
+		fields = spec.split(",")
+		values = [float(f) for f in fields[1:]]
+		return cls(fields[0], *values)
+
+	def volts(self, t, rng):
+		phase = (t*self.frequency) % 1.0
+		if self.shape == "sine":
+			v = np.sin(2*np.pi*phase)
+		elif self.shape == "square":
+			v = np.where(phase < 0.5, 1.0, -1.0)
+		elif self.shape == "triangle":
+			v = np.where(phase < 0.5, 4*phase-1, 3-4*phase)
+		else:
+			v = np.zeros(len(t))
+		v = self.offset + v*self.vpp/2
+		if self.noise: v = v + rng.normal(0, self.noise, len(t))
+		return v
+
+	def periodic(self):
+		return self.shape in ["sine", "square", "triangle"] and self.frequency > 0
+
+class SimulatedBoard():
+	""" The protocol engine: executes one command line, returning (response bytes, seconds busy before answering) """
+
+	micros_needed_for_1sample 	 = 2
+	micros_needed_for_2sample 	 = 4
+	nanos_per_sample_in_ets_mode = 100
+	max_samples					 = 10000
+
+	def __init__(self, ch1=None, ch2=None, loopback=False, seed=None):
+		self.waveforms	= {1: ch1 or Waveform(), 2: ch2 or Waveform("square", 500, 1.0)}
+		self.loopback	= loopback
+		self.rng		= np.random.default_rng(seed)
+		self.faults		= random.Random(seed)
+		self.short_read_probability = 0.0
+		self.timeout_probability	= 0.0
+		self.generator	= None # (frequency, shape) of the AD9833 when running
+		self.pwm		= None # (frequency, dutycycle) when running
+		self.leds		= {}
+		self.dut_cutoff	= 1000 # Hz, low-pass seen by channel 2 in loopback
+		self.time		= 0.0  # simulated time, keeps the phase continuous between captures
+
+	def input_stage_attenuation(self, frequency):
+		""" Model of the compensated attenuator, slightly frequency dependent as the real one """
+		return 2.0 * (1 + 0.05*frequency/(frequency+20000))
+
+	def waveform(self, channel):
+		if self.loopback and self.generator != None:
+			frequency, shape = self.generator
+			vpp = 0.630 if shape != "Square" else 3.64 # measured AD9833 output, see Settings.on_osc_calibrate
+			vpp = vpp/self.input_stage_attenuation(frequency)
+			if channel == 2:
+				vpp = vpp/np.sqrt(1+(frequency/self.dut_cutoff)**2)
+			return Waveform(shape.lower(), frequency, vpp, ADC_VOLTS/2, self.waveforms[channel].noise)
+		return self.waveforms[channel]
+
+	def phase_shift(self, channel, frequency):
+		""" Delay in seconds of the channel 2 low-pass in loopback """
+		if self.loopback and channel == 2 and frequency > 0:
+			return np.arctan(frequency/self.dut_cutoff)/(2*np.pi*frequency)
+		return 0.0
+
+	def execute(self, line):
+		fields = line.split()
+		if len(fields) < 2: return b"", 0
+		tool, cmd, args = fields[0], fields[1], fields[2:]
+		if tool == "osc":
+			if cmd == "get_samples":
+				return self.capture(int(args[0]), int(args[1]), int(args[2])*1e-6, int(args[3]), False)
+			if cmd == "get_samples_ets":
+				return self.capture(int(args[0]), int(args[1]), int(args[2])*1e-9, int(args[3]), True)
+			values = {"get_micros_needed_for_1sample": 	  self.micros_needed_for_1sample,
+					  "get_micros_needed_for_2sample": 	  self.micros_needed_for_2sample,
+					  "get_nanos_per_sample_in_ets_mode": self.nanos_per_sample_in_ets_mode,
+					  "get_max_samples": 				  self.max_samples}
+			if cmd in values:
+				return int(values[cmd]).to_bytes(2, "little"), 0
+		elif tool == "funcgen":
+			if cmd == "pwm_set":
+				self.pwm = (int(args[0]), int(float(args[1])))
+			elif cmd == "AD9833_set":
+				self.generator = (int(args[0]), args[1]) if int(args[0]) != 0 else None
+			elif cmd == "stop":
+				if args[0] == "pwm": 	self.pwm = None
+				if args[0] == "AD9833": self.generator = None
+		elif tool == "led":
+			self.leds[cmd] = args[0] if args else None
+		return b"", 0
+
+	def capture(self, channel, num_samples, seconds_between_samples, trigger_channel, use_ets):
+		trigger = self.waveform(trigger_channel if channel == 3 else channel)
+		period	= 1/trigger.frequency if trigger.periodic() else 0
+		""" wait for the trigger: the capture starts at a rising crossing of the trigger channel """
+		if period:
+			wait  = period - (self.time % period)
+			start = self.time + wait + self.rng.normal(0, seconds_between_samples/4) # trigger jitter
+		else:
+			wait  = 0.1 # firmware trigger timeout
+			start = self.time + wait
+		n = num_samples*(2 if channel == 3 else 1)
+		t = start + np.arange(num_samples)*seconds_between_samples
+		if channel == 3:
+			volts = np.empty(n)
+			""" round robin of the ADC: a conversion every half the time between samples, ch2 first """
+			volts[1::2] = self.waveform(1).volts(t + seconds_between_samples/2 - self.phase_shift(1, trigger.frequency), self.rng)
+			volts[0::2] = self.waveform(2).volts(t - self.phase_shift(2, trigger.frequency), self.rng)
+		else:
+			volts = self.waveform(channel).volts(t - self.phase_shift(channel, trigger.frequency), self.rng)
+		samples = np.clip(np.round(volts*ADC_MAX/ADC_VOLTS), 0, ADC_MAX).astype(">u2")
+
+		if use_ets:
+			capture_time  = num_samples*max(period, 1e-5)
+			status 		  = 100 if period else 101
+			period_value  = min(int(period*1e9), 65535)
+			if not period: samples[:] = 0
+		else:
+			capture_time  = num_samples*seconds_between_samples
+			if not period:
+				status, period_value = 4, 0
+			elif period < 10e-6:
+				status, period_value = 3, 0
+			else:
+				status, period_value = 0, min(int(period*1e6), 65535)
+		self.time = start + capture_time
+
+		payload = samples.tobytes() + int(status).to_bytes(2, "big") + int(period_value).to_bytes(2, "big")
+		if self.faults.random() < self.timeout_probability:
+			payload = b""
+		elif self.faults.random() < self.short_read_probability:
+			payload = payload[:self.faults.randrange(len(payload))]
+		return payload, wait + capture_time
+
+class SimulatedSerial():
+	"""
+	Drop-in for serial.Serial as used by Board: write(), read(), readinto(), in_waiting, close().
+	With realtime False responses are available at once, for throughput measurements. With replay True
+	the first answer to each capture request is recorded and replayed for the same request afterwards,
+	so that generating the signal does not count in the measurements.
+	"""
+
+	def __init__(self, board=None, timeout=0, realtime=True, bytes_per_second=1.0e6, replay=False):
+		self.board		= board or SimulatedBoard()
+		self.timeout	= timeout
+		self.realtime	= realtime
+		self.rate		= bytes_per_second
+		self.lock		= threading.Lock()
+		self.line		= bytearray()
+		self.responses	= collections.deque() # [time first byte is ready, payload, bytes already read]
+		self.busy_until	= 0.0
+		self.is_open	= True
+		self.replay		= replay
+		self.recorded	= {}
+
+	@classmethod
+	def from_url(cls, url):
+		""" sim://?ch1=sine,1000,2.0&ch2=...&noise=0.01&loopback=1&realtime=0&replay=1&rate=1e6&seed=1 """
+		options = dict((k, v[-1]) for k, v in urllib.parse.parse_qs(urllib.parse.urlparse(url).query).items())
+		board = SimulatedBoard(Waveform.parse(options["ch1"]) if "ch1" in options else None,
+							   Waveform.parse(options["ch2"]) if "ch2" in options else None,
+							   options.get("loopback", "0") == "1",
+							   int(options["seed"]) if "seed" in options else None)
+		if "noise" in options:
+			for w in board.waveforms.values(): w.noise = float(options["noise"])
+		board.short_read_probability = float(options.get("short_read", 0))
+		board.timeout_probability	 = float(options.get("timeout", 0))
+		return cls(board, 0, options.get("realtime", "1") == "1", float(options.get("rate", 1.0e6)), options.get("replay", "0") == "1")
+
+	def write(self, data):
+		with self.lock:
+			for c in bytes(data):
+				if c != ord("\n"):
+					self.line.append(c)
+					continue
+				line = self.line.decode("utf-8", "replace")
+				self.line = bytearray()
+				if self.replay and line.startswith("osc get_samples"):
+					if line not in self.recorded: self.recorded[line] = self.board.execute(line)
+					payload, busy = self.recorded[line]
+				else:
+					payload, busy = self.board.execute(line)
+				if not payload: continue
+				now   = time.time()
+				ready = max(now, self.busy_until) + (busy if self.realtime else 0)
+				self.busy_until = ready + (len(payload)/self.rate if self.realtime else 0)
+				self.responses.append([ready, payload, 0])
+		return len(data)
+
+	def _arrived(self, response, now):
+		if not self.realtime: return len(response[1])
+		return max(0, min(len(response[1]), int((now-response[0])*self.rate)))
+
+	@property
+	def in_waiting(self):
+		with self.lock:
+			now = time.time()
+			return sum(self._arrived(r, now) - r[2] for r in self.responses)
+
+	def _read_available(self, view):
+		""" Copies into view the bytes arrived so far, returns how many """
+		count = 0
+		with self.lock:
+			now = time.time()
+			while self.responses and count < len(view):
+				r = self.responses[0]
+				n = min(self._arrived(r, now) - r[2], len(view)-count)
+				view[count:count+n] = r[1][r[2]:r[2]+n]
+				r[2]  += n
+				count += n
+				if r[2] < len(r[1]): break
+				self.responses.popleft()
+		return count
+
+	def readinto(self, buffer):
+		view  = memoryview(buffer).cast("B")
+		count = self._read_available(view)
+		if self.timeout == 0 or count == len(view): return count
+		t_end = None if self.timeout == None else time.time()+self.timeout
+		while count < len(view) and (t_end == None or time.time() < t_end):
+			""" sleep until the oldest response has arrived, as a blocking port waits in the OS """
+			ready = self.next_response_time()
+			now   = time.time()
+			wait  = 0.0005 if ready == None else ready-now
+			if t_end != None: wait = min(wait, t_end-now)
+			time.sleep(max(wait, 0.0001))
+			count += self._read_available(view[count:])
+		return count
+
+	def next_response_time(self):
+		""" time.time() at which the oldest pending response will have fully arrived, None if there is none """
+		with self.lock:
+			if not self.responses: return None
+			r = self.responses[0]
+			return r[0] + (len(r[1])/self.rate if self.realtime else 0)
+
+	def read(self, size=1):
+		buffer = bytearray(size)
+		return bytes(buffer[:self.readinto(buffer)])
+
+	def close(self):
+		self.is_open = False
+
+def serve_pty(serial):
+	""" Serves the simulator on a pseudo terminal until interrupted """
+	import tty, select # POSIX only
+	master, slave = os.openpty()
+	tty.setraw(slave)
+	print("Simulated PicoScope at", os.ttyname(slave))
+	sys.stdout.flush()
+	buffer = bytearray(65536)
+	while True:
+		try:
+			readable, _, _ = select.select([master], [], [], 0.001)
+			if readable: serial.write(os.read(master, 4096))
+			n = serial.readinto(buffer)
+			if n: os.write(master, buffer[:n])
+		except KeyboardInterrupt:
+			break
+
+if __name__ == "__main__":
+	serve_pty(SimulatedSerial.from_url("sim://?" + "&".join(sys.argv[1:])))
@@ -0,0 +1,155 @@
+import numpy as np
+
+"""
+SPECTRUM ENGINE
+
+	The spectrum of a frame is computed with a real FFT (rfft) over the windowed samples, optionally
+	zero padded to the next length made of factors 2, 3 and 5 (the ones FFT implementations are fast for).
+	Successive spectra can be averaged (exponentially or over the last N frames) and the maximum of
+	every bin can be held (peak hold).
+
+	Amplitudes are single sided and corrected for the coherent gain of the window, so a sine of amplitude
+	A volts shows as a peak of A volts (or 20*log10(A) dBV) whatever the window used.
+
+	All the buffers needed for a given frame length are allocated once and reused while the length and
+	settings stay the same.
+"""
+
+window_names 	= ["Rectangular", "Hann", "Blackman", "Flat top"]
+averaging_names = ["None", "Exp 4", "Exp 16", "4 frames", "16 frames"]
+
+_windows = {}
+
+def window(name, length):
+	""" Cached window function of the given length, normalized so that its coherent gain is 1 """
+	key = (name, length)
+	if key not in _windows:
+		n = np.arange(length)
+		x = 2*np.pi*n/length # periodic windows, better suited to spectral analysis than symmetric ones
+		if name == "Hann":
+			w = 0.5 - 0.5*np.cos(x)
+		elif name == "Blackman":
+			w = 0.42 - 0.5*np.cos(x) + 0.08*np.cos(2*x)
+		elif name == "Flat top":
+			w = 0.21557895 - 0.41663158*np.cos(x) + 0.277263158*np.cos(2*x) - 0.083578947*np.cos(3*x) + 0.006947368*np.cos(4*x)
+		else:
+			w = np.ones(length)
+		_windows[key] = w / w.mean()
+	return _windows[key]
+
+def fast_length(n):
+	""" Smallest integer >= n with no prime factors other than 2, 3 and 5 """
+	best = 1
+	while best < n: best *= 2
+	p5 = 1
+	while p5 < best:
+		p35 = p5
+		while p35 < best:
+			p = p35
+			while p < n: p *= 2
+			if p < best: best = p
+			p35 *= 3
+		p5 *= 5
+	return best
+
+class SpectrumAnalyzer():
+
+	def __init__(self, window_name="Hann", averaging="None", peak_hold=False, zero_pad=True):
+		self.window_name = window_name
+		self.averaging 	 = averaging
+		self.peak_hold 	 = peak_hold
+		self.zero_pad	 = zero_pad
+		self.length		 = None
+
+	def configure(self, window_name, averaging, peak_hold, zero_pad=True):
+		if (window_name, averaging, peak_hold, zero_pad) != (self.window_name, self.averaging, self.peak_hold, self.zero_pad):
+			self.window_name = window_name
+			self.averaging 	 = averaging
+			self.peak_hold 	 = peak_hold
+			self.zero_pad	 = zero_pad
+			self.length		 = None # reallocate and restart averaging on next frame
+
+	def reset(self):
+		""" Restart averaging and peak hold, e.g. when the timebase changes """
+		self.length = None
+
+	def prepare(self, length):
+		""" Allocates the buffers for frames of the given length, unless already done """
+		if length != self.length: self.allocate(length)
+
+	def allocate(self, length):
+		self.length	   = length
+		self.fft_size  = fast_length(length) if self.zero_pad else length
+		self.num_bins  = self.fft_size//2 + 1
+		self.window	   = window(self.window_name, length)
+		self.input	   = np.zeros(self.fft_size)
+		self.spectrum  = np.zeros(self.num_bins, dtype=complex)
+		self.amplitude = np.zeros(self.num_bins)
+		self.output	   = np.zeros(self.num_bins)
+		self.peak	   = np.zeros(self.num_bins)
+		self.dbv	   = np.zeros(self.num_bins)
+		self.frames	   = 0
+		if self.averaging[:3] == "Exp":
+			self.alpha = 1/int(self.averaging[4:])
+		elif self.averaging[-6:] == "frames":
+			n = int(self.averaging[:-7])
+			self.history 	 = np.zeros((n, self.num_bins))
+			self.history_sum = np.zeros(self.num_bins)
+		""" scale from |rfft| to single sided amplitude: DC and Nyquist bins are not doubled """
+		self.scale 	  = np.full(self.num_bins, 2/length)
+		self.scale[0] = 1/length
+		if self.fft_size%2 == 0: self.scale[-1] = 1/length
+		""" bin positions in units of the unpadded bin width """
+		self.bins = np.arange(self.num_bins) * (length/self.fft_size)
+
+	def bin_frequencies(self, seconds_per_sample):
+		""" Frequency in Hz of every bin of the last computed spectrum """
+		return np.arange(self.num_bins) / (self.fft_size*seconds_per_sample)
+
+	def compute(self, volts, correction=None):
+		"""
+		Returns (bins, amplitude): bin positions in units of the frequency resolution of the unpadded frame,
+		and the averaged (or peak held) amplitude of each bin in volts. Both arrays are owned by the engine
+		and overwritten on the next call. correction, if given, multiplies each bin before averaging.
+		"""
+		self.prepare(len(volts))
+
+		np.multiply(volts, self.window, out=self.input[:self.length])
+		if _rfft_has_out:
+			np.fft.rfft(self.input, out=self.spectrum)
+		else:
+			self.spectrum[:] = np.fft.rfft(self.input)
+		np.abs(self.spectrum, out=self.amplitude)
+		self.amplitude *= self.scale
+		if correction is not None: self.amplitude *= correction
+
+		self.frames += 1
+		if self.averaging[:3] == "Exp":
+			if self.frames == 1:
+				self.output[:] = self.amplitude
+			else:
+				self.output -= self.amplitude 	# output = alpha*amplitude + (1-alpha)*output
+				self.output *= 1-self.alpha		# without temporary arrays
+				self.output += self.amplitude
+		elif self.averaging[-6:] == "frames":
+			slot = (self.frames-1) % len(self.history)
+			self.history_sum -= self.history[slot]
+			self.history_sum += self.amplitude
+			self.history[slot] = self.amplitude
+			np.divide(self.history_sum, min(self.frames, len(self.history)), out=self.output)
+		else:
+			self.output[:] = self.amplitude
+
+		if self.peak_hold:
+			np.maximum(self.peak, self.output, out=self.peak)
+			return self.bins, self.peak
+		return self.bins, self.output
+
+	def to_dbv(self, amplitude):
+		""" Amplitude in dBV, 0 dBV being a 1 V amplitude """
+		np.maximum(amplitude, 1e-6, out=self.dbv)
+		np.log10(self.dbv, out=self.dbv)
+		self.dbv *= 20
+		return self.dbv
+
+_rfft_has_out = np.lib.NumpyVersion(np.__version__) >= "2.0.0"
@@ -0,0 +1,103 @@
+import numpy as np
+
+"""
+SOFTWARE TRIGGER
+
+	The board starts a capture on its own trigger (a rising edge on the trigger channel GPIO), which
+	puts the trigger point at the left of the screen. With the software trigger the oscilloscope asks
+	for OVERSIZE times the samples the screen shows, searches the whole capture for the trigger
+	condition and shows the window around it, pretrigger being the fraction of the window before the
+	trigger point. The trigger point is found to a fraction of a sample by linear interpolation and
+	the window is resampled at that offset, so a repetitive signal stands still on the screen.
+
+	Conditions, on the samples of the trigger channel (raw 12-bit values):
+		Edge		The signal crosses level in the direction of slope
+		Pulse >		A pulse (above level for Rising, below for Falling) longer than width ends
+		Pulse <		A pulse shorter than width ends
+		Runt		A pulse crosses level but turns back before reaching level2 (above level for Rising,
+					below it for Falling)
+	To cross a level the signal must have been hysteresis away from it on the other side first, so
+	noise around the level does not make many crossings.
+
+	All searches are vectorized: no Python loop over samples.
+"""
+
+OVERSIZE = 2
+
+mode_names	= ["Off", "Edge", "Pulse >", "Pulse <", "Runt"]
+slope_names = ["Rising", "Falling"]
+
+def rising_crossings(y, level, hysteresis):
+	""" Fractional indices where y rises through level, having been below level-hysteresis since the last crossing """
+	low	  = y < level-hysteresis
+	high  = y >= level
+	index = np.where(low | high, np.arange(len(y)), -1)
+	last  = np.maximum.accumulate(index)	# last sample below or above the band, up to each sample
+	armed = np.zeros(len(y), dtype=bool)
+	armed[1:] = (last[:-1] >= 0) & low[np.maximum(last[:-1], 0)]
+	i  = np.flatnonzero(high & armed)		# y[i-1] < level <= y[i]
+	y0 = y[i-1]
+	return i-1 + (level-y0)/(y[i]-y0)
+
+class SoftwareTrigger():
+
+	def __init__(self):
+		self.mode		= "Off"
+		self.slope		= "Rising"
+		self.level		= 2048.0	# raw sample values
+		self.level2		= 3072.0
+		self.hysteresis = 20.0
+		self.width		= 10.0		# samples, for the pulse modes
+		self.pretrigger = 0.5
+
+	def active(self):
+		return self.mode != "Off"
+
+	def find(self, samples, window):
+		"""
+		Fractional index of the first trigger point in samples leaving room for a window of that many
+		samples around it, or None.
+		"""
+		y = (samples & 0x0FFF).astype(float)
+		level, level2 = self.level, self.level2
+		if self.slope == "Falling": # same search on the inverted signal
+			y, level, level2 = -y, -level, -level2
+		up	 = rising_crossings(y, level, self.hysteresis)
+		down = rising_crossings(-y, -level, self.hysteresis)
+
+		if self.mode == "Edge":
+			points = up
+		else:
+			""" pulses: from every rising crossing to the first falling one after it """
+			j = np.searchsorted(down, up)
+			pulse = j < len(down)
+			(start, end) = (up[pulse], down[j[pulse]])
+			if self.mode == "Pulse >":
+				points = end[end-start > self.width]
+			elif self.mode == "Pulse <":
+				points = end[end-start < self.width]
+			else:
+				""" runt: the highest sample of the pulse stays below level2. Pulses do not overlap but several
+				rising crossings may end at the same falling one: the last of them starts the pulse """
+				if len(start) == 0: return None
+				last = np.append(j[pulse][1:] != j[pulse][:-1], True)
+				(start, end) = (start[last], end[last])
+				bounds = np.empty(2*len(start), dtype=int)
+				bounds[0::2] = np.ceil(start)
+				bounds[1::2] = np.floor(end)+1
+				bounds = np.minimum(bounds, len(y)-1)
+				highest = np.maximum.reduceat(y, bounds)[0::2]
+				points = end[highest < level2]
+
+		first = self.pretrigger*window
+		last  = len(samples)-1 - (1-self.pretrigger)*window
+		points = points[(points >= first) & (points <= last)]
+		return points[0] if len(points) else None
+
+	def align(self, samples, position, window):
+		""" The window of samples placing position at the pretrigger fraction, resampled at the fractional offset """
+		start = position - self.pretrigger*window
+		if start == int(start):
+			return samples[int(start):int(start)+window]
+		aligned = np.interp(start+np.arange(window), np.arange(len(samples)), samples & 0x0FFF)
+		return np.rint(aligned).astype(np.uint16)
@@ -0,0 +1,63 @@
+import time
+
+import Board
+import Acquisition
+
+""" The acquisition worker (Acquisition.py) capturing from the simulated board in real time """
+
+PARAMETERS = Acquisition.CaptureParameters(1, 1000, 10, 1, False) # 10 ms captures
+
+def wait_frame(worker, parameters, timeout=5.0):
+	t0 = time.time()
+	while time.time()-t0 < timeout:
+		frame = worker.get_latest_frame(parameters)
+		if frame != None: return frame
+		time.sleep(0.001)
+	return None
+
+def test_frame_ring_keeps_the_newest():
+	ring = Acquisition.FrameRing(16)
+	assert ring.get_latest() == None
+	a = ring.acquire_write_slot()
+	ring.publish(a)
+	b = ring.acquire_write_slot()
+	assert b is not a
+	ring.publish(b)
+	assert ring.get_latest() is b
+	""" the frame being read is not written over """
+	assert ring.acquire_write_slot() is not b
+
+def test_worker_frames_and_capture_time():
+	worker = Acquisition.AcquisitionWorker(Board.Board("sim://?seed=1"), 10000)
+	worker.start()
+	worker.set_parameters(PARAMETERS)
+	frame = wait_frame(worker, PARAMETERS)
+	assert frame != None and len(frame.samples) == 1000 and frame.parameters == PARAMETERS
+	frame = wait_frame(worker, PARAMETERS)
+	assert 0.005 < frame.capture_time < 0.1
+	worker.stop()
+
+def test_capture_time_after_a_pause():
+	""" the first frame after a pause is not timed from the last frame before it """
+	worker = Acquisition.AcquisitionWorker(Board.Board("sim://?seed=1"), 10000)
+	worker.start()
+	worker.set_parameters(PARAMETERS)
+	wait_frame(worker, PARAMETERS)
+	worker.set_parameters(None)
+	time.sleep(0.5)
+	worker.get_latest_frame()
+	worker.set_parameters(PARAMETERS)
+	frame = wait_frame(worker, PARAMETERS)
+	worker.stop()
+	assert frame.capture_time < 0.1
+
+def test_frames_of_old_settings_are_not_published():
+	worker = Acquisition.AcquisitionWorker(Board.Board("sim://?seed=1"), 10000)
+	worker.start()
+	worker.set_parameters(PARAMETERS)
+	wait_frame(worker, PARAMETERS)
+	other = PARAMETERS._replace(num_samples=500)
+	worker.set_parameters(other)
+	frame = wait_frame(worker, other)
+	worker.stop()
+	assert frame.parameters == other and len(frame.samples) == 500
@@ -0,0 +1,85 @@
+import asyncio
+import threading
+
+import AsyncBoard
+
+"""
+The asyncio board link (AsyncBoard.py) against the simulated board: answers matched to their commands
+in the order written, timeouts, and the blocking interface of ThreadedBoard shared between threads.
+"""
+
+SIM = "sim://?seed=1&realtime=0"
+
+def test_pipelined_captures_in_order():
+	async def main():
+		board = await AsyncBoard.AsyncBoard.open(SIM)
+		lengths = [100, 300, 200]
+		frames = await asyncio.gather(*[board.osc_get_samples(1, n, 10, 1, False) for n in lengths],
+									  board.get_value("osc get_max_samples", 2))
+		board.close()
+		return frames
+	frames = asyncio.run(main())
+	assert [len(samples) for (samples, status, value) in frames[:3]] == [100, 300, 200]
+	assert frames[3] == 10000
+
+def test_the_link_goes_on_after_a_timeout():
+	""" the simulated board drops every capture request: the value asked after the timeout gets its answer """
+	async def main():
+		board = await AsyncBoard.AsyncBoard.open("sim://?seed=1&realtime=0&timeout=1")
+		try:
+			await board.osc_get_samples(1, 100, 10, 1, False, timeout=0.05)
+			assert False, "the capture times out"
+		except asyncio.TimeoutError:
+			pass
+		value = await board.get_value("osc get_micros_needed_for_2sample", 2)
+		board.close()
+		return value
+	assert asyncio.run(main()) == 4
+
+def test_closed_link_fails_what_is_waiting():
+	async def main():
+		board  = await AsyncBoard.AsyncBoard.open("sim://?seed=1&realtime=0&timeout=1")
+		future = board.osc_get_payload(1, 100, 10, 1, False)
+		board.close()
+		try:
+			await future
+			return False
+		except ConnectionError:
+			return True
+	assert asyncio.run(main())
+
+def test_threaded_board():
+	board = AsyncBoard.ThreadedBoard(SIM)
+	assert board.ok
+	(samples, status, value) = board.osc_get_samples(3, 250, 20, 1, False)
+	assert len(samples) == 500
+	assert board.get_value("osc get_max_samples", 2) == 10000
+	board.close()
+
+def test_threaded_board_owners():
+	""" as Board: each caller receives the payloads of its own requests, in the order it sent them """
+	board = AsyncBoard.ThreadedBoard(SIM)
+	board.osc_request_samples(1, 100, 10, 1, False, owner="a")
+	board.osc_request_samples(1, 200, 10, 1, False, owner="b")
+	board.osc_request_samples(1, 300, 10, 1, False, owner="a")
+	assert board.osc_requests_in_flight("a") == 2 and board.osc_requests_in_flight("b") == 1
+	assert board.osc_receive_samples(owner="b")[3][1] == 200
+	assert [board.osc_receive_samples(owner="a")[3][1] for i in range(2)] == [100, 300]
+	assert board.osc_receive_samples(owner="a") == None
+	board.close()
+
+def test_threaded_board_from_several_threads():
+	board = AsyncBoard.ThreadedBoard(SIM)
+	received = {}
+	def capture(n):
+		for i in range(5): board.osc_request_samples(1, n, 10, 1, False)
+		received[n] = [len(board.osc_receive_samples()[0]) for i in range(5)]
+	threads = [threading.Thread(target=capture, args=(n,)) for n in [100, 200, 300]]
+	for thread in threads: thread.start()
+	for thread in threads: thread.join()
+	assert received == {100: [100]*5, 200: [200]*5, 300: [300]*5}
+	board.close()
+
+def test_threaded_board_not_found():
+	board = AsyncBoard.ThreadedBoard("/dev/no-such-board")
+	assert not board.ok
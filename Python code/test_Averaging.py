@@ -0,0 +1,57 @@
+import numpy as np
+
+import Averaging
+
+""" Frame averaging and high resolution, see Averaging.py """
+
+def averager(mode, n=4):
+	a = Averaging.FrameAverager()
+	a.mode = mode
+	a.n	   = n
+	return a
+
+def frame(value, length=8):
+	return np.full(length, value, dtype=">u2")
+
+def test_normal_returns_the_samples():
+	samples = frame(100)
+	assert averager("Normal").process(samples, "key") is samples
+
+def test_average_of_the_last_n_frames():
+	a = averager("Average", 4)
+	results = [a.process(frame(v), "key")[0] for v in [0, 4, 8, 12, 16]]
+	assert results == [0, 2, 4, 6, 10]
+	assert a.frames() == 4
+
+def test_average_is_exact_after_many_frames():
+	a = averager("Average", 16)
+	rng = np.random.default_rng(1)
+	frames = rng.integers(0, 4096, (1000, 64)).astype(">u2")
+	for f in frames: result = a.process(f, "key")
+	assert np.allclose(result, frames[-16:].mean(axis=0), atol=1e-3)
+
+def test_average_masks_the_high_bits():
+	a = averager("Average", 2)
+	a.process(frame(0xF000 | 100), "key")
+	assert a.process(frame(0xF000 | 300), "key")[0] == 200
+
+def test_a_new_key_starts_over():
+	a = averager("Average", 4)
+	a.process(frame(1000), "a")
+	assert a.process(frame(0), "b")[0] == 0
+	assert a.frames() == 1
+	assert len(a.process(frame(0, 16), "b")) == 16 # and so does a new length
+
+def test_exponential():
+	a = averager("Exponential", 4)
+	assert a.process(frame(400), "key")[0] == 400
+	assert a.process(frame(0), "key")[0] == 300
+	for i in range(100): result = a.process(frame(0), "key")
+	assert result[0] < 1
+
+def test_high_res_decimates():
+	a = averager("High-res")
+	samples = np.array([1, 2, 3, 4, 10, 20, 30, 40, 7], dtype=">u2") | 0xF000
+	result = a.decimate(samples, 4, "key")
+	assert result.dtype == np.float32
+	assert list(result) == [2.5, 25.0]
@@ -0,0 +1,169 @@
+import threading
+import time
+import numpy as np
+
+import Board
+
+"""
+The board link (Board.py): decoding payloads, and pipelined captures against the simulated board
+(Simulator.py). The number of samples of a request tells its payload apart, so the tests check that
+every payload reaches the owner of its request.
+"""
+
+def payload(samples, status, value):
+	return np.array(samples, dtype=">u2").tobytes() + status.to_bytes(2, "big") + value.to_bytes(2, "big")
+
+def test_decode_payload():
+	buffer = bytearray(payload([0x0123, 0x0FFF, 0x0000, 0x0800], 2, 1000))
+	(samples, period_status, period_value) = Board.decode_payload(buffer, 4)
+	assert samples.dtype == np.dtype(">u2")
+	assert list(samples) == [0x0123, 0x0FFF, 0x0000, 0x0800]
+	assert (period_status, period_value) == (2, 1000)
+
+def test_decode_payload_views_the_buffer():
+	""" no copy: the samples change with the buffer, as when it is reused for the next frame """
+	buffer = bytearray(payload([1, 2, 3], 0, 0) + bytes(10)) # a buffer larger than the payload
+	(samples, period_status, period_value) = Board.decode_payload(buffer, 3)
+	assert len(samples) == 3
+	buffer[0:2] = (500).to_bytes(2, "big")
+	assert samples[0] == 500
+
+def test_decode_payload_of_a_dual_channel_capture():
+	""" num_samples counts both channels; ch1 at odd positions and ch2 at even ones from 2 """
+	buffer = bytearray(payload([0, 10, 20, 11, 21, 12, 22], 3, 65535))
+	(samples, period_status, period_value) = Board.decode_payload(buffer, 7)
+	assert list(samples[1::2]) == [10, 11, 12] and list(samples[2::2]) == [20, 21, 22]
+	assert (period_status, period_value) == (3, 65535)
+
+SIM = "sim://?seed=1&realtime=0"
+
+def request(board, num_samples, owner=None):
+	board.osc_request_samples(1, num_samples, 10, 1, False, owner=owner)
+
+def received_samples(data):
+	(samples, period_status, period_value, parameters) = data
+	assert len(samples) == parameters[1]
+	return parameters[1]
+
+def test_get_samples():
+	board = Board.Board(SIM)
+	(samples, period_status, period_value) = board.osc_get_samples(3, 500, 10, 1, False)
+	assert samples.dtype == np.dtype(">u2") and len(samples) == 1000
+	assert (samples & 0x0FFF).max() > 0
+	board.close()
+
+def test_get_samples_reuses_the_buffer():
+	board = Board.Board(SIM)
+	buffer = bytearray(2000)
+	(samples, period_status, period_value) = board.osc_get_samples(1, 500, 10, 1, False, buffer=buffer)
+	assert samples.base is not None and bytes(samples.tobytes()) == bytes(buffer[:1000])
+	board.close()
+
+def test_payloads_in_request_order():
+	board = Board.Board(SIM)
+	for n in [100, 200, 300]: request(board, n)
+	assert board.osc_requests_in_flight() == 3
+	assert [received_samples(board.osc_receive_samples()) for i in range(3)] == [100, 200, 300]
+	assert board.osc_requests_in_flight() == 0
+	assert board.osc_receive_samples() == None
+	board.close()
+
+def test_payloads_go_to_their_owner():
+	board = Board.Board(SIM)
+	request(board, 100, "a")
+	request(board, 200, "b")
+	request(board, 300, "a")
+	""" b reads its payload after the first of a, which is kept for a """
+	assert received_samples(board.osc_receive_samples(owner="b")) == 200
+	assert board.osc_requests_in_flight("a") == 2 and board.osc_requests_in_flight("b") == 0
+	assert board.osc_receive_samples(owner="b") == None
+	assert received_samples(board.osc_receive_samples(owner="a")) == 100
+	assert received_samples(board.osc_receive_samples(owner="a")) == 300
+	assert board.osc_requests_in_flight("a") == 0
+	board.close()
+
+def test_stashed_payload_into_the_callers_buffer():
+	board = Board.Board(SIM)
+	request(board, 100, "a")
+	request(board, 200, "b")
+	board.osc_receive_samples(owner="b")
+	buffer = bytearray(204)
+	(samples, status, value, parameters) = board.osc_receive_samples(buffer=buffer, owner="a")
+	assert len(samples) == 100 and samples.tobytes() == bytes(buffer[:200])
+	board.close()
+
+def test_get_value_discards_the_callers_requests_only():
+	board = Board.Board(SIM)
+	request(board, 100)
+	request(board, 200, "other")
+	assert board.get_value("osc get_max_samples", 2) == 10000
+	assert board.osc_requests_in_flight() == 0
+	assert received_samples(board.osc_receive_samples(owner="other")) == 200
+	board.close()
+
+def test_get_samples_keeps_other_owners_payloads():
+	board = Board.Board(SIM)
+	request(board, 100, "other")
+	(samples, status, value) = board.osc_get_samples(1, 300, 10, 1, False)
+	assert len(samples) == 300
+	assert received_samples(board.osc_receive_samples(owner="other")) == 100
+	board.close()
+
+def test_a_pipelining_thread_does_not_starve_others():
+	""" a worker keeping two requests in flight, as Acquisition.AcquisitionWorker does, and another thread asking for values """
+	board = Board.Board("sim://?seed=1")
+	running = True
+	received = []
+	def worker():
+		request(board, 1000)
+		while running:
+			request(board, 1000)
+			received.append(received_samples(board.osc_receive_samples()))
+		while board.osc_requests_in_flight(): board.osc_receive_samples()
+	thread = threading.Thread(target=worker)
+	thread.start()
+	while not received: time.sleep(0.001)
+	t0 = time.time()
+	values = [board.get_value("osc get_max_samples", 2) for i in range(10)]
+	seconds = time.time()-t0
+	frames = len(received)
+	time.sleep(0.1)
+	running = False
+	thread.join()
+	assert values == [10000]*10
+	assert seconds < 2
+	assert len(received) > frames # the worker went on after the values
+	assert set(received) == {1000}
+	assert not board.in_flight and not any(board.stashed.values())
+	board.close()
+
+class FailingSerial():
+	""" Stands in for the port of a board: its next write raises, as a serial port unplugged """
+
+	def __init__(self, serial):
+		self.serial = serial
+		self.fail	= True
+
+	def write(self, data):
+		if self.fail:
+			self.fail = False
+			raise OSError("device disconnected")
+		return self.serial.write(data)
+
+	def __getattr__(self, name):
+		return getattr(self.serial, name)
+
+def test_an_error_does_not_keep_the_board_locked():
+	board = Board.Board(SIM)
+	board.serial = FailingSerial(board.serial)
+	try:
+		board.get_value("osc get_max_samples", 2)
+		assert False, "the error is raised"
+	except OSError:
+		pass
+	result = []
+	thread = threading.Thread(target=lambda: result.append(board.get_value("osc get_max_samples", 2)), daemon=True) # left waiting if the lock is kept
+	thread.start()
+	thread.join(2)
+	assert result == [10000]
+	board.close()
@@ -0,0 +1,115 @@
+import configparser
+import numpy as np
+
+import Board
+import Calibration
+
+"""
+Input stage calibration (Calibration.py): sine fits recovering what was generated, a calibration run
+on the simulated board, whose AD9833 drives channel 1 directly and channel 2 through a low-pass, and
+the store the transfer functions are kept in, with those of PicoScope.ini moved into it.
+"""
+
+def test_fit_sine_amplitude_and_frequency():
+	""" the nominal frequency 2% off, the fit finds the true one; several rows at once """
+	t = np.arange(1000)*10e-6
+	rng = np.random.default_rng(1)
+	rows = [0.5*np.sin(2*np.pi*1020*t+0.3) + 2.0,
+			1.7*np.cos(2*np.pi*1020*t+1.1) - 0.4 + rng.normal(0, 0.05, len(t))]
+	(amplitude, frequency) = Calibration.fit_sine(rows, 10e-6, 1000)
+	assert abs(amplitude[0]-0.5) < 1e-6 and abs(frequency[0]-1020) < 1e-3
+	assert abs(amplitude[1]-1.7) < 0.01 and abs(frequency[1]-1020) < 1
+	""" max-min would be thrown off by the noise """
+	assert np.ptp(rows[1])/2 > 1.75
+
+def test_fit_sine_of_a_single_row():
+	t = np.arange(300)*1e-6
+	(amplitude, frequency) = Calibration.fit_sine(100*np.sin(2*np.pi*20000*t), 1e-6, 20000)
+	assert amplitude.shape == (1,) and abs(amplitude[0]-100) < 1e-6
+
+def test_capture_plan():
+	assert Calibration.capture_plan(1000, 4, 1000) == (500, 4)				# two 1 ms periods
+	assert Calibration.capture_plan(10, 4, 1000) == (1000, 200)				# slow: 2 cycles over the buffer
+	assert Calibration.capture_plan(150000, 4, 1000) == None				# 1.7 samples per period
+	(num_samples, micros) = Calibration.capture_plan(50000, 4, 1000)
+	assert micros == 4 and num_samples*micros >= 2*20
+
+def test_calibrator_on_the_simulated_board():
+	board = Board.Board("sim://?seed=1&realtime=0&loopback=1&noise=0.002")
+	calibrator = Calibration.Calibrator(board, [100, 1000, 5000, 200000])
+	calibrator.run()
+	assert calibrator.done and calibrator.error == None and calibrator.progress == 1.0
+	""" channel 1 sees the attenuation of the input stage, channel 2 that of the low-pass at 1 kHz too """
+	assert sorted(calibrator.results[1]) == [100, 1000, 5000] # 200 kHz cannot be sampled
+	attenuator = board.serial.board.input_stage_attenuation
+	for f in [100, 1000, 5000]:
+		assert abs(calibrator.results[1][f]/attenuator(f)-1) < 0.01
+		assert abs(calibrator.results[2][f]/(attenuator(f)*np.sqrt(1+(f/1000)**2))-1) < 0.01
+	assert board.osc_requests_in_flight() == 0 and board.serial.board.generator == None
+	board.close()
+
+def test_transfer_function():
+	tr = Calibration.TransferFunction([1000, 100, 10000], [2.2, 2.0, 3.0], [0.2, 0.1, 0.5])
+	assert list(tr.freqs) == [100, 1000, 10000]
+	assert list(tr.attenuation_at([100, 550, 50, 20000])) == [2.0, 2.1, 2.0, 3.0] # clamped outside
+	assert abs(tr.phase_at(5500)-0.35) < 1e-12
+	assert tr.tr_func == {100.0: 2.0, 1000.0: 2.2, 10000.0: 3.0}
+	assert tr.calibrated() and not Calibration.TransferFunction.from_dict({100: 0, 1000: 0}).calibrated()
+
+def test_attenuation_of_a_frame():
+	""" from the period measured by the board, in microseconds; the average without a valid one """
+	tr = Calibration.TransferFunction([100, 1000], [2.0, 4.0])
+	assert tr.attenuation((1, 1000)) == 4.0
+	assert tr.attenuation((2, 2000)) == tr.attenuation_at(500)
+	for period_info in [None, (1, 0), (3, 1000), (4, 0)]:
+		assert tr.attenuation(period_info) == 3.0
+	assert list(Calibration.TransferFunction().attenuation_at([10, 100])) == [1.0, 1.0]
+
+def test_store(tmp_path):
+	path = str(tmp_path/"Calibration.json")
+	store = Calibration.CalibrationStore(path)
+	assert not store.has("board A", 1)
+	assert not store.transfer_function("board A", 1).calibrated()
+	store.set("board A", 1, [100, 1000], [2.0, 2.1])
+	store.set("board B", 2, [100], [1.9], [0.01])
+	store.save()
+	read = Calibration.CalibrationStore(path)
+	assert read.has("board A", 1) and not read.has("board A", 2) and read.has("board B", 2)
+	tr = read.transfer_function("board A", 1)
+	assert tr.tr_func == {100.0: 2.0, 1000.0: 2.1} and tr.phase is None
+	assert read.transfer_function("board A", 1) is tr
+	assert list(read.transfer_function("board B", 2).phase) == [0.01]
+	""" calibrated again, a new transfer function """
+	read.set("board A", 1, [100], [2.5])
+	assert read.transfer_function("board A", 1).tr_func == {100.0: 2.5}
+
+def test_store_of_another_version(tmp_path):
+	path = tmp_path/"Calibration.json"
+	path.write_text('{"version": 99, "boards": {}}')
+	try:
+		Calibration.CalibrationStore(str(path))
+		assert False, "the version is checked"
+	except ValueError:
+		pass
+
+def test_import_ini(tmp_path):
+	config = configparser.ConfigParser()
+	config["Osc-Ch1"] = {"InputStageTrFunc": "{100: 2.0, 1000: 2.2}", "Color": "Yellow"}
+	config["Osc-Ch2"] = {"InputStageTrFunc": "{100: 0, 1000: 0}"} # never calibrated
+	store = Calibration.CalibrationStore(str(tmp_path/"Calibration.json"))
+	assert store.import_ini(config, "board A")
+	assert not config.has_option("Osc-Ch1", "InputStageTrFunc") and not config.has_option("Osc-Ch2", "InputStageTrFunc")
+	assert config["Osc-Ch1"]["Color"] == "Yellow"
+	read = Calibration.CalibrationStore(str(tmp_path/"Calibration.json"))
+	assert read.transfer_function("board A", 1).tr_func == {100.0: 2.0, 1000.0: 2.2}
+	assert not read.has("board A", 2)
+	assert not store.import_ini(config, "board A")
+
+def test_import_ini_keeps_the_data_of_the_store(tmp_path):
+	config = configparser.ConfigParser()
+	config["Osc-Ch1"] = {"InputStageTrFunc": "{100: 2.0}"}
+	store = Calibration.CalibrationStore(str(tmp_path/"Calibration.json"))
+	store.set("board A", 1, [100], [1.5])
+	store.import_ini(config, "board A")
+	assert store.transfer_function("board A", 1).tr_func == {100.0: 1.5}
+	assert not config.has_option("Osc-Ch1", "InputStageTrFunc")
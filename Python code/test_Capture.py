@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+
+import Board
+import Capture
+import Recorder
+
+""" Headless captures (Capture.py) from the simulated board, from a script and from the command line """
+
+SIM = "sim://?seed=1&realtime=0"
+
+def test_parameters_as_the_oscilloscope_computes_them():
+	""" the simulated board takes 2 us per sample, 4 us per pair and up to 10000 samples """
+	board = Board.Board(SIM)
+	assert tuple(Capture.HeadlessCapture(board, 1, "1 ms").parameters) == (1, 5000, 2, 1, False)
+	assert tuple(Capture.HeadlessCapture(board, 3, "10 ms").parameters) == (3, 5000, 20, 1, False)
+	assert tuple(Capture.HeadlessCapture(board, 2, "0.1 ms", num_samples=100).parameters) == (2, 100, 10, 2, False)
+	""" ETS: 100 ns per sample, as much of the span as fits in the buffer """
+	assert tuple(Capture.HeadlessCapture(board, 1, "20 us", use_ets=True).parameters) == (1, 2000, 100, 1, True)
+	assert tuple(Capture.HeadlessCapture(board, 1, "1 ms", use_ets=True).parameters) == (1, 10000, 100, 1, True)
+	board.close()
+
+def test_settings_the_board_cannot_do():
+	board = Board.Board(SIM)
+	for (args, kwargs) in [((3, "1 ms"), {"use_ets": True}), ((3, "1 ms"), {"num_samples": 6000}), ((1, "1 parsec"), {})]:
+		with pytest.raises(ValueError):
+			Capture.HeadlessCapture(board, *args, **kwargs)
+	board.close()
+
+def test_frames():
+	board = Board.Board(SIM)
+	capture = Capture.HeadlessCapture(board, 3, "1 ms", num_samples=500)
+	frames = [(len(frame.samples), frame.parameters) for frame in capture.frames(count=5)]
+	assert frames == [(1000, capture.parameters)]*5
+	assert board.osc_requests_in_flight() == 0
+	board.close()
+
+def test_command_line_recording(tmp_path):
+	name = str(tmp_path/"session")
+	url = "sim://?seed=1&realtime=0&ch1=sine,1000,2.0"
+	assert Capture.main(["--config", str(tmp_path/"none.ini"), "--calibration", str(tmp_path/"none.json"), "--port", url,
+						 "--channel", "1", "--time-div", "1 ms", "--count", "3", "--output", name]) == 0
+	recording = Recorder.Recording(name)
+	assert len(recording) == 3
+	(samples, record) = recording.frame(2)
+	assert len(samples) == 5000 and record["period_value"] == 1000
+	assert np.ptp(samples) > 1000
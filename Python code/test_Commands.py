@@ -0,0 +1,61 @@
+import threading
+import time
+
+import Commands
+
+""" The command scheduler (Commands.py), writing to a stand-in board that keeps the lines """
+
+class LineBoard():
+
+	def __init__(self):
+		self.lines = []
+		self.lock  = threading.Lock()
+
+	def send_command(self, command):
+		with self.lock:
+			self.lines.append((time.time(), command))
+
+def test_target_of():
+	target_of = Commands.target_of
+	assert target_of("funcgen pwm_set 100 50") == target_of("funcgen stop pwm") == "funcgen pwm"
+	assert target_of("funcgen AD9833_set 1000 Sine") == target_of("funcgen stop AD9833") == "funcgen AD9833"
+	assert target_of("led fgen on") == target_of("led fgen off") == "led fgen"
+	assert target_of("led breathe red") != target_of("led fgen on")
+	assert target_of("osc get_max_samples") == "osc get_max_samples"
+
+def test_burst_coalesces_to_the_last_value():
+	board = LineBoard()
+	scheduler = Commands.CommandScheduler(board, interval=0.05)
+	scheduler.start()
+	for frequency in range(1, 201):
+		scheduler.submit("funcgen AD9833_set {} Sine".format(frequency))
+	assert scheduler.flush()
+	scheduler.stop()
+	commands = [command for (t, command) in board.lines]
+	assert commands[-1] == "funcgen AD9833_set 200 Sine"
+	assert len(commands) < 10
+	assert scheduler.submitted == 200 and scheduler.written == len(commands)
+
+def test_rate_limit():
+	board = LineBoard()
+	scheduler = Commands.CommandScheduler(board, interval=0.05)
+	scheduler.start()
+	for i in range(4):
+		scheduler.submit("led fgen {}".format(i))
+		time.sleep(0.06)
+	scheduler.stop()
+	times = [t for (t, command) in board.lines]
+	assert len(times) == 4
+	assert min(b-a for a, b in zip(times, times[1:])) >= 0.045
+
+def test_different_targets_keep_their_order():
+	board = LineBoard()
+	scheduler = Commands.CommandScheduler(board, interval=10.0) # nothing written before the flush
+	scheduler.submit("funcgen pwm_set 100 50")
+	scheduler.submit("led fgen on")
+	scheduler.submit("funcgen AD9833_set 1000 Sine")
+	scheduler.submit("funcgen stop pwm") # replaces the pwm_set, and goes after the others
+	scheduler.start()
+	assert scheduler.flush()
+	scheduler.stop()
+	assert [command for (t, command) in board.lines] == ["led fgen on", "funcgen AD9833_set 1000 Sine", "funcgen stop pwm"]
@@ -0,0 +1,79 @@
+import numpy as np
+
+import Board
+import EquivalentTime
+
+""" Host equivalent time reconstruction (EquivalentTime.py) from captures of a sine faster than the screen resolution """
+
+DT		  = 2e-6	# seconds between samples
+FREQUENCY = 37100.0	# not a multiple of the sampling rate: its samples fall at many phases
+WINDOW	  = 50e-6	# the screen: 50 us
+COLUMNS	  = 200
+
+def capture(rng, n=500, frequency=FREQUENCY, amplitude=1000):
+	""" A capture starting at a random point of the signal """
+	t = (np.arange(n) + rng.uniform(0, 100))*DT
+	return np.rint(2048 + amplitude*np.sin(2*np.pi*frequency*t)).astype(">u2")
+
+def reconstructor(pretrigger=0.25):
+	r = EquivalentTime.Reconstructor()
+	r.configure("settings", WINDOW, COLUMNS, pretrigger)
+	return r
+
+def test_reconstructs_the_sine():
+	rng = np.random.default_rng(1)
+	r = reconstructor()
+	assert r.trace(1) == None and r.fill() == 0
+	for i in range(50):
+		assert r.add({1: capture(rng)}, 1, DT, None)
+	assert r.fill() > 0.9
+	""" time 0, at the pretrigger fraction of the screen, is a rising zero crossing """
+	times = (np.arange(COLUMNS)+0.5)*WINDOW/COLUMNS - 0.25*WINDOW
+	expected = 2048 + 1000*np.sin(2*np.pi*FREQUENCY*times)
+	trace = r.trace(1)
+	assert trace.dtype == np.float32 and len(trace) == COLUMNS
+	assert np.max(np.abs(trace-expected)) < 60
+
+def test_both_channels_folded_by_the_trigger_channel():
+	rng = np.random.default_rng(2)
+	r = reconstructor()
+	for i in range(50):
+		ch1 = capture(rng)
+		r.add({1: ch1, 2: 4095-ch1}, 1, DT, None)
+	assert np.max(np.abs(r.trace(1)+r.trace(2)-4095)) < 1
+
+def test_flat_or_aliased_captures_are_refused():
+	rng = np.random.default_rng(3)
+	r = reconstructor()
+	assert not r.add({1: np.full(500, 2048, dtype=">u2")}, 1, DT, None)
+	""" the firmware measured a period 10 times shorter: the crossings are those of an alias """
+	assert not r.add({1: capture(rng)}, 1, DT, (0, 1e6/FREQUENCY/10))
+	assert r.add({1: capture(rng)}, 1, DT, (0, 1e6/FREQUENCY))
+	assert r.captures == 1
+
+def test_a_new_period_starts_over():
+	rng = np.random.default_rng(4)
+	r = reconstructor()
+	for i in range(5): r.add({1: capture(rng)}, 1, DT, None)
+	r.add({1: capture(rng, frequency=1.5*FREQUENCY)}, 1, DT, None)
+	assert r.captures == 1
+	assert abs(r.period-1/(1.5*FREQUENCY)) < 0.005*r.period
+
+def test_in_phase_channels_line_up():
+	""" dual channel captures: every ch2 sample is taken half the time between samples after that of ch1 """
+	dt = 4e-6
+	rng = np.random.default_rng(5)
+	r = reconstructor()
+	for i in range(80):
+		t = (np.arange(250) + rng.uniform(0, 100))*dt
+		(ch1, ch2) = [np.rint(2048 + 1000*np.sin(2*np.pi*FREQUENCY*(t + skew*dt))).astype(">u2") for skew in [0, Board.DUAL_CHANNEL_SKEW]]
+		assert r.add({1: ch1, 2: ch2}, 1, dt, None, {2: Board.DUAL_CHANNEL_SKEW*dt})
+	assert r.fill() > 0.9
+	assert np.max(np.abs(r.trace(1)-r.trace(2))) < 60 # 2 us apart, 27 degrees, would be up to 470
+	""" the same with ch2 as the trigger channel """
+	r = reconstructor()
+	for i in range(80):
+		t = (np.arange(250) + rng.uniform(0, 100))*dt
+		(ch1, ch2) = [np.rint(2048 + 1000*np.sin(2*np.pi*FREQUENCY*(t + skew*dt))).astype(">u2") for skew in [0, Board.DUAL_CHANNEL_SKEW]]
+		r.add({1: ch1, 2: ch2}, 2, dt, None, {2: Board.DUAL_CHANNEL_SKEW*dt})
+	assert np.max(np.abs(r.trace(1)-r.trace(2))) < 60
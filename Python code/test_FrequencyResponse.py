@@ -0,0 +1,55 @@
+import cmath
+import numpy as np
+
+import FrequencyResponse
+
+""" Frequency response sweeps (FrequencyResponse.py): the sine fit and the sweep plan """
+
+def dual_capture(frequency, seconds_per_sample, gain, phase, n=400, noise=0.0, skew=FrequencyResponse.SKEW):
+	""" ch1 and ch2 as the board takes them, ch2 a sample skew later """
+	rng = np.random.default_rng(1)
+	t = np.arange(n)*seconds_per_sample
+	w = 2*np.pi*frequency
+	ch1 = 2048 + 1000*np.sin(w*t) + rng.normal(0, noise, n)
+	ch2 = 2048 + 1000*gain*np.sin(w*(t+skew*seconds_per_sample) + phase) + rng.normal(0, noise, n)
+	return ch1, ch2
+
+def test_fit_response_gain_and_phase():
+	for (gain, phase) in [(1.0, 0.0), (0.5, -np.pi/4), (0.1, -2.0), (2.0, 1.0)]:
+		ch1, ch2 = dual_capture(1000.0, 20e-6, gain, phase)
+		(response, amplitude) = FrequencyResponse.fit_response(ch1, ch2, 20e-6, 1000.0)
+		assert abs(abs(response)-gain) < 1e-6*max(1, gain)
+		assert abs(cmath.phase(response)-phase) < 1e-6
+		assert abs(amplitude-1000) < 1e-6
+
+def test_fit_response_corrects_the_skew_at_high_frequency():
+	""" 25 KHz sampled every 4 us: half a sample is 18 degrees """
+	ch1, ch2 = dual_capture(25000.0, 4e-6, 1.0, 0.0)
+	(response, amplitude) = FrequencyResponse.fit_response(ch1, ch2, 4e-6, 25000.0)
+	assert abs(np.degrees(cmath.phase(response))) < 0.01
+	(response, amplitude) = FrequencyResponse.fit_response(ch1, ch2, 4e-6, 25000.0, skew=0.0)
+	assert abs(np.degrees(cmath.phase(response))-18) < 0.01
+
+def test_fit_response_with_noise():
+	ch1, ch2 = dual_capture(500.0, 50e-6, 0.3, -1.0, n=2000, noise=20)
+	(response, amplitude) = FrequencyResponse.fit_response(ch1, ch2, 50e-6, 500.0)
+	assert abs(abs(response)-0.3) < 0.01
+	assert abs(cmath.phase(response)+1.0) < 0.05
+
+def test_fit_response_of_a_flat_ch1():
+	flat = np.full(400, 2048.0)
+	assert FrequencyResponse.fit_response(flat, flat, 20e-6, 1000.0) == (0j, 0.0)
+
+def test_log_frequencies():
+	frequencies = FrequencyResponse.log_frequencies(20, 100000, 200)
+	assert frequencies[0] == 20 and frequencies[-1] == 100000
+	assert frequencies == sorted(set(frequencies))
+	assert all(type(f) == int for f in frequencies)
+	assert FrequencyResponse.log_frequencies(1, 10, 100) == list(range(1, 11))
+
+def test_sweep_plan():
+	(num_samples, micros, settle) = FrequencyResponse.sweep_plan(1000, 4, 5000, settle_cycles=1, cycles=3)
+	assert FrequencyResponse.MIN_SAMPLES <= num_samples <= 5000
+	assert num_samples*micros >= 4*1000 # the settling period and 3 more
+	assert settle*micros >= 1000 and settle <= num_samples//2
+	assert FrequencyResponse.sweep_plan(200000, 4, 5000) == None # above what 4 us between samples can take
@@ -0,0 +1,73 @@
+import csv
+import json
+
+import Board
+import Instrumentation
+
+"""
+Pipeline instrumentation (Instrumentation.py): percentiles of the last durations of a stage, a probe
+that costs nothing while disabled, and the stages the board times when it is enabled.
+"""
+
+def test_stage_keeps_the_last_window():
+	stage = Instrumentation.Stage()
+	assert stage.summary()["count"] == 0 and stage.summary()["p50_ms"] == None
+	for i in range(Instrumentation.WINDOW):
+		stage.add(1.0)
+	for i in range(Instrumentation.WINDOW//2):
+		stage.add(0.001)
+	summary = stage.summary()
+	assert summary["count"] == Instrumentation.WINDOW*3//2
+	assert summary["max_ms"] == 1000.0
+	assert abs(summary["mean_ms"]-500.5) < 1e-6
+	assert summary["p99_ms"] == 1000.0
+
+def test_disabled_probe_times_nothing():
+	probe = Instrumentation.Probe()
+	t = probe.start()
+	assert t == None and probe.lap("draw", t) == None
+	assert probe.stages["draw"].count == 0
+	probe.count("stale")
+	assert probe.counters["stale"] == 1 # counters are always kept
+
+def test_laps():
+	probe = Instrumentation.Probe()
+	probe.enabled = True
+	t = probe.start()
+	t = probe.lap("volts", t)
+	t = probe.lap("fft", t)
+	assert t != None
+	assert probe.stages["volts"].count == 1 and probe.stages["fft"].count == 1
+	probe.reset()
+	assert probe.stages["volts"].count == 0
+
+def test_board_stages():
+	probe = Instrumentation.probe
+	probe.reset()
+	probe.enabled = True
+	try:
+		board = Board.Board("sim://?seed=1&realtime=0")
+		for i in range(3): board.osc_get_samples(1, 500, 10, 1, False)
+		board.close()
+	finally:
+		probe.enabled = False
+	counts = {name: stage["count"] for name, stage in probe.summary()["stages"].items()}
+	assert counts["write"] == counts["first_byte"] == counts["transfer"] == counts["decode"] == 3
+	assert counts["draw"] == 0
+	probe.reset()
+
+def test_export(tmp_path):
+	probe = Instrumentation.Probe()
+	probe.enabled = True
+	probe.lap("decode", probe.start())
+	probe.count("timeouts", 2)
+	probe.export(str(tmp_path/"stats.json"))
+	with open(tmp_path/"stats.json") as f:
+		summary = json.load(f)
+	assert summary["stages"]["decode"]["count"] == 1 and summary["counters"]["timeouts"] == 2
+	probe.export(str(tmp_path/"stats.CSV"))
+	with open(tmp_path/"stats.CSV", newline="") as f:
+		rows = {row[0]: row[1:] for row in csv.reader(f)}
+	assert rows["name"][0] == "count"
+	assert rows["decode"][0] == "1" and rows["draw"] == ["0", "", "", "", "", ""]
+	assert rows["timeouts"] == ["2"]
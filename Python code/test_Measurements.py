@@ -0,0 +1,101 @@
+import numpy as np
+
+import Measurements
+
+""" Automatic measurements (Measurements.py) of synthetic frames, 1 us between samples """
+
+VOLTS = 3.3/4095
+DT	  = 1e-6
+
+def sine(n, frequency, delay=0.0, amplitude=1500, offset=2048):
+	t = (np.arange(n)+delay)*DT
+	return np.rint(offset + amplitude*np.sin(2*np.pi*frequency*t)).astype(">u2")
+
+def square(n, period, duty):
+	return np.where(np.arange(n) % period < duty*period, 3500, 500).astype(">u2")
+
+def test_levels():
+	samples = np.array([1000, 3000]*50, dtype=">u2")
+	r = Measurements.measure(samples, VOLTS, DT, ["Min", "Max", "Vpp", "Mean", "RMS", "AC RMS"])
+	assert abs(r["Min"]-1000*VOLTS) < 1e-9
+	assert abs(r["Max"]-3000*VOLTS) < 1e-9
+	assert abs(r["Vpp"]-2000*VOLTS) < 1e-9
+	assert abs(r["Mean"]-2000*VOLTS) < 1e-9
+	assert abs(r["AC RMS"]-1000*VOLTS) < 1e-9
+	assert abs(r["RMS"]-np.sqrt(5e6)*VOLTS) < 1e-9
+
+def test_frequency_of_a_sine():
+	r = Measurements.measure(sine(5000, 1234.0), VOLTS, DT, ["Frequency", "Period"])
+	assert abs(r["Frequency"]-1234.0) < 1.0
+	assert abs(r["Period"]-1/1234.0) < 1e-6
+
+def test_duty_rise_and_overshoot_of_a_square():
+	r = Measurements.measure(square(4000, 200, 0.25), VOLTS, DT, ["Frequency", "Duty", "Rise", "Fall", "Overshoot"])
+	assert abs(r["Frequency"]-5000) < 1
+	assert abs(r["Duty"]-25) < 0.5
+	assert r["Rise"] < 2*DT and r["Fall"] < 2*DT
+	assert abs(r["Overshoot"]) < 1e-9
+
+def test_float_samples_keep_their_fractions():
+	samples = np.array([1000.25, 3000.75]*50, dtype=np.float32)
+	r = Measurements.measure(samples, 1.0, DT, ["Max"])
+	assert r["Max"] == 3000.75
+
+def test_flat_channel_has_no_timing():
+	samples = np.full(1000, 2048, dtype=">u2")
+	r = Measurements.measure(samples, VOLTS, DT, ["Vpp", "Frequency", "Period", "Duty", "Phase"])
+	assert r["Vpp"] == 0
+	assert r["Frequency"] == None and r["Period"] == None and r["Duty"] == None
+
+def engine(*names):
+	e = Measurements.MeasurementEngine()
+	e.selected = set(names)
+	return e
+
+def test_phase_between_channels():
+	for degrees in [90, -90, 30]:
+		e = engine("Phase")
+		delay = -degrees/360*1000 # ch2 behind ch1 by degrees, 1 KHz: 1000 samples a period
+		e.add_channel(1, sine(5000, 1000.0), VOLTS, DT)
+		e.add_channel(2, sine(5000, 1000.0, delay), VOLTS, DT)
+		e.end_frame()
+		assert abs(e.value(2, "Phase")-degrees) < 1, degrees
+
+def test_phase_corrects_the_dual_channel_skew():
+	""" the same signal sampled half a sample later on ch2 is in phase once the skew is given """
+	e = engine("Phase")
+	e.add_channel(1, sine(2000, 25000.0), VOLTS, DT)
+	e.add_channel(2, sine(2000, 25000.0, 0.5), VOLTS, DT)
+	e.end_frame(skew=0.5*DT)
+	assert abs(e.value(2, "Phase")) < 1
+
+def test_phase_near_180_does_not_average_to_0():
+	e = engine("Phase")
+	rng = np.random.default_rng(1)
+	e.add_channel(1, sine(20000, 1000.0), VOLTS, DT)
+	e.add_channel(2, (sine(20000, 1000.0, 500) + rng.normal(0, 40, 20000).astype(int)).astype(">u2"), VOLTS, DT)
+	e.end_frame()
+	assert abs(abs(e.value(2, "Phase"))-180) < 5
+
+def test_phase_with_a_flat_channel():
+	for flat in [1, 2]:
+		e = engine("Phase", "Frequency")
+		e.add_channel(1, np.full(1000, 2048, dtype=">u2") if flat == 1 else sine(1000, 5000.0), VOLTS, DT)
+		e.add_channel(2, np.full(1000, 2048, dtype=">u2") if flat == 2 else sine(1000, 5000.0), VOLTS, DT)
+		e.end_frame()
+		assert e.value(2, "Phase") == None
+		assert e.value(flat, "Frequency") == None
+
+def test_statistics_of_the_last_frames():
+	e = engine("Max")
+	for value in [1000, 2000, 3000]:
+		e.add_channel(1, np.full(10, value, dtype=">u2"), 1.0, DT)
+		e.end_frame()
+	(lo, hi, mean, std) = e.statistics(1, "Max")
+	assert (lo, hi, mean) == (1000, 3000, 2000)
+	assert e.statistics(2, "Max") == None
+
+def test_format_value():
+	assert Measurements.format_value("Frequency", 1234.0) == "1.23 KHz"
+	assert Measurements.format_value("Period", 2e-6) == "2 us"
+	assert Measurements.format_value("Phase", None) == "-"
@@ -0,0 +1,69 @@
+import time
+import numpy as np
+
+import Pool
+
+""" Channel alignment of the board pool (Pool.py), and a pool of simulated boards """
+
+def smooth_noise(n, seed=1):
+	""" Not periodic, so that the correlation has a single peak """
+	rng = np.random.default_rng(seed)
+	return np.convolve(rng.normal(0, 1, n+40), np.hanning(40), mode="valid")[:n]
+
+def delayed(signal, lag):
+	index = np.arange(len(signal))
+	return np.interp(index-lag, index, signal)
+
+def test_correlation_lag_whole_samples():
+	reference = smooth_noise(2000)
+	for lag in [0, 7, -12]:
+		assert abs(Pool.correlation_lag(reference, delayed(reference, lag))-lag) < 0.05
+
+def test_correlation_lag_fraction_of_a_sample():
+	reference = smooth_noise(2000, seed=2)
+	assert abs(Pool.correlation_lag(reference, delayed(reference, 3.3))-3.3) < 0.1
+
+def test_correlation_lag_of_a_sine_is_the_nearest():
+	t = np.arange(1000)
+	reference = np.sin(2*np.pi*t/50)
+	assert abs(Pool.correlation_lag(reference, np.sin(2*np.pi*(t-4)/50))-4) < 0.1
+
+def test_shift_aligns_and_is_float32_at_any_lag():
+	samples = (np.arange(100)*10).astype(">u2") | 0xF000
+	for lag in [0, 1.5, -2]:
+		shifted = Pool.shift(samples, lag)
+		assert shifted.dtype == np.float32
+		assert shifted.max() <= 0x0FFF
+	assert Pool.shift(samples, 1.5)[10] == 115
+	assert Pool.shift(samples, 0)[10] == 100
+
+def test_pool_of_simulated_boards():
+	pool = Pool.BoardPool(["sim://?seed={}&ch1=sine,1000,2.0&ch2=square,1000,1.0".format(i) for i in range(4)])
+	assert pool.ok and pool.channels() == 8
+	pool.set_parameters(1000, 10)
+	t0 = time.time()
+	merged = None
+	while merged == None and time.time()-t0 < 5:
+		merged = pool.get_merged_frame(alignment="correlation")
+		time.sleep(0.001)
+	assert merged != None
+	assert len(merged.channels) == 8 and merged.lags[0] == 0
+	assert all(channel.dtype == np.float32 for channel in merged.channels)
+	""" a merged frame whenever any board has a new frame: boards that have none yet do not hold the others back """
+	first = pool.frames_received()
+	t0 = time.time()
+	frames = 0
+	while time.time()-t0 < 1:
+		if pool.get_merged_frame() != None: frames += 1
+		time.sleep(0.001)
+	seconds = time.time()-t0
+	board_fps = min(n-f for n, f in zip(pool.frames_received(), first))/seconds
+	pool.close()
+	assert board_fps > 20 # 10 ms captures, about 68 frames/s each
+	assert frames/seconds > 0.9*board_fps
+
+def test_pool_with_a_port_missing_closes():
+	pool = Pool.BoardPool(["sim://?seed=1", "/nonexistent/port"])
+	assert not pool.ok
+	assert not pool.boards[0].serial.is_open # the board that opened is not left open
+	pool.close()
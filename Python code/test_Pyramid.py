@@ -0,0 +1,49 @@
+import numpy as np
+
+import Pyramid
+
+"""
+Min/max pyramids (Pyramid.py) built append after append, compared with the envelope computed by brute
+force over all the samples at once.
+"""
+
+def build(tmp_path, samples, chunks):
+	name = str(tmp_path/"ch1")
+	builder = Pyramid.PyramidBuilder(name, 1024)
+	for chunk in np.array_split(samples, chunks): builder.append(chunk)
+	builder.close()
+	return Pyramid.PyramidReader(name, samples)
+
+def brute_force(samples, bin_size):
+	n = -(-len(samples)//bin_size)
+	return ([samples[i*bin_size:(i+1)*bin_size].min() for i in range(n)],
+			[samples[i*bin_size:(i+1)*bin_size].max() for i in range(n)])
+
+def test_levels_match_brute_force(tmp_path):
+	""" chunks of odd sizes and a length that is not a power of FACTOR: every level ends in a partial bin """
+	samples = np.random.default_rng(1).integers(0, 4096, 10007).astype("<u2")
+	reader = build(tmp_path, samples, 37)
+	assert len(reader.levels) > 5
+	for level in range(1, len(reader.levels)):
+		(mins, maxs) = brute_force(samples, Pyramid.FACTOR**level)
+		assert list(reader.levels[level]["min"]) == mins, level
+		assert list(reader.levels[level]["max"]) == maxs, level
+
+def test_view_envelope(tmp_path):
+	samples = np.random.default_rng(2).integers(0, 4096, 50000).astype("<u2")
+	reader = build(tmp_path, samples, 10)
+	(positions, mins, maxs) = reader.view(1000, 41000, 100)
+	assert len(mins) <= 100
+	""" every column covers the samples from its position to the next one, the last one its whole bins """
+	assert positions[0] <= 1000
+	for (p, e, lo, hi) in zip(positions[:-1], positions[1:], mins, maxs):
+		assert lo == samples[p:e].min() and hi == samples[p:e].max()
+	last = samples[positions[-1]:41000]
+	assert mins[-1] <= last.min() and maxs[-1] >= last.max()
+
+def test_view_of_few_samples_reads_level_0(tmp_path):
+	samples = np.arange(100, dtype="<u2")
+	reader = build(tmp_path, samples, 3)
+	(positions, mins, maxs) = reader.view(10, 20, 100)
+	assert list(positions) == list(range(10, 20)) and list(mins) == list(range(10, 20))
+	assert len(reader.view(50, 50, 100)[0]) == 0
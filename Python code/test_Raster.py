@@ -0,0 +1,73 @@
+import numpy as np
+
+import Raster
+
+"""
+The raster display (Raster.py): traces in the coordinates of the oscilloscope axes rasterized into
+joined columns of pixels, fading with the persistence, and rendered over the grid as PPM data.
+"""
+
+def test_horizontal_line_fills_every_column():
+	display = Raster.PhosphorDisplay(101, 51)
+	display.add_trace(0, [0, 100], [0, 0])
+	hits = display.intensity[0] > 0
+	assert hits.sum(axis=0).tolist() == [1]*101
+	assert hits[25].all() # y 0 is the middle row
+	assert not display.intensity[1].any()
+
+def test_steps_are_joined_vertically():
+	""" many points per column: a square wave draws its edges, from the top to the bottom row """
+	display = Raster.PhosphorDisplay(101, 51)
+	x = np.linspace(0, 100, 1000)
+	display.add_trace(0, x, np.where((x//25)%2 == 0, 40.0, -40.0))
+	hits = display.intensity[0] > 0
+	edge = display.column(25)
+	assert hits[display.row(40):display.row(-40)+1, edge].all()
+	assert hits[:, 10].sum() == 1
+
+def test_trace_matches_a_point_by_point_rasterization():
+	""" every pixel of a sine with one point per column, computed one span at a time """
+	display = Raster.PhosphorDisplay(200, 100)
+	x = np.linspace(0, 100, 200)
+	y = 45*np.sin(2*np.pi*x/50)
+	display.add_trace(1, x, y)
+	expected = np.zeros((100, 200), dtype=bool)
+	px = np.rint(x*199/100).astype(int)
+	py = (50-y)*99/100
+	for i in range(200):
+		following = py[min(i+1, 199)]
+		expected[int(np.floor(min(py[i], following))):int(np.ceil(max(py[i], following)))+1, px[i]] = True
+	assert ((display.intensity[1] > 0) == expected).all()
+
+def test_empty_and_offscreen_traces():
+	display = Raster.PhosphorDisplay(100, 50)
+	display.add_trace(0, [], [])
+	display.add_trace(0, [10], [0])
+	display.add_trace(0, [20.3, 20.4], [0, 0]) # between two columns
+	display.add_trace(0, [0, 100], [80, 90])	 # above the canvas
+	assert not display.intensity.any()
+
+def test_persistence():
+	display = Raster.PhosphorDisplay(50, 50)
+	display.persistence = 1.0
+	display.add_trace(0, [0, 100], [0, 0])
+	display.decay(1.0)
+	assert abs(display.intensity[0].max()-np.exp(-1)) < 1e-6
+	display.persistence = None # infinite
+	display.decay(10.0)
+	assert abs(display.intensity[0].max()-np.exp(-1)) < 1e-6
+	display.persistence = 0
+	display.begin_frame()
+	assert not display.intensity.any()
+	assert [Raster.persistence_seconds(name) for name in ["Off", "0.2 s", "Infinite"]] == [0, 0.2, None]
+
+def test_render():
+	display = Raster.PhosphorDisplay(64, 36)
+	display.add_trace(0, [0, 100], [0, 0])
+	ppm = display.render([Raster.COLORS["Yellow"], None])
+	header = b"P6 64 36 255 "
+	assert ppm[:len(header)] == header and len(ppm) == len(header)+64*36*3
+	rgb = np.frombuffer(ppm[len(header):], dtype=np.uint8).reshape(36, 64, 3)
+	assert rgb[display.row(0), 30].tolist() == [255, 255, 0]	# the trace at full brightness
+	assert rgb[5, 3].tolist() == [127, 127, 127]				# grey background
+	assert rgb[display.row(10), 3].tolist() == [175, 175, 175] # grid line
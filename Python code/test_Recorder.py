@@ -0,0 +1,74 @@
+import json
+import numpy as np
+
+import Acquisition
+import Recorder
+
+"""
+Recordings (Recorder.py) written frame by frame and read back, closed or not: a session cut short,
+by a crash or the power going off, keeps the frames written before.
+"""
+
+def frame(channel, samples, timestamp, period=(1, 1000)):
+	f = Acquisition.Frame(bytearray(0))
+	num_samples = len(samples)//2 if channel == 3 else len(samples)
+	f.parameters = Acquisition.CaptureParameters(channel, num_samples, 10, 1, False)
+	f.samples	 = np.asarray(samples, dtype=">u2")
+	f.timestamp	 = timestamp
+	(f.period_status, f.period_value) = period
+	return f
+
+def frames():
+	rng = np.random.default_rng(1)
+	return [frame(1, rng.integers(0, 4096, 300), 1.0),
+			frame(3, rng.integers(0, 4096, 2*250), 2.0, (3, 65535)),
+			frame(2, rng.integers(0, 4096, 100), 3.0)]
+
+def test_round_trip(tmp_path):
+	name = str(tmp_path/"session")
+	recorder = Recorder.Recorder(name, attenuation=lambda channel, period_info: 0.5*channel)
+	for f in frames(): recorder.append(f)
+	recorder.close()
+	recording = Recorder.Recording(name)
+	assert len(recording) == 3
+	for (i, f) in enumerate(frames()):
+		(samples, record) = recording.frame(i)
+		assert list(samples) == list(f.samples)
+		assert record["channel_mask"] == f.parameters.channel and record["timestamp"] == f.timestamp
+		assert (record["period_status"], record["period_value"]) == (f.period_status, f.period_value)
+	assert list(recording.frame(1)[1]["attenuation"]) == [0.5, 1.0]
+
+def test_channel_samples_across_frames(tmp_path):
+	name = str(tmp_path/"session")
+	recorder = Recorder.Recorder(name)
+	for f in frames(): recorder.append(f)
+	recorder.close()
+	recording = Recorder.Recording(name)
+	(a, b, c) = [f.samples for f in frames()]
+	ch1 = np.concatenate((a, b[1::2]))
+	ch2 = np.concatenate((b[2::2], c))
+	assert list(recording.pyramids[1].levels[0][0:len(ch1)]) == list(ch1)
+	assert list(recording.pyramids[2].levels[0][0:len(ch2)]) == list(ch2)
+	assert list(recording.pyramids[2].levels[0][200:260]) == list(ch2[200:260]) # from one frame into the next
+
+def test_recording_never_closed(tmp_path):
+	""" its header still counts no frames and its files keep their grown size """
+	name = str(tmp_path/"session")
+	recorder = Recorder.Recorder(name)
+	for f in frames(): recorder.append(f)
+	with open(name+".json") as f:
+		assert json.load(f)["frames"] == 0
+	recording = Recorder.Recording(name)
+	assert len(recording) == 3
+	assert len(recording.samples) == 300+500+100
+	assert list(recording.frame(2)[0]) == list(frames()[2].samples)
+	assert len(recording.pyramids[1]) == 300+250
+
+def test_written_frames_stop_at_a_frame_not_in_the_sample_file():
+	index = np.zeros(5, dtype=Recorder.index_dtype)
+	index["num_samples"][:3]  = [10, 20, 30]
+	index["first_sample"][:3] = [0, 10, 30]
+	assert Recorder.written_frames(index, 0, 60) == (3, 60)
+	assert Recorder.written_frames(index, 1, 60) == (3, 60)
+	assert Recorder.written_frames(index, 0, 50) == (2, 30) # the last samples never reached the file
+	assert Recorder.written_frames(index, 3, 60) == (3, 60)
@@ -0,0 +1,67 @@
+import numpy as np
+
+import Simulator
+
+""" The simulated board (Simulator.py) answering the serial protocol as the firmware does """
+
+def board(url="sim://?seed=1&realtime=0"):
+	return Simulator.SimulatedSerial.from_url(url)
+
+def ask(serial, line, num_bytes):
+	serial.write(bytes(line+"\n", "utf-8"))
+	return serial.read(num_bytes)
+
+def capture(serial, channel, num_samples, micros):
+	n = num_samples*(2 if channel == 3 else 1)
+	payload = ask(serial, "osc get_samples {} {} {} 1".format(channel, num_samples, micros), (n+2)*2)
+	assert len(payload) == (n+2)*2
+	samples = np.frombuffer(payload, dtype=">u2", count=n)
+	status	= int.from_bytes(payload[-4:-2], "big")
+	value	= int.from_bytes(payload[-2:], "big")
+	return (samples, status, value)
+
+def test_board_limits():
+	serial = board()
+	assert int.from_bytes(ask(serial, "osc get_max_samples", 2), "little") == 10000
+	assert int.from_bytes(ask(serial, "osc get_micros_needed_for_2sample", 2), "little") == 4
+	assert serial.in_waiting == 0
+
+def test_capture_of_a_sine():
+	serial = board("sim://?seed=1&realtime=0&ch1=sine,1000,2.0&noise=0")
+	(samples, status, value) = capture(serial, 1, 1000, 10)
+	volts = samples*Simulator.ADC_VOLTS/Simulator.ADC_MAX
+	assert abs(volts.max()-volts.min()-2.0) < 0.01
+	assert abs(volts.mean()-1.65) < 0.01
+	""" the capture starts at a rising crossing of the trigger channel, and the period is measured """
+	assert volts[0] < 1.7 and volts[5] > volts[0]
+	assert status <= 2 and value == 1000
+
+def test_dual_capture_interleaves_with_the_adc_skew():
+	""" the same sine on both channels: every ch2 sample is taken half the time between samples after ch1 """
+	serial = board("sim://?seed=1&realtime=0&ch1=sine,1000,2.0&ch2=sine,1000,2.0&noise=0")
+	(samples, status, value) = capture(serial, 3, 500, 20)
+	ch1 = samples[1::2].astype(float)
+	ch2 = samples[2::2].astype(float)
+	midpoint = (ch1[:-1]+ch1[1:])/2 # ch1 halfway to its next sample
+	assert np.max(np.abs(ch2[:len(midpoint)]-midpoint)) < 5 # samples apart by up to 150
+
+def test_unperiodic_trigger_times_out():
+	serial = board("sim://?seed=1&realtime=0&ch1=noise,0,0")
+	(samples, status, value) = capture(serial, 1, 100, 10)
+	assert status == 4 and value == 0
+
+def test_loopback_generator_and_low_pass():
+	serial = board("sim://?seed=1&realtime=0&loopback=1&noise=0")
+	serial.write(b"funcgen AD9833_set 1000 Sine\n")
+	(samples, status, value) = capture(serial, 3, 1000, 20)
+	vpp = [np.ptp(samples[1::2]), np.ptp(samples[2::2])]
+	assert vpp[0] > 0
+	assert abs(vpp[1]/vpp[0]-1/np.sqrt(2)) < 0.02 # the cut-off of the device under test
+	serial.write(b"funcgen stop AD9833\n")
+	assert serial.board.generator == None
+
+def test_faults():
+	serial = board("sim://?seed=1&realtime=0&timeout=1")
+	assert ask(serial, "osc get_samples 1 100 10 1", 204) == b""
+	serial = board("sim://?seed=1&realtime=0&short_read=1")
+	assert len(ask(serial, "osc get_samples 1 100 10 1", 204)) < 204
@@ -0,0 +1,70 @@
+import numpy as np
+
+import Spectrum
+
+"""
+The spectrum engine (Spectrum.py): peaks at the frequency and amplitude of the sine captured, whatever
+the window, and averaging over frames.
+"""
+
+SECONDS_PER_SAMPLE = 10e-6
+
+def sine(amplitude, frequency, length=1000, phase=0.0):
+	t = np.arange(length)*SECONDS_PER_SAMPLE
+	return amplitude*np.sin(2*np.pi*frequency*t + phase)
+
+def test_fast_length():
+	assert [Spectrum.fast_length(n) for n in [1, 7, 17, 1000, 1001, 1025]] == [1, 8, 18, 1000, 1024, 1080]
+
+def test_sine_in_its_bin():
+	""" 5 kHz over 1000 samples at 100 kHz: 50 cycles, bin 50 """
+	analyzer = Spectrum.SpectrumAnalyzer(window_name="Rectangular")
+	(bins, amplitude) = analyzer.compute(sine(0.8, 5000.0))
+	peak = np.argmax(amplitude)
+	assert bins[peak] == 50
+	assert abs(analyzer.bin_frequencies(SECONDS_PER_SAMPLE)[peak]-5000.0) < 1e-6
+	assert abs(amplitude[peak]-0.8) < 1e-9
+
+def test_amplitude_whatever_the_window():
+	for name in Spectrum.window_names:
+		analyzer = Spectrum.SpectrumAnalyzer(window_name=name)
+		(bins, amplitude) = analyzer.compute(sine(1.5, 5000.0, phase=0.3))
+		assert abs(bins[np.argmax(amplitude)]-50) < 0.5, name
+		assert abs(amplitude.max()-1.5) < 0.02, name
+
+def test_zero_padding_keeps_bins_in_unpadded_units():
+	""" 1001 samples are padded to 1024, bin positions stay in units of the 1001 sample resolution """
+	analyzer = Spectrum.SpectrumAnalyzer(window_name="Flat top")
+	(bins, amplitude) = analyzer.compute(sine(1.0, 3000.0, length=1001))
+	assert analyzer.fft_size == 1024
+	frequency = analyzer.bin_frequencies(SECONDS_PER_SAMPLE)[np.argmax(amplitude)]
+	assert abs(frequency-3000.0) < 1/(1024*SECONDS_PER_SAMPLE)
+	assert abs(amplitude.max()-1.0) < 0.01
+
+def test_dc_is_not_doubled():
+	analyzer = Spectrum.SpectrumAnalyzer(window_name="Rectangular")
+	(bins, amplitude) = analyzer.compute(np.full(1000, 0.25))
+	assert abs(amplitude[0]-0.25) < 1e-12
+
+def test_averaging_over_frames_and_peak_hold():
+	analyzer = Spectrum.SpectrumAnalyzer(window_name="Rectangular", averaging="4 frames")
+	for a in [1.0, 2.0, 3.0, 4.0, 5.0]:
+		(bins, amplitude) = analyzer.compute(sine(a, 5000.0))
+	assert abs(amplitude[50]-3.5) < 1e-9 # the last four
+	analyzer.configure("Rectangular", "None", True)
+	for a in [2.0, 1.0]:
+		(bins, amplitude) = analyzer.compute(sine(a, 5000.0))
+	assert abs(amplitude[50]-2.0) < 1e-9
+
+def test_exponential_averaging():
+	analyzer = Spectrum.SpectrumAnalyzer(window_name="Rectangular", averaging="Exp 4")
+	analyzer.compute(sine(1.0, 5000.0))
+	(bins, amplitude) = analyzer.compute(sine(2.0, 5000.0))
+	assert abs(amplitude[50]-1.25) < 1e-9
+
+def test_dbv():
+	analyzer = Spectrum.SpectrumAnalyzer(window_name="Rectangular")
+	(bins, amplitude) = analyzer.compute(sine(0.1, 5000.0))
+	dbv = analyzer.to_dbv(amplitude)
+	assert abs(dbv[50]+20) < 1e-6
+	assert dbv.min() >= -120
@@ -0,0 +1,80 @@
+import numpy as np
+
+import Trigger
+
+""" Software trigger, see Trigger.py. Run with: python3 -m pytest """
+
+def sine(n, period, amplitude=1000, offset=2048, phase=0.0):
+	return np.rint(offset + amplitude*np.sin(2*np.pi*(np.arange(n)/period + phase))).astype(">u2")
+
+def pulses(widths, gap=30, low=1000, highs=None):
+	""" A low signal with a pulse of every width, each one gap samples after the previous """
+	y = [low]*gap
+	for i, width in enumerate(widths):
+		y += [highs[i] if highs else 3000]*width + [low]*gap
+	return np.array(y, dtype=">u2")
+
+def trigger(mode, slope="Rising", **settings):
+	t = Trigger.SoftwareTrigger()
+	t.mode	= mode
+	t.slope = slope
+	for name, value in settings.items(): setattr(t, name, value)
+	return t
+
+def test_edge_rising_interpolates_the_crossing():
+	samples = sine(1000, 100, phase=0.3)
+	t = trigger("Edge", level=2048.0, pretrigger=0.5)
+	point = t.find(samples, 100)
+	assert point != None and point >= 50
+	""" the first rising zero crossing after the room for the pretrigger: 70, 170, ... samples """
+	assert abs(point-70) < 0.05
+	i = int(point)
+	assert samples[i] <= 2048 <= samples[i+1]
+
+def test_edge_falling():
+	samples = sine(1000, 100, phase=0.3)
+	point = trigger("Edge", "Falling", level=2048.0, pretrigger=0.0).find(samples, 100)
+	assert abs(point-20) < 0.05
+
+def test_no_edge_leaves_room_for_the_window():
+	samples = sine(300, 100, phase=0.3)
+	assert trigger("Edge", pretrigger=0.5).find(samples, 400) == None
+
+def test_hysteresis_ignores_noise_around_the_level():
+	rng = np.random.default_rng(1)
+	samples = np.rint(2048 + rng.normal(0, 3, 2000)).astype(">u2")
+	assert trigger("Edge", hysteresis=20.0, pretrigger=0.0).find(samples, 100) == None
+	assert trigger("Edge", hysteresis=0.0, pretrigger=0.0).find(samples, 100) != None
+
+def test_high_bits_are_not_part_of_the_sample():
+	samples = sine(1000, 100, phase=0.3)
+	assert trigger("Edge").find(samples | 0xF000, 100) == trigger("Edge").find(samples, 100)
+
+def test_pulse_width():
+	samples = pulses([5, 20, 5, 20])
+	ends = [30+5, 30+5+30+20, 30+5+30+20+30+5]
+	longer	= trigger("Pulse >", width=10.0, pretrigger=0.0).find(samples, 10)
+	shorter = trigger("Pulse <", width=10.0, pretrigger=0.0).find(samples, 10)
+	assert abs(longer-ends[1]) < 1
+	assert abs(shorter-ends[0]) < 1
+
+def test_runt():
+	samples = pulses([10, 10, 10], highs=[3500, 2500, 3500])
+	point = trigger("Runt", level=2048.0, level2=3072.0, pretrigger=0.0).find(samples, 10)
+	assert abs(point-(30+10+30+10)) < 1
+	assert trigger("Runt", level=2048.0, level2=2400.0, pretrigger=0.0).find(samples, 10) == None
+
+def test_align_whole_sample():
+	samples = np.arange(100, dtype=">u2")
+	t = trigger("Edge", pretrigger=0.25)
+	window = t.align(samples, 30.0, 40)
+	assert len(window) == 40
+	assert window[10] == 30
+
+def test_align_fractional_position_is_resampled():
+	samples = (np.arange(100)*10).astype(">u2")
+	t = trigger("Edge", pretrigger=0.5)
+	window = t.align(samples, 30.5, 20)
+	assert len(window) == 20 and window.dtype == np.uint16
+	assert window[10] == 305
+	assert window[0] == 205